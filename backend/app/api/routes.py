@@ -5,11 +5,14 @@ from app.services.storage import StorageService
 from app.services.parsing import extract_text_from_file
 from app.services.batch_processing import process_batch
 from app.services.ai_detection import AIDetectionService
+from app.services.ai_detection_store import AIDetectionStore
 from app.services.plagiarism import PlagiarismService
+from app.services.embedding import EmbeddingService
+from app.services.governor import governor_stats
 from app.core.config import settings
 from pydantic import BaseModel
 from app.models.user import User
-from app.models.document import Document
+from app.models.document import Document, VISIBILITIES
 from app.models.batch import Batch
 from app.models.comparison import Comparison
 from app.api.auth import fastapi_users
@@ -36,8 +39,13 @@ async def get_my_credits(user: User = Depends(fastapi_users.current_user())):
     return {"status": "ok", "data": {"credits": user.scan_credits}}
 
 @router.post("/ai-check")
-async def check_ai_content(request: AICheckRequest, user: User = Depends(fastapi_users.current_user())):
-    result = ai_service.detect(request.text)
+async def check_ai_content(
+    request: AICheckRequest,
+    db: Session = Depends(get_db),
+    user: User = Depends(fastapi_users.current_user()),
+):
+    # Texts already checked with the current model are answered from the ai_detection table
+    result = (await AIDetectionStore(db).detect_many(ai_service, [request.text]))[0]
     return {"status": "ok", "data": result}
 
 @router.post("/check-plagiarism")
@@ -64,7 +72,7 @@ async def check_plagiarism(
 
     # Perform Scan
     try:
-        result = plagiarism_service.check_plagiarism(text_content)
+        result = await plagiarism_service.check_plagiarism(text_content)
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Scan failed: {str(e)}")
 
@@ -80,9 +88,14 @@ async def check_plagiarism(
 async def upload_documents(
     files: List[UploadFile] = File(...),
     analysis_type: str = "plagiarism",  # plagiarism, ai, or both
+    visibility: str = None,  # private, institution, or public
     db: Session = Depends(get_db),
     user: User = Depends(fastapi_users.current_user())
 ):
+    visibility = visibility or settings.DOCUMENT_VISIBILITY
+    if visibility not in VISIBILITIES:
+        raise HTTPException(status_code=400, detail=f"visibility must be one of {', '.join(VISIBILITIES)}")
+
     batch_id = uuid.uuid4()
 
     batch = Batch(
@@ -179,6 +192,10 @@ async def upload_documents(
             filename=filename,
             storage_path=storage_path,
             text_content=text_content,
+            content_hash=EmbeddingService.hash_content(text_content) if text_content else None,
+            uploaded_by=user.id,
+            institution=user.institution,
+            visibility=visibility,
             status="queued"
         )
         db.add(document)
@@ -270,6 +287,18 @@ async def get_admin_stats(
         }
     }
 
+@router.get("/admin/metrics")
+async def get_admin_metrics(user: User = Depends(fastapi_users.current_user())):
+    """Cache hit rates and outbound call health of this API worker"""
+    return {
+        "status": "ok",
+        "data": {
+            "plagiarism_cache": plagiarism_service.cache_stats(),
+            "outbound": governor_stats(),
+            "ai_cascade": ai_service.cascade_stats(),
+        }
+    }
+
 @router.get("/batch/{batch_id}")
 async def get_batch_status(batch_id: str, db: Session = Depends(get_db)):
     batch = await db.get(Batch, uuid.UUID(batch_id))
@@ -1,5 +1,6 @@
+from pydantic import field_validator
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Literal, Optional
 
 class Settings(BaseSettings):
     DATABASE_URL: str
@@ -27,11 +28,147 @@ class Settings(BaseSettings):
     AI_PROVIDER: str = "openai" # openai, openrouter, ollama
     OPENROUTER_API_KEY: Optional[str] = ""
     OLLAMA_BASE_URL: str = "http://localhost:11434/v1"
+    AI_PROVIDER_RATE_LIMIT: float = 2.0  # requests per second to the external provider
+    AI_PROVIDER_CONCURRENCY: int = 4  # most calls in flight; adapts down under errors and latency
+    AI_PROVIDER_LATENCY_TARGET: float = 20.0  # seconds; slower calls shrink the concurrency limit
+    AI_PROVIDER_TIMEOUT: float = 60.0  # seconds per provider call
+    AI_EXTERNAL_WINDOW_CHARS: int = 2000  # text sent per provider call
+    # Provider calls per document, each a paid request: windows are spread
+    # evenly over the document, so more windows cover more of a long text
+    # (each AI_EXTERNAL_WINDOW_CHARS long) at a proportionally higher cost
+    AI_EXTERNAL_MAX_WINDOWS: int = 3
+    AI_CACHE_BACKEND: str = "redis"  # redis, memory, or none
+    AI_CACHE_LOCAL_SIZE: int = 4096  # provider verdicts kept per process
+    AI_CACHE_SHARED_SIZE: int = 200000  # verdicts kept in Redis
+    AI_CACHE_TTL: int = 30 * 86400  # seconds
     
+    # Embedding
+    EMBEDDING_BACKEND: str = "torch"  # torch (fp32), int8 (quantized torch), or onnx
+    EMBEDDING_ONNX_DIR: str = "models/all-MiniLM-L6-v2-onnx"  # output of embedding_backends export
+    EMBEDDING_THREADS: int = 0  # CPU threads per worker, 0 = library default
+    EMBEDDING_BATCH_SIZE: int = 64
+    # Model server: one process holding the embedding and AI-detection models for the host
+    MODEL_SERVER_SOCKET: str = ""  # Unix socket path; empty loads the models in every process
+    MODEL_SERVER_MAX_BATCH: int = 64  # texts per micro-batch
+    MODEL_SERVER_MAX_LATENCY_MS: float = 10.0  # longest a request waits for its batch to fill
+    MODEL_SERVER_TIMEOUT: float = 120.0  # seconds a client waits for a response
+    EMBEDDING_CHUNK_TOKENS: int = 128  # chunk size in model tokens
+    EMBEDDING_CHUNK_OVERLAP: int = 16
+    EMBEDDING_CACHE_BACKEND: str = "redis"  # redis, memory, or none
+    EMBEDDING_CACHE_LOCAL_SIZE: int = 4096  # vectors kept per process
+    EMBEDDING_CACHE_SHARED_SIZE: int = 200000  # vectors kept in Redis
+    EMBEDDING_CACHE_TTL: int = 0  # seconds, 0 = no expiry
+    PASSAGE_MIN_SIMILARITY: float = 0.8  # chunk cosine similarity to report a passage match
+    PASSAGE_NEIGHBOURS: int = 10  # nearest chunks fetched per chunk
+
+    # pgvector ANN indexes (documents.embedding, embeddings.vector)
+    VECTOR_INDEX_TYPE: str = "hnsw"  # hnsw or ivfflat
+    HNSW_M: int = 16
+    HNSW_EF_CONSTRUCTION: int = 64
+    HNSW_EF_SEARCH: int = 40  # raised to the query's LIMIT when that is larger
+    IVFFLAT_LISTS: int = 100  # roughly rows / 1000 up to 1M rows
+    IVFFLAT_PROBES: int = 10
+    SCOPED_ANN_FACTOR: int = 4  # ef_search/probes multiplier when a scope filter drops index hits
+
+    # Document vector store: pgvector, or local memory-mapped files shared by the workers
+    VECTOR_STORE: str = "pgvector"  # pgvector or local
+    VECTOR_STORE_PATH: str = "/data/vector-store"
+    VECTOR_STORE_SEARCH: str = "exact"  # exact or ivf (after `python -m app.services.vector_store train-ivf`)
+    VECTOR_STORE_IVF_LISTS: int = 0  # 0 = 4 * sqrt(rows)
+    VECTOR_STORE_IVF_PROBES: int = 16
+    VECTOR_STORE_BLOCK: int = 65536  # rows per matrix product in exact search
+
+    # Search scope: batch, user, institution or global
+    COMPARISON_SCOPE: Literal["batch", "user", "institution", "global"] = "global"
+    DOCUMENT_VISIBILITY: str = "institution"  # default for uploads: private, institution or public
+
+    # Lexical near-duplicate detection (MinHash over word shingles, LSH bands)
+    MINHASH_PERMUTATIONS: int = 128
+    MINHASH_BANDS: int = 32  # 4 rows per band: pairs above ~0.45 Jaccard usually share a bucket
+    MINHASH_SHINGLE: int = 5  # words per shingle
+    MINHASH_THRESHOLD: float = 0.5  # estimated Jaccard to report a near-duplicate
+
+    # Winnowing fingerprints (k-grams of lowercased alphanumeric characters)
+    WINNOW_K: int = 25  # characters per k-gram, about five words
+    WINNOW_WINDOW: int = 40  # copies of k + window - 1 characters are always caught
+    WINNOW_MIN_SHARED: int = 3  # shared fingerprints to report a document
+    WINNOW_MAX_POSTINGS: int = 100  # documents read per fingerprint; caps boilerplate phrases
+    WINNOW_REGION_GAP: int = 200  # characters between fingerprints merged into one region
+    WINNOW_MAX_REGIONS: int = 20
+    WINNOW_TOP_K: int = 10  # documents reported per document
+
+    # Intra-batch all-pairs comparison
+    BATCH_SIMILARITY_THRESHOLD: float = 0.8
+    BATCH_SIMILARITY_BLOCK: int = 2048  # rows per block of the similarity matrix
+
+    # Two-stage retrieval: document-vector candidates, then chunk/lexical rerank
+    RETRIEVAL_CANDIDATES: int = 200  # stage 1 fan-out
+    RETRIEVAL_CANDIDATE_BUDGET_MS: int = 200  # per query vector
+    ANN_QUERY_BATCH: int = 100  # query vectors sent per multi-query statement
+    RETRIEVAL_RERANK: int = 50  # stage 1 candidates passed to stage 2
+    RETRIEVAL_RERANK_BUDGET_MS: int = 500
+    RETRIEVAL_TOP_K: int = 5
+    RERANK_DOCUMENT_WEIGHT: float = 0.2
+    RERANK_CHUNK_WEIGHT: float = 0.4
+    RERANK_LEXICAL_WEIGHT: float = 0.4
+
+    # AI Detection
+    AI_DETECTION_WINDOW_TOKENS: int = 510  # RoBERTa's 512 minus <s> and </s>
+    AI_DETECTION_BATCH_SIZE: int = 16  # chunks per classifier forward pass
+    AI_DETECTION_STRATEGY: str = "stratified"  # full, stratified or adaptive
+    AI_DETECTION_MAX_WINDOWS: int = 32  # windows sampled per document (stratified, adaptive)
+    AI_DETECTION_MIN_WINDOWS: int = 4  # adaptive: windows per round before checking the interval
+    AI_DETECTION_CI_WIDTH: float = 0.05  # adaptive: stop once the 95% interval of the score is this tight
+    # Cascade: statistical features, then the local model, then the external provider;
+    # a tier settles documents scoring outside its (LOW, HIGH) band
+    AI_DETECTION_CASCADE: bool = False
+    AI_STATISTICAL_MODEL: str = ""  # JSON file with fitted coefficients; the built-in ones settle nothing
+    AI_CASCADE_STATISTICAL_LOW: float = 0.05  # applies to a fitted AI_STATISTICAL_MODEL only
+    AI_CASCADE_STATISTICAL_HIGH: float = 0.95
+    AI_CASCADE_LOCAL_LOW: float = 0.2
+    AI_CASCADE_LOCAL_HIGH: float = 0.8
+
     # Plagiarism & Credit System
     SEARXNG_URL: str = "http://localhost:8080"
+    SEARXNG_CONCURRENCY: int = 8  # searches in flight per API worker
+    SEARXNG_REQUEST_TIMEOUT: float = 10.0  # seconds per search
+    SEARXNG_SCAN_TIMEOUT: float = 15.0  # seconds for all searches of one scan
+    SEARXNG_RATE_LIMIT: float = 20.0  # searches per second per API worker
+    SEARXNG_LATENCY_TARGET: float = 3.0
+    # Outbound calls (SearXNG, AI providers): circuit breaker and retries
+    OUTBOUND_FAILURE_THRESHOLD: int = 5  # consecutive failures that open the circuit
+    OUTBOUND_RESET_TIMEOUT: float = 30.0  # seconds before a probe call is let through
+    OUTBOUND_RETRIES: int = 2
+    OUTBOUND_BACKOFF: float = 0.5  # seconds; doubled per retry, with full jitter
+    OUTBOUND_BACKOFF_MAX: float = 8.0
     ADMIN_WHATSAPP_NUMBER: str = "6285226462973" # Default placeholder
     SCAN_COST: int = 1
+    SEARCH_CACHE_BACKEND: str = "redis"  # redis, memory, or none
+    SEARCH_CACHE_LOCAL_SIZE: int = 2048  # SearXNG result lists kept per process
+    SEARCH_CACHE_SHARED_SIZE: int = 100000  # result lists kept in Redis
+    SEARCH_CACHE_TTL: int = 86400  # seconds; web results go stale
+    SCAN_CACHE_LOCAL_SIZE: int = 256  # whole-document scan results kept per process
+    SCAN_CACHE_SHARED_SIZE: int = 20000
+    SCAN_CACHE_TTL: int = 86400
+    PLAGIARISM_QUERY_BUDGET: int = 5  # web searches per scan
+    PLAGIARISM_QUERY_WORDS: int = 32  # longest query; SearXNG gets its first 200 characters
+    PLAGIARISM_QUERY_MIN_WORDS: int = 8
+    PLAGIARISM_SIMILARITY_ENGINE: str = "suffix_automaton"  # suffix_automaton, ngram or sequence_matcher
+    SOURCE_VERIFY: bool = False  # align chunks against the full text of the top candidate pages
+    SOURCE_VERIFY_TOP: int = 3  # candidate pages fetched per scan
+    SOURCE_FETCH_CONCURRENCY: int = 4
+    SOURCE_FETCH_TIMEOUT: float = 10.0  # seconds per page
+    SOURCE_FETCH_SCAN_TIMEOUT: float = 15.0  # seconds for all fetches of one scan
+    SOURCE_FETCH_MAX_BYTES: int = 2_000_000  # longer pages are truncated
+    SOURCE_CACHE_PATH: str = "/data/source-cache"
+    SOURCE_CACHE_TTL: int = 7 * 86400  # seconds; 0 keeps pages for good
+    SOURCE_CACHE_PRUNE_INTERVAL: int = 3600  # seconds between deletions of expired pages, run by cache writes
+
+    @field_validator("COMPARISON_SCOPE", mode="before")
+    @classmethod
+    def _lowercase_scope(cls, value):
+        # An unknown scope fails at startup rather than in every batch task
+        return value.lower() if isinstance(value, str) else value
 
     class Config:
         env_file = ".env"
@@ -1,7 +1,7 @@
 import loguru
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
-from app.api.routes import router as api_router
+from app.api.routes import router as api_router, ai_service, plagiarism_service
 from app.api.auth import router as auth_router
 from app.api.users import router as users_router
 from app.core.db import engine
@@ -33,6 +33,10 @@ async def startup_event():
 @app.on_event("shutdown")
 async def shutdown_event():
     loguru.logger.info("Shutting down...")
+    await plagiarism_service.search_client.aclose()
+    if plagiarism_service.source_fetcher is not None:
+        await plagiarism_service.source_fetcher.aclose()
+    await ai_service.aclose()
 
 @app.get("/health")
 async def health_check():
@@ -1,14 +1,28 @@
 import uuid
-from sqlalchemy import Column, String, Float, DateTime, func, UUID, ForeignKey
+from sqlalchemy import Column, String, Float, Integer, DateTime, func, UUID, ForeignKey, Index
 from sqlalchemy.dialects.postgresql import JSONB
 from .base import Base
 
 class AIDetection(Base):
+    """
+    Stored AI-detection results, reusable while the text and the detector
+    are unchanged. Each analysis writes one document-level row (chunk_index
+    NULL, meta_data holding the result) and one row per analyzed window.
+    """
     __tablename__ = "ai_detection"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"))
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=True)  # NULL for ad-hoc /ai-check texts
+    content_hash = Column(String(64))  # SHA-256 of the analyzed text
     model_version = Column(String)
+    chunk_index = Column(Integer, nullable=True)
+    start_char = Column(Integer, nullable=True)  # Character offsets of the window in the text
+    end_char = Column(Integer, nullable=True)
     probability = Column(Float)
     meta_data = Column(JSONB)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_ai_detection_content_hash_model", "content_hash", "model_version"),
+        Index("ix_ai_detection_document_id", "document_id"),
+    )
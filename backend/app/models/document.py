@@ -1,22 +1,44 @@
 import uuid
-from sqlalchemy import Column, String, Text, DateTime, func, UUID, Float, Boolean, ForeignKey
+from sqlalchemy import Column, String, Text, DateTime, func, UUID, Float, Boolean, ForeignKey, LargeBinary, and_, literal_column
 from pgvector.sqlalchemy import Vector
 from .base import Base
+from .indexes import vector_index
+
+VISIBILITIES = ("private", "institution", "public")
+
+def not_failed(status):
+    """Predicate of the rows any corpus search may return: everything but failed uploads"""
+    return status.is_distinct_from(literal_column("'failed'"))
+
+def searchable(embedding, status):
+    """
+    Predicate of the rows vector search may return. Queries must repeat it
+    verbatim (with the literal inlined, not bound) for Postgres to use the
+    partial ANN index below.
+    """
+    return and_(embedding.isnot(None), not_failed(status))
 
 class Document(Base):
     __tablename__ = "documents"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    batch_id = Column(UUID(as_uuid=True), ForeignKey("batches.id"))
+    batch_id = Column(UUID(as_uuid=True), ForeignKey("batches.id"), index=True)
     filename = Column(String, nullable=False)
-    content_hash = Column(String)
+    content_hash = Column(String, index=True)
     mime_type = Column(String)
     text_content = Column(Text)
     embedding = Column(Vector(384))  # Assuming sentence-transformers/all-MiniLM-L6-v2 embedding dim
+    minhash = Column(LargeBinary)  # MinHash signature of the word shingles, uint32 per permutation
     storage_path = Column(String)
-    uploaded_by = Column(UUID(as_uuid=True))
+    uploaded_by = Column(UUID(as_uuid=True), index=True)
+    institution = Column(String, index=True)  # Copied from the uploader, scopes institution-wide search
+    visibility = Column(String, default="institution", server_default="institution")  # private, institution, or public
     status = Column(String, default="queued")  # queued, processing, completed, failed
     ai_score = Column(Float, default=0.0)  # AI detection confidence score
     is_ai_generated = Column(Boolean, default=False)  # Is the text AI-generated?
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
+
+    __table_args__ = (
+        vector_index("ix_documents_embedding_searchable", "embedding", where=searchable(embedding, status)),
+    )
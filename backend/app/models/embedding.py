@@ -1,13 +1,22 @@
 import uuid
-from sqlalchemy import Column, ForeignKey, String, DateTime, func, UUID
+from sqlalchemy import Column, ForeignKey, Integer, String, DateTime, func, UUID
 from pgvector.sqlalchemy import Vector
 from .base import Base
+from .indexes import vector_index
 
 class Embedding(Base):
     __tablename__ = "embeddings"
 
     id = Column(UUID(as_uuid=True), primary_key=True, default=uuid.uuid4)
-    file_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False)
+    file_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), nullable=False, index=True)
     vector = Column(Vector(384), nullable=False)
     type = Column(String, nullable=False)  # 'text' or 'image'
+    chunk_index = Column(Integer)  # Position of the chunk within the document
+    start_char = Column(Integer)  # Character offsets of the chunk in Document.text_content
+    end_char = Column(Integer)
     created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+    __table_args__ = (
+        # ANN index for chunk-to-chunk passage search
+        vector_index("ix_embeddings_vector_ann", "vector"),
+    )
@@ -0,0 +1,16 @@
+from sqlalchemy import Column, Integer, UUID, ForeignKey, Index
+from .base import Base
+
+class Fingerprint(Base):
+    """Inverted index of winnowed k-gram hashes: hash -> (document, span)"""
+    __tablename__ = "fingerprints"
+
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), primary_key=True)
+    start_char = Column(Integer, primary_key=True)  # Character offsets of the k-gram in Document.text_content
+    end_char = Column(Integer, nullable=False)
+    hash = Column(Integer, nullable=False)
+
+    __table_args__ = (
+        # Covers the posting-list scan, so lookups never touch the heap
+        Index("ix_fingerprints_hash", "hash", "document_id", "start_char", "end_char"),
+    )
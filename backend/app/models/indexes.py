@@ -0,0 +1,26 @@
+from sqlalchemy import Index
+from app.core.config import settings
+
+
+def vector_index(name: str, column: str, where=None) -> Index:
+    """
+    Cosine ANN index for a pgvector column, built as HNSW or IVFFlat
+    depending on Settings.VECTOR_INDEX_TYPE. `where` makes it a partial index.
+    """
+    if settings.VECTOR_INDEX_TYPE.lower() == "ivfflat":
+        return Index(
+            name,
+            column,
+            postgresql_using="ivfflat",
+            postgresql_with={"lists": settings.IVFFLAT_LISTS},
+            postgresql_ops={column: "vector_cosine_ops"},
+            postgresql_where=where,
+        )
+    return Index(
+        name,
+        column,
+        postgresql_using="hnsw",
+        postgresql_with={"m": settings.HNSW_M, "ef_construction": settings.HNSW_EF_CONSTRUCTION},
+        postgresql_ops={column: "vector_cosine_ops"},
+        postgresql_where=where,
+    )
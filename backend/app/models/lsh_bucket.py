@@ -0,0 +1,14 @@
+from sqlalchemy import Column, SmallInteger, BigInteger, UUID, ForeignKey, Index
+from .base import Base
+
+class LSHBucket(Base):
+    """One row per (band, bucket) of a document's MinHash signature"""
+    __tablename__ = "lsh_buckets"
+
+    band = Column(SmallInteger, primary_key=True)
+    bucket = Column(BigInteger, primary_key=True)  # Hash of the band's signature rows
+    document_id = Column(UUID(as_uuid=True), ForeignKey("documents.id"), primary_key=True)
+
+    __table_args__ = (
+        Index("ix_lsh_buckets_document_id", "document_id"),
+    )
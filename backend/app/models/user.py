@@ -10,5 +10,6 @@ class User(Base):
     hashed_password = Column(String, nullable=False)
     role = Column(String, nullable=False, default="user")
     scan_credits = Column(Integer, default=0, nullable=False)
+    institution = Column(String, index=True)  # Tenant whose corpus institution-scoped search covers
     created_at = Column(DateTime(timezone=True), server_default=func.now())
     updated_at = Column(DateTime(timezone=True), onupdate=func.now())
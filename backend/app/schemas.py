@@ -1,8 +1,10 @@
 import uuid
+from typing import Optional
 from fastapi_users import schemas
 
 class UserRead(schemas.BaseUser[uuid.UUID]):
     scan_credits: int
+    institution: Optional[str] = None
 
 class UserCreate(schemas.BaseUserCreate):
     pass
@@ -1,7 +1,19 @@
+import asyncio
+import hashlib
 import os
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List, Optional
+
+import httpx
+import numpy as np
+
 from app.core.config import settings
+from app.services.cache import build_cache, decode_json, encode_json
+from app.services.embedding_backends import load_tokenizer
+from app.services.governor import OutboundUnavailable, get_governor
+from app.services.model_server import RemoteClassifier, get_model_client
+from app.services.segmentation import Segmenter, approx_token_length, segment, tokenizer_length
+from app.services.text_statistics import StatisticalDetector
 
 try:
     from transformers import pipeline
@@ -9,14 +21,42 @@ try:
 except ImportError:
     HAS_TRANSFORMERS = False
 
+EXTERNAL_PROVIDERS = ("openai", "openrouter", "ollama")
+PROVIDER_MODELS = {
+    "openai": "gpt-3.5-turbo",
+    "openrouter": "google/gemma-7b-it",  # Default free model
+    "ollama": "mistral",
+}
+
+LOCAL_MODEL = "roberta-base-openai-detector"
+
+def _strata(n: int, k: int) -> List[int]:
+    """All n window indices, or the middle one of each of k equal strata when n > k"""
+    if n <= k:
+        return list(range(n))
+    return ((np.arange(k) + 0.5) * n / k).astype(int).tolist()
+
 class AIDetectionService:
     def __init__(self):
         self.classifier = None
+        self.segmenter = Segmenter("detection", settings.AI_DETECTION_WINDOW_TOKENS, length=approx_token_length)
+        self.batch_size = settings.AI_DETECTION_BATCH_SIZE
+        self.strategy = settings.AI_DETECTION_STRATEGY.lower()
+        if self.strategy not in ("full", "stratified", "adaptive"):
+            raise ValueError(f"Unknown AI detection strategy '{self.strategy}', expected full, stratified or adaptive")
+        self.max_windows = settings.AI_DETECTION_MAX_WINDOWS
+        self.min_windows = settings.AI_DETECTION_MIN_WINDOWS
+        self.ci_width = settings.AI_DETECTION_CI_WIDTH
         self.provider = settings.AI_PROVIDER.lower()
         self.enabled = False
+        self.external = False
+        self.cascade = settings.AI_DETECTION_CASCADE
+        self._client = None
+        self._loop = None
+        self.cache = None
         
         # Check if external provider is configured
-        if self.provider in ["openai", "openrouter", "ollama"]:
+        if self.provider in EXTERNAL_PROVIDERS:
             if self.provider == "openai" and settings.OPENAI_API_KEY:
                 self.enabled = True
             elif self.provider == "openrouter" and settings.OPENROUTER_API_KEY:
@@ -25,151 +65,442 @@ class AIDetectionService:
                 self.enabled = True
             
             if self.enabled:
+                self.external = True
+                self.governor = get_governor(self.provider)
+                self.external_segmenter = Segmenter("external-detection", settings.AI_EXTERNAL_WINDOW_CHARS)
+                self.external_max_windows = settings.AI_EXTERNAL_MAX_WINDOWS
+                # Provider verdicts per (provider, model, window hash)
+                self.cache = build_cache(
+                    "ai-external",
+                    encode_json,
+                    decode_json,
+                    backend=settings.AI_CACHE_BACKEND,
+                    local_size=settings.AI_CACHE_LOCAL_SIZE,
+                    shared_size=settings.AI_CACHE_SHARED_SIZE,
+                    ttl=settings.AI_CACHE_TTL or None,
+                )
                 print(f"Using external AI Provider: {self.provider}")
-                return
+                if not self.cascade:
+                    return
 
-        # Fallback to local model if properly configured and not Vercel
-        if HAS_TRANSFORMERS and not os.getenv("VERCEL"):
+        # Fallback to local model: on the model server if there is one,
+        # else in this process if properly configured and not Vercel
+        if get_model_client() is not None:
+            tokenizer = load_tokenizer(LOCAL_MODEL)
+            self.classifier = RemoteClassifier(get_model_client(), tokenizer)
+            if tokenizer is not None:
+                self.segmenter.length = tokenizer_length(tokenizer)
+            self.enabled = True
+            print(f"Using AI detection model on the model server at {settings.MODEL_SERVER_SOCKET}")
+        elif HAS_TRANSFORMERS and not os.getenv("VERCEL"):
             try:
                 # We use a pipeline for text classification
                 # Note: This will download the model on first run (approx 500MB)
-                model_name = "roberta-base-openai-detector"
-                self.classifier = pipeline("text-classification", model=model_name)
+                self.classifier = pipeline("text-classification", model=LOCAL_MODEL)
+                self.segmenter.length = tokenizer_length(self.classifier.tokenizer)
                 self.enabled = True
                 print("Using local HuggingFace model for AI detection")
             except Exception as e:
                 print(f"Failed to load AI detection model: {e}")
 
+        if self.cascade:
+            # Cheapest tier first; each later tier only sees the documents
+            # the previous one could not decide
+            self.statistical = StatisticalDetector(settings.AI_STATISTICAL_MODEL or None)
+            if not self.statistical.calibrated and not self.classifier and not self.external:
+                # Hand-set coefficients alone must not decide documents
+                print("AI detection cascade has no model beyond the uncalibrated statistical detector; detection unavailable")
+                self.cascade = False
+                return
+            self.tiers = ["statistical"] + (["local"] if self.classifier else []) + (["external"] if self.external else [])
+            self.bands = {
+                "statistical": (settings.AI_CASCADE_STATISTICAL_LOW, settings.AI_CASCADE_STATISTICAL_HIGH),
+                "local": (settings.AI_CASCADE_LOCAL_LOW, settings.AI_CASCADE_LOCAL_HIGH),
+            }
+            if not self.statistical.calibrated:
+                # Uncalibrated scores only stand in when every later tier fails
+                self.bands["statistical"] = (0.0, 1.0)
+                print("Statistical AI detector is not calibrated (set AI_STATISTICAL_MODEL); it settles no documents")
+            self.tier_counts = {tier: 0 for tier in self.tiers}
+            self.enabled = True
+            print(f"Using cascaded AI detection: {' -> '.join(self.tiers)}")
+
+    @property
+    def model_version(self) -> str:
+        """
+        Identifies everything a stored result depends on: the detector and
+        how documents are windowed and sampled
+        """
+        sampling = f"{self.strategy}/{self.max_windows}"
+        if self.strategy == "adaptive":
+            sampling += f"/{self.min_windows}/{self.ci_width}"
+        external = f"{self.provider}/{PROVIDER_MODELS.get(self.provider)}:c{settings.AI_EXTERNAL_WINDOW_CHARS}:w{settings.AI_EXTERNAL_MAX_WINDOWS}"
+        local = f"{LOCAL_MODEL}:t{self.segmenter.max_length}:{sampling}"
+        if self.cascade:
+            statistical = f"statistical:{settings.AI_STATISTICAL_MODEL or 'default'}"
+            tiers = {"statistical": statistical, "local": local, "external": external}
+            bands = ",".join(f"{tier}{low}-{high}" for tier, (low, high) in self.bands.items() if tier in self.tiers)
+            return f"cascade[{bands}]:" + "|".join(tiers[tier] for tier in self.tiers)
+        return external if self.external else local
+
+    def _make_client(self):
+        """An AsyncOpenAI client for the provider; retries are left to the governor"""
+        from openai import AsyncOpenAI
+
+        base_url, api_key = {
+            "openrouter": ("https://openrouter.ai/api/v1", settings.OPENROUTER_API_KEY),
+            "ollama": (settings.OLLAMA_BASE_URL, "ollama"),  # key required but unused
+        }.get(self.provider, (None, settings.OPENAI_API_KEY))
+        return AsyncOpenAI(
+            base_url=base_url,
+            api_key=api_key,
+            max_retries=0,
+            http_client=httpx.AsyncClient(
+                timeout=settings.AI_PROVIDER_TIMEOUT,
+                limits=httpx.Limits(
+                    max_connections=settings.AI_PROVIDER_CONCURRENCY,
+                    max_keepalive_connections=settings.AI_PROVIDER_CONCURRENCY,
+                ),
+            ),
+        )
+
     def _get_client(self):
-        """Get the appropriate OpenAI-compatible client"""
-        from openai import OpenAI
-        
-        if self.provider == "openrouter":
-            return OpenAI(
-                base_url="https://openrouter.ai/api/v1",
-                api_key=settings.OPENROUTER_API_KEY,
-            ), "google/gemma-7b-it" # Default free model or configurable
-            
-        elif self.provider == "ollama":
-            return OpenAI(
-                base_url=settings.OLLAMA_BASE_URL,
-                api_key="ollama", # required but unused
-            ), "mistral" # Default ollama model
-            
-        else: # OpenAI
-            return OpenAI(api_key=settings.OPENAI_API_KEY), "gpt-3.5-turbo"
+        """
+        The provider's client and model. One client per event loop keeps its
+        connection pool alive across calls; the concurrency cap and in-flight
+        requests belong to the same loop.
+        """
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            # A client left over from an ended loop cannot be closed from this one;
+            # callers that end their loop close it first with aclose()
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(settings.AI_PROVIDER_CONCURRENCY)
+            self._inflight = {}
+            self._client = self._make_client()
+        return self._client, PROVIDER_MODELS.get(self.provider, "gpt-3.5-turbo")
 
-    def _detect_with_external_api(self, text: str) -> Dict[str, Any]:
-        """Detect AI-generated text using configured External API"""
+    async def aclose(self):
+        """Close the provider client; call before the event loop it was made on ends"""
+        if self._client is not None:
+            client, self._client = self._client, None
+            await client.close()
+
+    async def _adetect_many_and_close(self, texts: List[str]) -> List[Dict[str, Any]]:
         try:
-            client, model = self._get_client()
-            
-            prompt = f"""Analyze the following text and determine if it was written by AI or a human.
+            return await self.adetect_many(texts)
+        finally:
+            await self.aclose()
+
+    async def _ask_provider(self, text: str) -> Dict[str, Any]:
+        """The provider's verdict on one window: {"is_ai": bool, "confidence": float}"""
+        client, model = self._get_client()
+        prompt = f"""Analyze the following text and determine if it was written by AI or a human.
 Respond with ONLY a JSON object with two fields:
 - "is_ai": true or false
 - "confidence": a number between 0 and 1
 
 Text to analyze:
-{text[:2000]}"""
-            
-            response = client.chat.completions.create(
+{text}"""
+        async with self._semaphore:
+            response = await self.governor.acall(
+                client.chat.completions.create,
                 model=model,
                 messages=[{"role": "user", "content": prompt}],
                 temperature=0.0
             )
-            
-            content = response.choices[0].message.content
-            # Handle potential markdown code block wrapping
-            if content.startswith("```json"):
-                content = content[7:]
-            if content.endswith("```"):
-                content = content[:-3]
-                
-            result = json.loads(content.strip())
-            
-            return {
-                "is_ai": result.get("is_ai", False),
-                "score": result.get("confidence", 0.5),
-                "confidence": result.get("confidence", 0.5),
-                "label": "AI" if result.get("is_ai") else "Human",
-                "message": f"Analysis complete ({self.provider})"
-            }
-        except Exception as e:
-            print(f"Error using External API ({self.provider}): {e}")
-            return {
-                "is_ai": False,
-                "score": 0.0,
-                "confidence": 0.0,
-                "label": "ERROR",
-                "message": f"External API error: {str(e)}"
+
+        content = response.choices[0].message.content
+        # Handle potential markdown code block wrapping
+        if content.startswith("```json"):
+            content = content[7:]
+        if content.endswith("```"):
+            content = content[:-3]
+
+        result = json.loads(content.strip())
+        return {"is_ai": bool(result.get("is_ai", False)), "confidence": float(result.get("confidence", 0.5))}
+
+    async def _classify_external(self, text: str) -> Dict[str, Any]:
+        """
+        The provider's verdict on one window, from the cache when possible.
+        Concurrent requests for the same window share one provider call.
+        """
+        _, model = self._get_client()
+        key = f"{self.provider}:{model}:{hashlib.sha256(text.encode()).hexdigest()}"
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, key)
+            if cached is not None:
+                return cached
+
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(self._ask_and_cache(key, text))
+            self._inflight[key] = task
+            task.add_done_callback(lambda _: self._inflight.pop(key, None))
+        # shield: one waiter being cancelled must not cancel the shared call
+        return await asyncio.shield(task)
+
+    async def _ask_and_cache(self, key: str, text: str) -> Dict[str, Any]:
+        verdict = await self._ask_provider(text)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, key, verdict)
+        return verdict
+
+    async def _adetect_external_many(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        External detection for many documents. Each document is cut into
+        windows of AI_EXTERNAL_WINDOW_CHARS, of which at most
+        AI_EXTERNAL_MAX_WINDOWS, spread over the document, are sent: every
+        window is a paid call, whatever AI_DETECTION_STRATEGY the local model
+        uses. All windows of all documents are sent concurrently, bounded by
+        AI_PROVIDER_CONCURRENCY and the provider's governor.
+        """
+        unique = list(dict.fromkeys(texts))
+        doc_spans = [segment(text, self.external_segmenter) if text else [] for text in unique]
+        requests = [(i, w) for i, spans in enumerate(doc_spans) for w in _strata(len(spans), self.external_max_windows)]
+        verdicts = await asyncio.gather(
+            *(self._classify_external(doc_spans[i][w].text) for i, w in requests),
+            return_exceptions=True,
+        )
+
+        per_doc = [[] for _ in unique]
+        errors = [[] for _ in unique]
+        for (i, w), verdict in zip(requests, verdicts):
+            if isinstance(verdict, BaseException):
+                errors[i].append(verdict)
+                continue
+            # AI probability of the window
+            probability = verdict["confidence"] if verdict["is_ai"] else 1 - verdict["confidence"]
+            per_doc[i].append([doc_spans[i][w].start, doc_spans[i][w].end, probability])
+
+        by_text = {}
+        for i, text in enumerate(unique):
+            windows = per_doc[i]
+            if not windows:
+                if not errors[i]:
+                    by_text[text] = self._unavailable("No text to analyze")
+                elif any(isinstance(e, OutboundUnavailable) for e in errors[i]):
+                    # Failing fast while the provider recovers
+                    by_text[text] = {
+                        "is_ai": False,
+                        "score": 0.0,
+                        "confidence": 0.0,
+                        "label": "UNAVAILABLE",
+                        "message": f"External API temporarily unavailable: {str(errors[i][0])}"
+                    }
+                else:
+                    print(f"Error using External API ({self.provider}): {errors[i][0]!r}")
+                    by_text[text] = {
+                        "is_ai": False,
+                        "score": 0.0,
+                        "confidence": 0.0,
+                        "label": "ERROR",
+                        "message": f"External API error: {str(errors[i][0])}"
+                    }
+                continue
+            score = sum(p for _, _, p in windows) / len(windows)
+            is_ai = score > 0.5
+            by_text[text] = {
+                "is_ai": is_ai,
+                "score": score,
+                "confidence": score if is_ai else 1 - score,
+                "label": "AI" if is_ai else "Human",
+                "windows": windows,
+                "windows_total": len(doc_spans[i]),
+                "failed_windows": len(errors[i]),
+                "message": f"Analysis complete ({self.provider}, {len(windows)} chunks analyzed)"
             }
+        return [dict(by_text[text]) for text in texts]
 
-    def detect(self, text: str) -> Dict[str, Any]:
+    async def _run_tier(self, tier: str, texts: List[str]) -> List[Dict[str, Any]]:
+        if tier == "statistical":
+            return await asyncio.to_thread(self.statistical.detect_many, texts)
+        if tier == "local":
+            return await asyncio.to_thread(self._detect_local_many, texts)
+        return await self._adetect_external_many(texts)
+
+    async def _adetect_cascade(self, texts: List[str]) -> List[Dict[str, Any]]:
         """
-        Detects if the text is AI-generated.
-        Returns a dictionary with 'is_ai' (bool) and 'score' (float).
+        Run the tiers cheapest first. A document is settled by the first tier
+        whose score falls outside that tier's uncertain band (low, high); the
+        last tier settles everything left. If a more expensive tier fails,
+        the cheaper tier's answer stands. Results carry the deciding "tier".
         """
+        results = [None] * len(texts)
+        pending = list(range(len(texts)))
+        for n, tier in enumerate(self.tiers):
+            if not pending:
+                break
+            low, high = self.bands.get(tier, (0.5, 0.5))
+            last = n == len(self.tiers) - 1
+            uncertain = []
+            for i, result in zip(pending, await self._run_tier(tier, [texts[i] for i in pending])):
+                failed = result.get("label") in ("ERROR", "UNAVAILABLE")
+                if failed and results[i] is not None:
+                    results[i]["escalation_error"] = result.get("message")
+                    self.tier_counts[results[i]["tier"]] += 1
+                    continue
+                results[i] = {**result, "tier": tier}
+                if not last and not failed and low < result["score"] < high:
+                    uncertain.append(i)
+                else:
+                    self.tier_counts[tier] += 1
+            pending = uncertain
+        return results
+
+    def cascade_stats(self) -> Optional[Dict[str, int]]:
+        """Documents settled by each tier of the cascade in this process"""
+        return dict(self.tier_counts) if self.cascade else None
+
+    async def adetect_many(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """detect_many for async callers: provider calls run concurrently, local inference off the event loop"""
         if not self.enabled:
-            return {
-                "is_ai": False,
-                "score": 0.0,
-                "confidence": 0.0,
-                "label": "UNKNOWN",
-                "message": "AI Detection unavailable (Lite Mode or Model missing)"
-            }
-        
-        # Use external API if configured
-        if self.provider in ["openai", "openrouter", "ollama"]:
-            return self._detect_with_external_api(text)
+            return [self._unavailable("AI Detection unavailable (Lite Mode or Model missing)") for _ in texts]
+        if self.cascade:
+            return await self._adetect_cascade(texts)
+        if self.external:
+            return await self._adetect_external_many(texts)
+        return await asyncio.to_thread(self.detect_many, texts)
+
+    async def adetect(self, text: str) -> Dict[str, Any]:
+        return (await self.adetect_many([text]))[0]
+
+    def _unavailable(self, message: str) -> Dict[str, Any]:
+        return {"is_ai": False, "score": 0.0, "confidence": 0.0, "label": "UNKNOWN", "message": message}
+
+    def _classify(self, chunks: List[str]) -> np.ndarray:
+        """
+        Probability that each chunk is AI-generated, in one pipeline call.
+        Chunks are sorted by length so each batch pads to a similar size,
+        then the scores are put back in their original order.
+        """
+        lengths = np.fromiter((len(c) for c in chunks), dtype=np.int64, count=len(chunks))
+        order = np.argsort(-lengths, kind="stable")
+        outputs = self.classifier(
+            [chunks[i] for i in order],
+            batch_size=self.batch_size,
+            truncation=True,
+            padding=True,
+        )
+        # 'Fake' usually means AI-generated in these models
+        scores = np.fromiter(
+            (o["score"] if o["label"] == "Fake" else 1 - o["score"] for o in outputs),
+            dtype=np.float64,
+            count=len(chunks),
+        )
+        probabilities = np.empty_like(scores)
+        probabilities[order] = scores
+        return probabilities
+
+    def _window_order(self, n: int) -> List[int]:
+        """
+        Indices of the windows to classify, in the order to classify them.
+        'full' takes every window; 'stratified' one window from the middle of
+        each of max_windows equal strata; 'adaptive' the same sample, ordered
+        so that every prefix is spread over the whole document.
+        """
+        order = list(range(n)) if self.strategy == "full" else _strata(n, self.max_windows)
+        if self.strategy == "adaptive":
+            # Bit-reversed positions: 0, 1/2, 1/4, 3/4, ... of the sample
+            bits = max(1, (len(order) - 1).bit_length())
+            order = [order[i] for i in sorted(range(len(order)), key=lambda i: int(format(i, f"0{bits}b")[::-1], 2))]
+        return order
+
+    def _settled(self, scores: List[float], n: int) -> bool:
+        """Whether the 95% confidence interval of a document's mean score is tight enough to stop"""
+        k = len(scores)
+        if k < self.min_windows:
+            return False
+        # Finite population correction: k of the document's n windows are known
+        margin = 1.96 * np.std(scores, ddof=1) / np.sqrt(k) * np.sqrt(max(0.0, 1 - k / n))
+        return margin <= self.ci_width
+
+    def detect_many(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """
+        Detect AI-generated text in many documents at once. With the local
+        model, documents are cut into windows of the model's token limit and
+        the windows chosen by AI_DETECTION_STRATEGY go through the classifier
+        together, in rounds for the adaptive strategy, which stops sampling a
+        document once its score is settled. Scores are aggregated per document
+        (mean AI probability) and reported per window; identical texts are
+        classified once.
+        """
+        if not self.enabled:
+            return [self._unavailable("AI Detection unavailable (Lite Mode or Model missing)") for _ in texts]
+
+        # The cascade and the external API are async; from synchronous code only.
+        # The loop ends with this call, so its provider client is closed with it
+        if self.cascade or self.external:
+            return asyncio.run(self._adetect_many_and_close(texts))
 
         # Use local model
         if not self.classifier:
-            return {
-                "is_ai": False,
-                "score": 0.0,
-                "confidence": 0.0,
-                "label": "UNKNOWN",
-                "message": "Local model not available"
-            }
+            return [self._unavailable("Local model not available") for _ in texts]
+        return self._detect_local_many(texts)
+
+    def _detect_local_many(self, texts: List[str]) -> List[Dict[str, Any]]:
+        """detect_many with the local classifier"""
+        unique = list(dict.fromkeys(texts))
+        # Chunk text along sentence boundaries into windows that fit the model
+        doc_spans = [segment(text, self.segmenter) if text else [] for text in unique]
+        orders = [self._window_order(len(spans)) for spans in doc_spans]
+        scores = [{} for _ in unique]
+        step = self.min_windows if self.strategy == "adaptive" else None
 
-        # Chunk text for better detection on long documents
-        chunk_size = 1000
-        chunks = [text[i:i + chunk_size] for i in range(0, len(text), chunk_size)]
-        
         try:
-            results = []
-            for chunk in chunks[:5]: # Limit to first 5 chunks for performance
-                res = self.classifier(chunk)[0]
-                results.append(res)
-            
-            if not results:
-                return {"is_ai": False, "score": 0.0, "confidence": 0.0, "label": "UNKNOWN", "message": "No text to analyze"}
-
-            # Aggregate results (average AI probability)
-            ai_scores = []
-            for res in results:
-                label = res['label']
-                score = res['score']
-                # 'Fake' usually means AI-generated in these models
-                is_ai_chunk = label == 'Fake'
-                ai_scores.append(score if is_ai_chunk else (1 - score))
-            
-            avg_ai_score = sum(ai_scores) / len(ai_scores)
-            is_ai = avg_ai_score > 0.5
-            
-            return {
-                "is_ai": is_ai,
-                "score": avg_ai_score,
-                "confidence": max(ai_scores) if is_ai else (1 - min(ai_scores)),
-                "label": "Fake" if is_ai else "Real",
-                "message": f"Analysis complete ({len(results)} chunks analyzed)"
-            }
+            pending = [i for i, order in enumerate(orders) if order]
+            while pending:
+                # One classifier call per round for every document still sampling
+                requests = [
+                    (i, w) for i in pending
+                    for w in (orders[i][len(scores[i]):len(scores[i]) + step] if step else orders[i])
+                ]
+                probabilities = self._classify([doc_spans[i][w].text for i, w in requests])
+                for (i, w), probability in zip(requests, probabilities):
+                    scores[i][w] = float(probability)
+                pending = [
+                    i for i in pending
+                    if step and len(scores[i]) < len(orders[i])
+                    and not self._settled(list(scores[i].values()), len(doc_spans[i]))
+                ]
         except Exception as e:
             print(f"Error during AI detection: {e}")
-            return {
-                "is_ai": False,
-                "score": 0.0,
-                "confidence": 0.0,
-                "label": "ERROR",
-                "message": str(e)
+            error = {"is_ai": False, "score": 0.0, "confidence": 0.0, "label": "ERROR", "message": str(e)}
+            return [dict(error) for _ in texts]
+
+        # Mean, max and min AI probability per document without a Python loop over windows
+        counts = np.array([len(per_doc) for per_doc in scores], dtype=np.int64)
+        probabilities = np.fromiter((p for per_doc in scores for p in per_doc.values()), dtype=np.float64, count=int(counts.sum()))
+        owners = np.repeat(np.arange(len(unique)), counts)
+        means = np.bincount(owners, weights=probabilities, minlength=len(unique)) / np.maximum(counts, 1)
+        highest = np.full(len(unique), -np.inf)
+        lowest = np.full(len(unique), np.inf)
+        np.maximum.at(highest, owners, probabilities)
+        np.minimum.at(lowest, owners, probabilities)
+
+        by_text = {}
+        for i, text in enumerate(unique):
+            if not counts[i]:
+                by_text[text] = self._unavailable("No text to analyze")
+                continue
+            is_ai = bool(means[i] > 0.5)
+            spans = doc_spans[i]
+            windows = [[spans[w].start, spans[w].end, p] for w, p in sorted(scores[i].items())]
+            by_text[text] = {
+                "is_ai": is_ai,
+                "score": float(means[i]),
+                "confidence": float(highest[i] if is_ai else 1 - lowest[i]),
+                "label": "Fake" if is_ai else "Real",
+                "windows": windows,
+                "windows_total": len(spans),
+                "coverage": sum(end - start for start, end, _ in windows) / sum(span.end - span.start for span in spans),
+                "message": f"Analysis complete ({counts[i]} chunks analyzed)"
             }
+        return [dict(by_text[text]) for text in texts]
+
+    def detect(self, text: str) -> Dict[str, Any]:
+        """
+        Detects if the text is AI-generated.
+        Returns a dictionary with 'is_ai' (bool) and 'score' (float).
+        """
+        return self.detect_many([text])[0]
@@ -0,0 +1,135 @@
+import hashlib
+import uuid
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import delete, insert, select
+
+from app.models.ai_detection import AIDetection
+
+# Results that describe a failure rather than the text are never stored
+_UNSTORED_LABELS = ("ERROR", "UNAVAILABLE", "UNKNOWN")
+
+
+def content_hash(text: str) -> str:
+    return hashlib.sha256(text.encode()).hexdigest()
+
+
+class AIDetectionStore:
+    """
+    AI-detection results in the ai_detection table, keyed by content hash
+    and model version, so an unchanged text is never analyzed twice by the
+    same detector, whichever document or request it arrives in.
+    """
+
+    def __init__(self, db_session):
+        self.db = db_session
+
+    async def load(self, hashes: List[str], model_version: str) -> Dict[str, Dict[str, Any]]:
+        """Stored results by content hash, with their windows rebuilt from the chunk rows"""
+        if not hashes:
+            return {}
+        try:
+            # In a savepoint, so a failed read does not abort the caller's transaction
+            async with self.db.begin_nested():
+                rows = await self._select(hashes, model_version)
+        except Exception as e:
+            print(f"Error loading stored AI detection results: {e}")
+            return {}
+
+        results = {}
+        source = {}  # the one analysis each hash is rebuilt from
+        for h, document_id, chunk_index, start, end, probability, meta in rows:
+            if chunk_index is None:
+                if h not in results:
+                    results[h] = {**meta, "windows": []}
+                    source[h] = document_id
+            elif h in results and source[h] == document_id:
+                results[h]["windows"].append([start, end, probability])
+        return results
+
+    async def _select(self, hashes: List[str], model_version: str) -> list:
+        return (await self.db.execute(
+            select(
+                AIDetection.content_hash,
+                AIDetection.document_id,
+                AIDetection.chunk_index,
+                AIDetection.start_char,
+                AIDetection.end_char,
+                AIDetection.probability,
+                AIDetection.meta_data,
+            )
+            .where(AIDetection.content_hash.in_(set(hashes)), AIDetection.model_version == model_version)
+            .order_by(AIDetection.content_hash, AIDetection.document_id, AIDetection.chunk_index.nulls_first())
+        )).all()
+
+    async def save(self, entries: List[tuple], model_version: str):
+        """
+        Store (document_id, content_hash, result) entries with one bulk insert,
+        replacing earlier results of the same documents for this model version.
+        Storing is best effort: a failed write is rolled back to a savepoint
+        and logged, and the results are simply not reused later.
+        """
+        rows = []
+        for document_id, h, result in entries:
+            # A cascade answer whose escalation failed is provisional: the
+            # better tier is asked again next time rather than never
+            if result.get("label") in _UNSTORED_LABELS or result.get("escalation_error"):
+                continue
+            meta = {key: value for key, value in result.items() if key not in ("windows", "stored")}
+            rows.append({
+                "id": uuid.uuid4(), "document_id": document_id, "content_hash": h, "model_version": model_version,
+                "chunk_index": None, "start_char": None, "end_char": None,
+                "probability": result.get("score", 0.0), "meta_data": meta,
+            })
+            rows.extend(
+                {
+                    "id": uuid.uuid4(), "document_id": document_id, "content_hash": h, "model_version": model_version,
+                    "chunk_index": index, "start_char": start, "end_char": end, "probability": probability, "meta_data": None,
+                }
+                for index, (start, end, probability) in enumerate(result.get("windows", []))
+            )
+        if not rows:
+            return
+        document_ids = {row["document_id"] for row in rows if row["document_id"] is not None}
+        try:
+            async with self.db.begin_nested():
+                if document_ids:
+                    await self.db.execute(
+                        delete(AIDetection).where(AIDetection.document_id.in_(document_ids), AIDetection.model_version == model_version)
+                    )
+                await self.db.execute(insert(AIDetection), rows)
+        except Exception as e:
+            print(f"Error storing AI detection results: {e}")
+            return
+        await self.db.commit()
+
+    async def detect_many(self, ai_service, texts: List[str], document_ids: Optional[List] = None,
+                          hashes: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        Results for many texts: stored ones where the text and model are
+        unchanged (marked "stored"), the rest detected with ai_service and
+        stored. Pass hashes when the caller already has them
+        (e.g. Document.content_hash).
+        """
+        document_ids = document_ids or [None] * len(texts)
+        hashes = hashes or [content_hash(text) for text in texts]
+        model_version = ai_service.model_version
+        stored = await self.load(hashes, model_version)
+
+        missing = {}
+        for h, text in zip(hashes, texts):
+            if h not in stored and h not in missing:
+                missing[h] = text
+        fresh = dict(zip(missing, await ai_service.adetect_many(list(missing.values())))) if missing else {}
+
+        # Every document whose text was just analyzed gets its rows; a text
+        # without a document (/ai-check) is stored once per hash
+        entries = []
+        stored_for = set()
+        for document_id, h in zip(document_ids, hashes):
+            if h in fresh and (h not in stored_for or document_id is not None):
+                entries.append((document_id, h, fresh[h]))
+                stored_for.add(h)
+        await self.save(entries, model_version)
+
+        return [{**stored[h], "stored": True} if h in stored else dict(fresh[h]) for h in hashes]
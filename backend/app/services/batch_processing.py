@@ -1,14 +1,24 @@
+from collections import defaultdict
 from celery import Celery
+from sqlalchemy import delete, insert, select
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker
 from app.core.config import settings
 from app.models.batch import Batch
 from app.models.document import Document
 from app.models.comparison import Comparison
+from app.models.embedding import Embedding
+from app.models.fingerprint import Fingerprint
+from app.models.lsh_bucket import LSHBucket
+from app.models.user import User
 from app.services.embedding import EmbeddingService
 from app.services.ai_detection import AIDetectionService
-from app.services.comparison import ComparisonService
+from app.services.ai_detection_store import AIDetectionStore
+from app.services.comparison import ComparisonService, SearchScope, similar_pairs
+from app.services.minhash import MinHasher, lsh_pairs
+from app.services.winnowing import fingerprints, merge_regions
 import asyncio
+import numpy as np
 
 celery = Celery(__name__)
 celery.config_from_object("app.core.celery")
@@ -18,11 +28,19 @@ SessionLocal = sessionmaker(engine, class_=AsyncSession, expire_on_commit=False)
 
 embedding_service = EmbeddingService()
 ai_service = AIDetectionService()
+minhasher = MinHasher()
 
 @celery.task
 def process_batch(batch_id: str):
     """Process a batch of documents for plagiarism and/or AI detection"""
-    asyncio.run(_process_batch_async(batch_id))
+    asyncio.run(_process_batch_and_close(batch_id))
+
+async def _process_batch_and_close(batch_id: str):
+    try:
+        await _process_batch_async(batch_id)
+    finally:
+        # Each task runs its own event loop; the AI provider's connection pool ends with it
+        await ai_service.aclose()
 
 async def _process_batch_async(batch_id: str):
     async with SessionLocal() as session:
@@ -36,47 +54,160 @@ async def _process_batch_async(batch_id: str):
         await session.commit()
         
         # Get all documents in this batch
-        from sqlalchemy import select
         result = await session.execute(
             select(Document).where(Document.batch_id == batch_id)
         )
         documents = result.scalars().all()
         
         analysis_type = batch.analysis_type or "plagiarism"  # default to plagiarism
+        owner = await session.get(User, batch.user_id) if batch.user_id else None
+        scope = SearchScope.for_user(settings.COMPARISON_SCOPE, batch.id, owner)
+
+        for doc in documents:
+            if doc.text_content and not doc.content_hash:
+                doc.content_hash = EmbeddingService.hash_content(doc.text_content)
+
+        # Comparison rows for the whole batch, merged per document pair and
+        # written in one insert at the end
+        matches = {}
+        batch_doc_ids = [doc.id for doc in documents]
+
+        # Verbatim and lightly edited copies are found lexically before any
+        # embedding work; documents with an exact copy skip semantic retrieval
+        exact_copies = set()
+        if analysis_type in ["plagiarism", "both"]:
+            try:
+                exact_copies = await _find_duplicates(session, documents, scope, matches)
+            except Exception as e:
+                await _rollback(session, batch_id)
+                print(f"Error finding duplicates for batch {batch_id}: {e}")
+            try:
+                await _find_copied_regions(session, documents, scope, matches)
+            except Exception as e:
+                await _rollback(session, batch_id)
+                print(f"Error matching fingerprints for batch {batch_id}: {e}")
+
+        # Embed every document of the batch in one pass so the model sees
+        # large batches instead of one document at a time
+        embeddings = {}
+        chunk_embeddings = {}
+        if analysis_type in ["plagiarism", "both"] and embedding_service.enabled:
+            to_embed = [doc for doc in documents if doc.text_content]
+            try:
+                chunk_vectors = embedding_service.generate_chunk_embeddings(
+                    [doc.text_content for doc in to_embed],
+                    hashes=[doc.content_hash for doc in to_embed],
+                )
+                chunk_rows = []
+                for doc, matrix in zip(to_embed, chunk_vectors):
+                    if not len(matrix):
+                        continue
+                    embeddings[doc.id] = matrix.mean(axis=0)
+                    chunk_embeddings[doc.id] = matrix
+                    doc.embedding = embeddings[doc.id]
+                    spans = embedding_service.chunk_spans(doc.text_content)
+                    for index, (span, vector) in enumerate(zip(spans, matrix)):
+                        chunk_rows.append({
+                            "file_id": doc.id,
+                            "vector": vector,
+                            "type": "text",
+                            "chunk_index": index,
+                            "start_char": span.start,
+                            "end_char": span.end,
+                        })
+                await _store_chunk_embeddings(session, [doc.id for doc in to_embed], chunk_rows)
+                if embeddings:
+                    await ComparisonService(session).vector_store.upsert(
+                        list(embeddings), np.stack(list(embeddings.values()))
+                    )
+            except Exception as e:
+                await _rollback(session, batch_id)
+                print(f"Error embedding batch {batch_id}: {e}")
+            if embedding_service.cache is not None:
+                print(f"Embedding cache: {embedding_service.cache.stats()}")
         
+        # Stage-1 retrieval candidates for every document in one round trip
+        # per ANN_QUERY_BATCH documents, instead of one query per document.
+        # A batch-scoped search has nothing to find outside the batch.
+        candidates = {}
+        failed = set()
+        if embeddings and scope.mode != "batch":
+            ids = [doc_id for doc_id in embeddings if doc_id not in exact_copies]
+            try:
+                results = await ComparisonService(session).find_candidates_many(
+                    [embeddings[doc_id] for doc_id in ids], exclude_ids=batch_doc_ids, scope=scope
+                )
+                candidates = dict(zip(ids, results))
+            except Exception as e:
+                await _rollback(session, batch_id)
+                print(f"Error finding candidates for batch {batch_id}: {e}")
+                failed.update(ids)
+
+        # AI detection for the whole batch in one classifier pass; documents
+        # already analyzed with the same text and model reuse stored results
+        ai_results = {}
+        if analysis_type in ["ai", "both"]:
+            ai_docs = [doc for doc in documents if doc.text_content]
+            ai_doc_ids = [doc.id for doc in ai_docs]
+            try:
+                ai_results = dict(zip(
+                    ai_doc_ids,
+                    await AIDetectionStore(session).detect_many(
+                        ai_service,
+                        [doc.text_content for doc in ai_docs],
+                        document_ids=ai_doc_ids,
+                        hashes=[doc.content_hash for doc in ai_docs],
+                    ),
+                ))
+            except Exception as e:
+                await _rollback(session, batch_id)
+                print(f"Error detecting AI content for batch {batch_id}: {e}")
+                failed.update(ai_doc_ids)
+
         # Process each document
         for doc in documents:
+            if doc.id in failed:
+                doc.status = "failed"
+                await session.commit()
+                continue
             try:
                 doc.status = "processing"
                 await session.commit()
                 
                 # AI Detection
                 if analysis_type in ["ai", "both"]:
-                    if doc.text_content:
-                        ai_result = ai_service.detect(doc.text_content)
+                    ai_result = ai_results.get(doc.id)
+                    if ai_result is not None:
                         doc.ai_score = ai_result.get("score", 0.0)
                         doc.is_ai_generated = ai_result.get("is_ai", False)
                 
                 # Plagiarism Detection (semantic similarity)
                 if analysis_type in ["plagiarism", "both"]:
-                    if doc.text_content and embedding_service.enabled:
-                        # Generate embedding
-                        embedding = embedding_service.generate_text_embedding(doc.text_content)
-                        doc.embedding = embedding
-                        
-                        # Find similar documents
+                    embedding = embeddings.get(doc.id)
+                    if embedding is not None and doc.id not in exact_copies:
+                        # Find similar documents outside the batch and copied passages;
+                        # pairs within the batch are covered by the similarity matrix below
                         comparison_service = ComparisonService(session)
-                        similar_results = await comparison_service.find_similar(embedding, top_k=5)
-                        
-                        # Store comparisons
-                        for similar_doc, similarity in similar_results:
-                            if similar_doc.id != doc.id:  # Don't compare with self
-                                comparison = Comparison(
-                                    doc_a=doc.id,
-                                    doc_b=similar_doc.id,
-                                    similarity=similarity
-                                )
-                                session.add(comparison)
+                        similar_results = await comparison_service.retrieve(
+                            doc.id, embedding, chunk_embeddings[doc.id], doc.text_content,
+                            candidates=candidates.get(doc.id, []),
+                        )
+                        passage_results = await comparison_service.find_similar_passages(
+                            doc.id,
+                            top_k=5,
+                            per_chunk_k=settings.PASSAGE_NEIGHBOURS,
+                            min_similarity=settings.PASSAGE_MIN_SIMILARITY,
+                            scope=scope,
+                        )
+
+                        for result in similar_results:
+                            details = dict(result)
+                            other_id = details.pop("document_id")
+                            _add_match(matches, doc.id, other_id, details["similarity"], details)
+                        for file_id, similarity, matched_chunks, spans in passage_results:
+                            _add_match(matches, doc.id, file_id, similarity, {
+                                "passages": {"matched_chunks": matched_chunks, "spans": spans or []},
+                            })
                 
                 doc.status = "completed"
                 await session.commit()
@@ -85,7 +216,149 @@ async def _process_batch_async(batch_id: str):
                 doc.status = "failed"
                 await session.commit()
         
+        # All-pairs similarity within the batch, computed in memory
+        if embeddings:
+            ids = list(embeddings)
+            rows, cols, sims = similar_pairs(
+                np.stack([embeddings[doc_id] for doc_id in ids]),
+                settings.BATCH_SIMILARITY_THRESHOLD,
+                settings.BATCH_SIMILARITY_BLOCK,
+            )
+            for i, j, similarity in zip(rows.tolist(), cols.tolist(), sims.tolist()):
+                _add_match(matches, ids[i], ids[j], similarity, {"batch_similarity": similarity})
+
+        try:
+            await _store_comparisons(session, batch_doc_ids, matches)
+        except Exception as e:
+            await _rollback(session, batch_id)
+            print(f"Error storing comparisons for batch {batch_id}: {e}")
+
         # Update batch status
         batch.status = "completed"
         batch.processed_docs = len([d for d in documents if d.status == "completed"])
         await session.commit()
+
+async def _rollback(session, batch_id):
+    """
+    Roll back a failed batch-wide stage. The rollback expires every loaded
+    object, so the batch's documents are reloaded for the stages after it.
+    """
+    await session.rollback()
+    await session.execute(select(Document).where(Document.batch_id == batch_id))
+
+async def _find_duplicates(session, documents, scope, matches):
+    """
+    Record exact copies (same content_hash) and MinHash near-duplicates of
+    the batch's documents, within the batch and against the corpus in scope.
+    Stores each document's signature and LSH buckets on the way.
+    Returns the ids of documents that have an exact copy.
+    """
+    docs = [doc for doc in documents if doc.text_content]
+    batch_doc_ids = [doc.id for doc in documents]
+    comparison_service = ComparisonService(session)
+
+    by_hash = defaultdict(list)
+    for doc in docs:
+        by_hash[doc.content_hash].append(doc.id)
+    corpus_copies = await comparison_service.find_exact_duplicates(list(by_hash), exclude_ids=batch_doc_ids, scope=scope)
+    exact_copies = set()
+    for content_hash, ids in by_hash.items():
+        others = corpus_copies.get(content_hash, [])
+        for i, doc_id in enumerate(ids):
+            copies = ids[i + 1:] + others
+            for other_id in copies:
+                _add_match(matches, doc_id, other_id, 1.0, {"exact_duplicate": True})
+            # The first copy within the batch still gets a full comparison
+            if others or i > 0:
+                exact_copies.add(doc_id)
+
+    signatures = {}
+    bucket_rows = []
+    for doc in docs:
+        signature = minhasher.signature(doc.text_content)
+        if signature is None:
+            # Nothing to compare (symbols only); no signature, no buckets
+            doc.minhash = None
+            continue
+        signatures[doc.id] = signature
+        doc.minhash = MinHasher.to_bytes(signature)
+        for band, bucket in enumerate(minhasher.band_buckets(signature)):
+            bucket_rows.append({"band": band, "bucket": bucket, "document_id": doc.id})
+    await session.execute(delete(LSHBucket).where(LSHBucket.document_id.in_(batch_doc_ids)))
+    if bucket_rows:
+        await session.execute(insert(LSHBucket), bucket_rows)
+    await session.commit()
+
+    near_duplicates = lsh_pairs(signatures, minhasher, settings.MINHASH_THRESHOLD)
+    near_duplicates += await comparison_service.find_near_duplicates(signatures, settings.MINHASH_THRESHOLD, scope)
+    for doc_id, other_id, jaccard in near_duplicates:
+        _add_match(matches, doc_id, other_id, jaccard, {"minhash_jaccard": jaccard})
+    return exact_copies
+
+async def _find_copied_regions(session, documents, scope, matches):
+    """
+    Winnow every document of the batch into the fingerprint index, then
+    record the documents each shares fingerprints with, and the copied
+    regions, in the batch's matches
+    """
+    docs = [doc for doc in documents if doc.text_content]
+    batch_doc_ids = [doc.id for doc in documents]
+    totals = {}
+    rows = []
+    for doc in docs:
+        doc_prints = fingerprints(doc.text_content)
+        totals[doc.id] = len(doc_prints.hashes)
+        rows.extend(
+            {"document_id": doc.id, "hash": h, "start_char": start, "end_char": end}
+            for h, start, end in zip(doc_prints.hashes.tolist(), doc_prints.starts.tolist(), doc_prints.ends.tolist())
+        )
+    await session.execute(delete(Fingerprint).where(Fingerprint.document_id.in_(batch_doc_ids)))
+    if rows:
+        await session.execute(insert(Fingerprint), rows)
+    await session.commit()
+
+    shared = await ComparisonService(session).find_shared_fingerprints([doc.id for doc in docs], scope)
+    for doc_id, other_id, count, offsets in shared:
+        # Share of the document's fingerprints found in the other document
+        coverage = count / totals[doc_id] if totals.get(doc_id) else 0.0
+        key = _add_match(matches, doc_id, other_id, coverage, {})
+        regions = merge_regions(offsets)
+        if key[0] != doc_id:
+            regions = [{**r, "source": r["match"], "match": r["source"]} for r in regions]
+        fingerprint_details = matches[key]["details"].setdefault("fingerprints", {})
+        # Pairs within the batch are seen from both sides; keep the larger view
+        if count >= fingerprint_details.get("shared", 0):
+            fingerprint_details.update({"shared": count, "coverage": coverage, "regions": regions})
+
+async def _store_chunk_embeddings(session, doc_ids, rows):
+    """Replace the chunk vectors of the given documents with a single bulk insert"""
+    if not doc_ids:
+        return
+    await session.execute(delete(Embedding).where(Embedding.file_id.in_(doc_ids)))
+    if rows:
+        await session.execute(insert(Embedding), rows)
+    await session.commit()
+
+def _add_match(matches, doc_a, doc_b, similarity, details):
+    """
+    Record a similar pair, merging with an earlier match of the same pair in
+    either direction. Returns the pair's key, whose order tells which of the
+    two documents is doc_a in the stored comparison.
+    """
+    if doc_a == doc_b:
+        return None
+    key = (doc_b, doc_a) if (doc_b, doc_a) in matches else (doc_a, doc_b)
+    match = matches.setdefault(key, {"similarity": 0.0, "details": {}})
+    match["similarity"] = max(match["similarity"], float(similarity))
+    match["details"].update(details)
+    return key
+
+async def _store_comparisons(session, doc_ids, matches):
+    """Replace the comparisons of the given documents with a single bulk insert"""
+    await session.execute(delete(Comparison).where(Comparison.doc_a.in_(doc_ids)))
+    if matches:
+        await session.execute(insert(Comparison), [
+            {"doc_a": doc_a, "doc_b": doc_b, "similarity": match["similarity"], "details": match["details"]}
+            for (doc_a, doc_b), match in matches.items()
+        ])
+    await session.commit()
@@ -0,0 +1,266 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, Optional
+
+from app.core.config import settings
+
+try:
+    import redis
+    HAS_REDIS = True
+except ImportError:
+    HAS_REDIS = False
+
+
+class LRUCache:
+    """
+    In-process cache bounded by entry count, with optional per-entry TTL.
+    Safe to share between threads (asyncio.to_thread callers, worker pools).
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: Optional[float] = None):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._data: "OrderedDict[str, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key: str):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            expires_at, value = entry
+            if expires_at is not None and expires_at < time.monotonic():
+                del self._data[key]
+                self.misses += 1
+                return None
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def set(self, key: str, value: Any):
+        expires_at = time.monotonic() + self.ttl if self.ttl else None
+        with self._lock:
+            self._data[key] = (expires_at, value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_entries:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            return {
+                "size": len(self._data),
+                "max_entries": self.max_entries,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+            }
+
+
+class RedisCache:
+    """
+    Shared cache tier in Redis.
+    Keys live under a namespace and a sorted set tracks their last access time,
+    so the tier can be trimmed to max_entries in least-recently-used order.
+    """
+
+    # After a connection error the tier is skipped for this many seconds
+    RETRY_AFTER = 30.0
+
+    def __init__(self, client, namespace: str, max_entries: int = 100_000, ttl: Optional[float] = None):
+        self.client = client
+        self.namespace = namespace
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.index_key = f"{namespace}:__index__"
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.errors = 0
+        self._disabled_until = 0.0
+
+    def _key(self, key: str) -> str:
+        return f"{self.namespace}:{key}"
+
+    @property
+    def available(self) -> bool:
+        return time.monotonic() >= self._disabled_until
+
+    def _fail(self, e: Exception):
+        self.errors += 1
+        self._disabled_until = time.monotonic() + self.RETRY_AFTER
+        print(f"Redis cache '{self.namespace}' unavailable: {e}")
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, bytes]:
+        keys = list(keys)
+        if not keys or not self.available:
+            self.misses += len(keys)
+            return {}
+        try:
+            values = self.client.mget([self._key(k) for k in keys])
+            found = {k: v for k, v in zip(keys, values) if v is not None}
+            if found:
+                now = time.time()
+                self.client.zadd(self.index_key, {k: now for k in found})
+        except Exception as e:
+            self._fail(e)
+            self.misses += len(keys)
+            return {}
+        self.hits += len(found)
+        self.misses += len(keys) - len(found)
+        return found
+
+    def set_many(self, items: Dict[str, bytes]):
+        if not items or not self.available:
+            return
+        try:
+            now = time.time()
+            pipe = self.client.pipeline()
+            for k, v in items.items():
+                pipe.set(self._key(k), v, ex=int(self.ttl) if self.ttl else None)
+            pipe.zadd(self.index_key, {k: now for k in items})
+            pipe.zcard(self.index_key)
+            size = pipe.execute()[-1]
+
+            excess = size - self.max_entries
+            if excess > 0:
+                stale = [k for k, _ in self.client.zpopmin(self.index_key, excess)]
+                if stale:
+                    self.client.delete(*[self._key(k.decode() if isinstance(k, bytes) else k) for k in stale])
+                    self.evictions += len(stale)
+        except Exception as e:
+            self._fail(e)
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "errors": self.errors,
+        }
+
+
+class TieredCache:
+    """
+    Two-tier cache: a per-process LRU in front of an optional shared Redis tier.
+    Values are stored decoded in the LRU and as bytes in Redis; encode/decode
+    convert between the two. Shared hits are promoted into the local tier.
+    """
+
+    def __init__(
+        self,
+        namespace: str,
+        encode: Callable[[Any], bytes],
+        decode: Callable[[bytes], Any],
+        local_size: int = 1024,
+        shared: Optional[RedisCache] = None,
+        ttl: Optional[float] = None,
+    ):
+        self.namespace = namespace
+        self.encode = encode
+        self.decode = decode
+        self.local = LRUCache(local_size, ttl=ttl)
+        self.shared = shared
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, Any]:
+        found = {}
+        missing = []
+        for key in keys:
+            value = self.local.get(key)
+            if value is None:
+                missing.append(key)
+            else:
+                found[key] = value
+
+        if missing and self.shared is not None:
+            for key, raw in self.shared.get_many(missing).items():
+                value = self.decode(raw)
+                self.local.set(key, value)
+                found[key] = value
+        return found
+
+    def get(self, key: str):
+        return self.get_many([key]).get(key)
+
+    def set_many(self, items: Dict[str, Any]):
+        for key, value in items.items():
+            self.local.set(key, value)
+        if items and self.shared is not None:
+            self.shared.set_many({k: self.encode(v) for k, v in items.items()})
+
+    def set(self, key: str, value: Any):
+        self.set_many({key: value})
+
+    def stats(self) -> Dict[str, Any]:
+        local = self.local.stats()
+        lookups = local["hits"] + local["misses"]
+        shared_hits = self.shared.hits if self.shared is not None else 0
+        return {
+            "namespace": self.namespace,
+            "hit_rate": (local["hits"] + shared_hits) / lookups if lookups else 0.0,
+            "local": local,
+            "shared": self.shared.stats() if self.shared is not None else None,
+        }
+
+
+def encode_json(value: Any) -> bytes:
+    return json.dumps(value).encode()
+
+
+def decode_json(raw: bytes) -> Any:
+    return json.loads(raw)
+
+
+_redis_client = None
+
+
+def get_redis_client():
+    """Shared Redis connection pool for all cache tiers in this process."""
+    global _redis_client
+    if _redis_client is None and HAS_REDIS:
+        _redis_client = redis.Redis(
+            host=settings.REDIS_HOST,
+            port=settings.REDIS_PORT,
+            socket_timeout=1.0,
+            socket_connect_timeout=1.0,
+        )
+    return _redis_client
+
+
+def build_cache(
+    namespace: str,
+    encode: Callable[[Any], bytes],
+    decode: Callable[[bytes], Any],
+    backend: str,
+    local_size: int,
+    shared_size: int,
+    ttl: Optional[float] = None,
+) -> Optional[TieredCache]:
+    """Build a cache from settings-style options; backend is 'redis', 'memory' or 'none'."""
+    backend = (backend or "none").lower()
+    if backend == "none":
+        return None
+
+    shared = None
+    if backend == "redis":
+        client = get_redis_client()
+        if client is not None:
+            shared = RedisCache(client, namespace, max_entries=shared_size, ttl=ttl)
+        else:
+            print("redis package not installed, using in-process cache only")
+
+    return TieredCache(namespace, encode, decode, local_size=local_size, shared=shared, ttl=ttl)
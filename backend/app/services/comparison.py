@@ -1,23 +1,566 @@
+import time
+import uuid
+from collections import defaultdict
+from typing import NamedTuple, Optional
+
+import numpy as np
+from pgvector.sqlalchemy import Vector
+from sqlalchemy import Text, and_, cast, desc, distinct, func, literal, literal_column, or_, text, true
+from sqlalchemy.dialects.postgresql import ARRAY, aggregate_order_by
+from sqlalchemy.exc import DBAPIError
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from app.models import Document
+from sqlalchemy.orm import aliased
+from app.core.config import settings
+from app.models import Document, Embedding, Fingerprint, LSHBucket
+from app.models.document import not_failed, searchable
+from app.services.minhash import MinHasher
+from app.services.similarity import ngram_containment, word_ngrams
+from app.services.vector_store import LocalVectorStore, VectorStore, normalize as _normalize
+
+def _vector_literal(vector):
+    """pgvector's text form of a vector, e.g. '[0.1,0.2]'"""
+    return "[" + ",".join(map(repr, np.asarray(vector, dtype=np.float32).tolist())) + "]"
+
+def similar_pairs(vectors, threshold, block_size=2048):
+    """
+    All pairs i < j of rows in vectors with cosine similarity >= threshold.
+    The similarity matrix is computed block by block, so memory stays at
+    block_size x block_size floats however many rows there are.
+    Returns (rows, cols, similarities) arrays.
+    """
+    vectors = _normalize(vectors)
+    found_rows, found_cols, found_sims = [], [], []
+    for row_start in range(0, len(vectors), block_size):
+        row_block = vectors[row_start:row_start + block_size]
+        # Blocks left of the diagonal mirror ones already computed
+        for col_start in range(row_start, len(vectors), block_size):
+            sims = row_block @ vectors[col_start:col_start + block_size].T
+            hits = sims >= threshold
+            if col_start == row_start:
+                hits = np.triu(hits, k=1)
+            i, j = np.nonzero(hits)
+            found_rows.append(i + row_start)
+            found_cols.append(j + col_start)
+            found_sims.append(sims[i, j])
+    if not found_rows:
+        return np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.int64), np.zeros(0, dtype=np.float32)
+    return np.concatenate(found_rows), np.concatenate(found_cols), np.concatenate(found_sims)
+
+SCOPES = ("batch", "user", "institution", "global")
+
+class SearchScope(NamedTuple):
+    """
+    Which documents a search may return, on top of the rows every search
+    skips (failed uploads, and for vector search documents without an
+    embedding):
+      batch        documents of batch_id
+      user         documents uploaded by user_id
+      institution  the institution's corpus, minus other users' private documents
+      global       every public document, the institution's shared corpus and
+                   the user's own documents
+    """
+    mode: str = "global"
+    batch_id: Optional[uuid.UUID] = None
+    user_id: Optional[uuid.UUID] = None
+    institution: Optional[str] = None
+
+    @classmethod
+    def for_user(cls, mode, batch_id=None, user=None):
+        mode = (mode or "global").lower()
+        if mode not in SCOPES:
+            raise ValueError(f"Unknown search scope '{mode}', expected one of {SCOPES}")
+        institution = getattr(user, "institution", None)
+        if mode == "institution" and not institution:
+            mode = "user"
+        return cls(mode, batch_id, getattr(user, "id", None), institution)
+
+    @property
+    def exact(self):
+        # Batch and user scopes are small: a scan through their btree index
+        # plus a sort is exact and cheaper than an ANN walk that filters
+        # almost every hit away
+        return self.mode in ("batch", "user")
+
+    def _visible(self):
+        visible = [Document.visibility == "public"]
+        if self.institution:
+            visible.append(and_(Document.visibility == "institution", Document.institution == self.institution))
+        if self.user_id:
+            visible.append(Document.uploaded_by == self.user_id)
+        return or_(*visible)
+
+    def filters(self, lexical=False):
+        """
+        WHERE conditions on Document for this scope. Lexical matching
+        (exact copies, MinHash, fingerprints) does not need an embedding.
+        """
+        conditions = [not_failed(Document.status) if lexical else searchable(Document.embedding, Document.status)]
+        if self.mode == "batch":
+            conditions.append(Document.batch_id == self.batch_id)
+        elif self.mode == "user":
+            conditions.append(Document.uploaded_by == self.user_id)
+        elif self.mode == "institution":
+            conditions.append(Document.institution == self.institution)
+            conditions.append(self._visible())
+        else:
+            conditions.append(self._visible())
+        return conditions
+
+def _scope_conditions(scope):
+    """WHERE conditions for a search; without a scope only unsearchable rows are dropped"""
+    return scope.filters() if scope is not None else [searchable(Document.embedding, Document.status)]
+
+def _lexical_conditions(scope):
+    """_scope_conditions for lexical matching, which also finds documents that were never embedded"""
+    return scope.filters(lexical=True) if scope is not None else [not_failed(Document.status)]
+
+def _order_distance(distance, scope):
+    """
+    ORDER BY expression for a nearest-neighbour query. For exact scopes the
+    distance is wrapped so it no longer matches the ANN index's operator,
+    which makes Postgres filter first and sort the survivors exactly.
+    """
+    if scope is not None and scope.exact:
+        return distance + literal_column("0")
+    return distance
+
+class PgVectorStore(VectorStore):
+    """
+    Document vectors in documents.embedding, searched through the pgvector
+    index in the same query as the scope filters. The vectors are written
+    with the document rows, so upsert and delete have nothing to do.
+    """
+
+    filters_scope = True
 
-class ComparisonService:
     def __init__(self, db_session: AsyncSession):
         self.db_session = db_session
 
-    async def find_similar(self, embedding, top_k=5):
+    async def tune_ann(self, limit, scope=None):
+        """
+        Set the per-query search breadth of the ANN index for this transaction.
+        HNSW never returns more than ef_search rows, so it is raised to limit.
+        Scope filters are applied to the rows the index returns, so filtered
+        scopes search SCOPED_ANN_FACTOR times wider to still fill limit.
+        """
+        factor = settings.SCOPED_ANN_FACTOR if scope is not None and not scope.exact else 1
+        if settings.VECTOR_INDEX_TYPE.lower() == "ivfflat":
+            probes = min(settings.IVFFLAT_PROBES * factor, settings.IVFFLAT_LISTS)
+            await self.db_session.execute(text(f"SET LOCAL ivfflat.probes = {int(probes)}"))
+        else:
+            # 1000 is the largest ef_search pgvector accepts
+            ef_search = min(max(settings.HNSW_EF_SEARCH, int(limit)) * factor, 1000)
+            await self.db_session.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+
+    async def execute_with_budget(self, query, budget_ms):
+        """
+        Run query under a statement_timeout of budget_ms inside a savepoint,
+        so a slow query is cancelled by Postgres without aborting the caller's
+        transaction. Returns None when the budget is exceeded.
+        """
         try:
+            async with self.db_session.begin_nested():
+                await self.db_session.execute(text(f"SET LOCAL statement_timeout = {int(budget_ms)}"))
+                rows = (await self.db_session.execute(query)).all()
+                await self.db_session.execute(text("SET LOCAL statement_timeout = DEFAULT"))
+                return rows
+        except DBAPIError as e:
+            print(f"Query exceeded its {budget_ms}ms budget: {e}")
+            return None
+
+    async def search_many(self, vectors, limit, exclude_ids=(), scope=None, budget_ms=None):
+        """
+        Nearest documents for many query vectors in one statement per
+        ANN_QUERY_BATCH queries: the vectors are unnested into rows and each
+        row drives an index scan through a LATERAL join. No ORM objects are
+        built. budget_ms applies per query.
+        """
+        budget_ms = budget_ms or settings.RETRIEVAL_CANDIDATE_BUDGET_MS
+        results = [[] for _ in vectors]
+        if not len(vectors):
+            return results
+
+        await self.tune_ann(limit, scope)
+        group_size = settings.ANN_QUERY_BATCH
+        for offset in range(0, len(vectors), group_size):
+            group = vectors[offset:offset + group_size]
+            rows = await self.execute_with_budget(
+                self.nearest_query([_vector_literal(v) for v in group], limit, exclude_ids, scope),
+                budget_ms * len(group),
+            )
+            for ordinality, doc_id, similarity in rows or []:
+                results[offset + ordinality - 1].append((doc_id, similarity))
+        return results
+
+    @staticmethod
+    def nearest_query(vector_literals, limit, exclude_ids=(), scope=None):
+        queries = (
+            func.unnest(literal(vector_literals, ARRAY(Text)))
+            .table_valued("vector", with_ordinality="ordinality")
+            .render_derived(name="queries")
+        )
+        distance = Document.embedding.cosine_distance(cast(queries.c.vector, Vector(384)))
+        neighbours = (
+            select(Document.id, (1 - distance).label("similarity"))
+            .where(*_scope_conditions(scope))
+            .order_by(_order_distance(distance, scope))
+            .limit(limit)
+        )
+        if exclude_ids:
+            neighbours = neighbours.where(Document.id.notin_(exclude_ids))
+        neighbours = neighbours.lateral("neighbours")
+        return (
+            select(queries.c.ordinality, neighbours.c.id, neighbours.c.similarity)
+            .select_from(queries)
+            .join(neighbours, true())
+            .order_by(queries.c.ordinality, neighbours.c.similarity.desc())
+        )
+
+    async def upsert(self, ids, vectors):
+        pass
+
+    async def delete(self, ids):
+        pass
+
+_local_store = None
+
+def get_vector_store(db_session: AsyncSession) -> VectorStore:
+    """The document vector store selected by VECTOR_STORE; a local store is opened once per process"""
+    global _local_store
+    if settings.VECTOR_STORE.lower() == "local":
+        if _local_store is None:
+            _local_store = LocalVectorStore(settings.VECTOR_STORE_PATH)
+        return _local_store
+    return PgVectorStore(db_session)
+
+class ComparisonService:
+    def __init__(self, db_session: AsyncSession, vector_store: Optional[VectorStore] = None):
+        self.db_session = db_session
+        # Chunk-level search always runs in Postgres
+        self.pg = PgVectorStore(db_session)
+        self.vector_store = vector_store or get_vector_store(db_session)
+
+    async def find_similar(self, embedding, top_k=5, exclude_ids=(), scope=None):
+        try:
+            await self.pg.tune_ann(top_k, scope)
             # Use cosine distance for similarity
             # similarity = 1 - cosine_distance
             # Note: pgvector's cosine_distance operator returns 1 - cosine_similarity
             # So 1 - cosine_distance gives us the cosine similarity back
-            results = await self.db_session.execute(
-                select(Document, (1 - Document.embedding.cosine_distance(embedding)).label("similarity"))
-                .order_by(Document.embedding.cosine_distance(embedding))
+            distance = Document.embedding.cosine_distance(embedding)
+            query = (
+                select(Document, (1 - distance).label("similarity"))
+                .where(*_scope_conditions(scope))
+                .order_by(_order_distance(distance, scope))
                 .limit(top_k)
             )
+            if exclude_ids:
+                query = query.where(Document.id.notin_(exclude_ids))
+            results = await self.db_session.execute(query)
             return results.all()
         except Exception as e:
             print(f"Error in find_similar: {e}")
             return []
+
+    async def find_similar_passages(self, doc_id, top_k=5, per_chunk_k=10, min_similarity=0.8, max_spans=5, scope=None):
+        """
+        Chunk-to-chunk search for passages of doc_id found in other documents.
+        Each chunk of the document pulls its nearest chunks through the ANN index,
+        and the matches are grouped per matched document in SQL. With a scope,
+        only chunks of documents in that scope are matched.
+        Returns rows of (file_id, similarity, matched_chunks, spans) where spans
+        holds up to max_spans {"source", "match", "similarity"} pairs of
+        character offsets, best first.
+        """
+        source = aliased(Embedding, name="source")
+        distance = Embedding.vector.cosine_distance(source.vector)
+        neighbours = (
+            select(
+                Embedding.file_id,
+                Embedding.start_char,
+                Embedding.end_char,
+                (1 - distance).label("similarity"),
+            )
+            .where(Embedding.file_id != source.file_id)
+            .order_by(_order_distance(distance, scope))
+            .limit(per_chunk_k)
+        )
+        if scope is not None:
+            neighbours = neighbours.join(Document, Document.id == Embedding.file_id).where(*scope.filters())
+        neighbours = neighbours.lateral("neighbours")
+        pairs = (
+            select(
+                neighbours.c.file_id,
+                neighbours.c.similarity,
+                source.start_char.label("source_start"),
+                source.end_char.label("source_end"),
+                neighbours.c.start_char.label("match_start"),
+                neighbours.c.end_char.label("match_end"),
+                func.row_number().over(
+                    partition_by=neighbours.c.file_id,
+                    order_by=neighbours.c.similarity.desc(),
+                ).label("rank"),
+            )
+            .select_from(source)
+            .join(neighbours, true())
+            .where(source.file_id == doc_id, neighbours.c.similarity >= min_similarity)
+            .subquery("pairs")
+        )
+        # Keys are inlined: asyncpg cannot infer parameter types inside jsonb_build_object
+        span = func.jsonb_build_object(
+            literal_column("'source'"), func.jsonb_build_array(pairs.c.source_start, pairs.c.source_end),
+            literal_column("'match'"), func.jsonb_build_array(pairs.c.match_start, pairs.c.match_end),
+            literal_column("'similarity'"), pairs.c.similarity,
+        )
+        query = (
+            select(
+                pairs.c.file_id,
+                func.max(pairs.c.similarity).label("similarity"),
+                func.count(distinct(pairs.c.source_start)).label("matched_chunks"),
+                func.jsonb_agg(aggregate_order_by(span, pairs.c.similarity.desc()))
+                .filter(pairs.c.rank <= max_spans)
+                .label("spans"),
+            )
+            .group_by(pairs.c.file_id)
+            .order_by(desc("similarity"))
+            .limit(top_k)
+        )
+        try:
+            await self.pg.tune_ann(per_chunk_k, scope)
+            results = await self.db_session.execute(query)
+            return results.all()
+        except Exception as e:
+            print(f"Error in find_similar_passages: {e}")
+            return []
+
+    async def find_exact_duplicates(self, hashes, exclude_ids=(), scope=None):
+        """Documents in scope whose content_hash is one of hashes, as {content_hash: [document_id, ...]}"""
+        if not hashes:
+            return {}
+        query = select(Document.content_hash, Document.id).where(
+            Document.content_hash.in_(hashes), *_lexical_conditions(scope)
+        )
+        if exclude_ids:
+            query = query.where(Document.id.notin_(exclude_ids))
+        duplicates = defaultdict(list)
+        for content_hash, doc_id in (await self.db_session.execute(query)).all():
+            duplicates[content_hash].append(doc_id)
+        return duplicates
+
+    async def find_near_duplicates(self, signatures, threshold, scope=None):
+        """
+        Lexical near-duplicates in scope of the documents in signatures
+        ({document_id: MinHash signature}, already stored in lsh_buckets).
+        One self-join on the lsh_buckets primary key finds every document
+        sharing a band bucket, so the cost depends on the number of
+        collisions, not the corpus size. Candidates are confirmed by their
+        estimated Jaccard similarity. Returns (document_id, other_id, jaccard).
+        """
+        signatures = {doc_id: signature for doc_id, signature in signatures.items() if signature is not None}
+        if not signatures:
+            return []
+        mine = aliased(LSHBucket, name="mine")
+        other = aliased(LSHBucket, name="other")
+        query = (
+            select(mine.document_id, Document.id, Document.minhash)
+            .join(other, and_(other.band == mine.band, other.bucket == mine.bucket))
+            .join(Document, Document.id == other.document_id)
+            .where(
+                mine.document_id.in_(list(signatures)),
+                other.document_id.notin_(list(signatures)),
+                Document.minhash.isnot(None),
+                *_lexical_conditions(scope),
+            )
+            .group_by(mine.document_id, Document.id, Document.minhash)
+        )
+        pairs = []
+        for doc_id, other_id, minhash in (await self.db_session.execute(query)).all():
+            jaccard = MinHasher.jaccard(signatures[doc_id], MinHasher.from_bytes(minhash))
+            if jaccard >= threshold:
+                pairs.append((doc_id, other_id, jaccard))
+        return pairs
+
+    async def find_shared_fingerprints(self, doc_ids, scope=None, min_shared=None, max_postings=None, top_k=None):
+        """
+        Corpus documents sharing winnowing fingerprints with each of doc_ids,
+        in one query over the fingerprint inverted index. Every fingerprint of
+        a document reads at most max_postings entries of its posting list
+        through the covering hash index, so phrases common to thousands of
+        documents cost no more than rare ones. Documents in doc_ids always
+        match each other; others must be in scope.
+        Returns rows of (document_id, other_id, shared, offsets), up to top_k
+        per document with the most shared fingerprints first, where offsets
+        lists [start, end, match_start, match_end] per shared fingerprint.
+        """
+        if not doc_ids:
+            return []
+        min_shared = min_shared or settings.WINNOW_MIN_SHARED
+        max_postings = max_postings or settings.WINNOW_MAX_POSTINGS
+        top_k = top_k or settings.WINNOW_TOP_K
+        doc_ids = list(doc_ids)
+
+        mine = aliased(Fingerprint, name="mine")
+        other = aliased(Fingerprint, name="other")
+        postings = (
+            select(other.document_id, other.start_char, other.end_char)
+            .join(Document, Document.id == other.document_id)
+            .where(
+                other.hash == mine.hash,
+                other.document_id != mine.document_id,
+                or_(other.document_id.in_(doc_ids), and_(*_lexical_conditions(scope))),
+            )
+            .limit(max_postings)
+            .lateral("postings")
+        )
+        pairs = (
+            select(
+                mine.document_id,
+                postings.c.document_id.label("other_id"),
+                mine.start_char,
+                mine.end_char,
+                postings.c.start_char.label("match_start"),
+                postings.c.end_char.label("match_end"),
+            )
+            .select_from(mine)
+            .join(postings, true())
+            .where(mine.document_id.in_(doc_ids))
+            .subquery("pairs")
+        )
+        shared = func.count()
+        grouped = (
+            select(
+                pairs.c.document_id,
+                pairs.c.other_id,
+                shared.label("shared"),
+                func.jsonb_agg(aggregate_order_by(
+                    func.jsonb_build_array(pairs.c.start_char, pairs.c.end_char, pairs.c.match_start, pairs.c.match_end),
+                    pairs.c.start_char,
+                )).label("offsets"),
+                func.row_number().over(partition_by=pairs.c.document_id, order_by=shared.desc()).label("rank"),
+            )
+            .group_by(pairs.c.document_id, pairs.c.other_id)
+            .having(shared >= min_shared)
+            .subquery("grouped")
+        )
+        query = (
+            select(grouped.c.document_id, grouped.c.other_id, grouped.c.shared, grouped.c.offsets)
+            .where(grouped.c.rank <= top_k)
+            .order_by(grouped.c.document_id, grouped.c.shared.desc())
+        )
+        try:
+            return (await self.db_session.execute(query)).all()
+        except Exception as e:
+            print(f"Error in find_shared_fingerprints: {e}")
+            return []
+
+    async def find_candidates(self, embedding, limit=None, exclude_ids=(), budget_ms=None, scope=None):
+        """
+        Stage 1 of retrieval: a wide, cheap candidate set from the document-level
+        vector index. Returns (document_id, similarity) tuples, best first.
+        """
+        results = await self.find_candidates_many([embedding], limit, exclude_ids, budget_ms, scope)
+        return results[0]
+
+    async def find_candidates_many(self, embeddings, limit=None, exclude_ids=(), budget_ms=None, scope=None):
+        """
+        Stage 1 candidates for many query vectors at once from the document
+        vector store. Returns one list of (document_id, similarity) tuples per
+        query, best first. Stores that cannot filter by scope are asked for
+        SCOPED_ANN_FACTOR times more hits, which are then checked against the
+        scope in one indexed lookup; the small batch and user scopes are
+        always searched exactly in Postgres.
+        """
+        limit = limit or settings.RETRIEVAL_CANDIDATES
+        budget_ms = budget_ms or settings.RETRIEVAL_CANDIDATE_BUDGET_MS
+        store = self.vector_store
+        if store.filters_scope or (scope is not None and scope.exact):
+            store = store if store.filters_scope else self.pg
+            return await store.search_many(embeddings, limit, exclude_ids, scope, budget_ms)
+
+        results = await store.search_many(embeddings, limit * settings.SCOPED_ANN_FACTOR, exclude_ids)
+        found = {doc_id for hits in results for doc_id, _ in hits}
+        if not found:
+            return results
+        conditions = _scope_conditions(scope)
+        allowed = set((await self.db_session.execute(
+            select(Document.id).where(Document.id.in_(found), *conditions)
+        )).scalars().all())
+        return [[hit for hit in hits if hit[0] in allowed][:limit] for hits in results]
+
+    async def rerank(self, chunk_vectors, text_content, candidates, budget_ms=None, batch_size=25):
+        """
+        Stage 2 of retrieval: re-score candidates with chunk-level similarity and
+        exact word n-gram overlap. Candidates are taken in stage-1 order, a batch
+        at a time, until the time budget runs out; the rest keep their stage-1
+        score and are marked as not reranked.
+        """
+        budget_ms = budget_ms or settings.RETRIEVAL_RERANK_BUDGET_MS
+        deadline = time.monotonic() + budget_ms / 1000
+        query_chunks = _normalize(chunk_vectors) if len(chunk_vectors) else None
+        query_grams = word_ngrams(text_content or "")
+
+        scored = []
+        pending = list(candidates)
+        while pending and time.monotonic() < deadline:
+            batch, pending = pending[:batch_size], pending[batch_size:]
+            ids = [doc_id for doc_id, _ in batch]
+
+            vectors = defaultdict(list)
+            if query_chunks is not None:
+                rows = await self.db_session.execute(
+                    select(Embedding.file_id, Embedding.vector)
+                    .where(Embedding.file_id.in_(ids), Embedding.type == "text")
+                )
+                for file_id, vector in rows.all():
+                    vectors[file_id].append(vector)
+            texts = dict((await self.db_session.execute(
+                select(Document.id, Document.text_content).where(Document.id.in_(ids))
+            )).all())
+
+            for doc_id, doc_similarity in batch:
+                chunk_similarity = chunk_coverage = 0.0
+                if vectors.get(doc_id):
+                    # Best match in the candidate for every chunk of the query document
+                    best = (query_chunks @ _normalize(np.stack(vectors[doc_id])).T).max(axis=1)
+                    chunk_similarity = float(best.max())
+                    chunk_coverage = float((best >= settings.PASSAGE_MIN_SIMILARITY).mean())
+                ngram_overlap = ngram_containment(query_grams, word_ngrams(texts.get(doc_id) or ""))
+                score = (
+                    settings.RERANK_DOCUMENT_WEIGHT * doc_similarity
+                    + settings.RERANK_CHUNK_WEIGHT * chunk_similarity
+                    + settings.RERANK_LEXICAL_WEIGHT * ngram_overlap
+                )
+                scored.append({
+                    "document_id": doc_id,
+                    "similarity": score,
+                    "document_similarity": doc_similarity,
+                    "chunk_similarity": chunk_similarity,
+                    "chunk_coverage": chunk_coverage,
+                    "ngram_overlap": ngram_overlap,
+                    "reranked": True,
+                })
+
+        scored.sort(key=lambda match: match["similarity"], reverse=True)
+        for doc_id, doc_similarity in pending:
+            scored.append({
+                "document_id": doc_id,
+                "similarity": doc_similarity,
+                "document_similarity": doc_similarity,
+                "reranked": False,
+            })
+        return scored
+
+    async def retrieve(self, doc_id, embedding, chunk_vectors, text_content, top_k=None, exclude_ids=(), candidates=None, scope=None):
+        """
+        Two-stage retrieval for one document: candidate generation from the
+        document vector index, then a chunk/lexical rerank of the best
+        RETRIEVAL_RERANK candidates. Pass candidates when stage 1 already ran
+        for many documents through find_candidates_many.
+        Returns up to top_k match dicts, best first.
+        """
+        top_k = top_k or settings.RETRIEVAL_TOP_K
+        if candidates is None:
+            candidates = await self.find_candidates(embedding, exclude_ids=[doc_id, *exclude_ids], scope=scope)
+        reranked = await self.rerank(chunk_vectors, text_content, candidates[:settings.RETRIEVAL_RERANK])
+        return reranked[:top_k]
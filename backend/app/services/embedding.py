@@ -1,44 +1,187 @@
+import io
 import os
 import hashlib
+from typing import List, Optional
 
-try:
-    from sentence_transformers import SentenceTransformer
-    HAS_MODEL = True
-except ImportError:
-    HAS_MODEL = False
+import numpy as np
+
+from app.core.config import settings
+from app.services.cache import build_cache
+from app.services.segmentation import Segmenter, approx_token_length, segment, tokenizer_length
+
+from app.services.embedding_backends import BACKENDS_AVAILABLE, DEFAULT_EMBEDDING_MODEL, load_embedding_model, load_tokenizer
+from app.services.model_server import RemoteEmbeddingModel, get_model_client
+
+HAS_MODEL = BACKENDS_AVAILABLE
+
+def _encode_matrix(matrix: np.ndarray) -> bytes:
+    buffer = io.BytesIO()
+    np.save(buffer, np.asarray(matrix, dtype=np.float32), allow_pickle=False)
+    return buffer.getvalue()
+
+def _decode_matrix(raw: bytes) -> np.ndarray:
+    return np.load(io.BytesIO(raw), allow_pickle=False)
 
 class EmbeddingService:
-    def __init__(self, model_name="sentence-transformers/all-MiniLM-L6-v2"):
-        if HAS_MODEL and not os.getenv("VERCEL"):
-            self.model = SentenceTransformer(model_name)
+    def __init__(self, model_name=DEFAULT_EMBEDDING_MODEL):
+        self.model_name = model_name
+        self.backend = settings.EMBEDDING_BACKEND.lower()
+        self.batch_size = settings.EMBEDDING_BATCH_SIZE
+        # Cached values are the per-chunk vectors of a document; the document
+        # vector is their mean, so both are served from the same entry
+        self.cache = build_cache(
+            "emb-chunks",
+            _encode_matrix,
+            _decode_matrix,
+            backend=settings.EMBEDDING_CACHE_BACKEND,
+            local_size=settings.EMBEDDING_CACHE_LOCAL_SIZE,
+            shared_size=settings.EMBEDDING_CACHE_SHARED_SIZE,
+            ttl=settings.EMBEDDING_CACHE_TTL or None,
+        )
+        if get_model_client() is not None:
+            # The model server holds the model; only its tokenizer is loaded here
+            self.model = RemoteEmbeddingModel(get_model_client(), load_tokenizer(model_name))
+        elif HAS_MODEL and not os.getenv("VERCEL"):
+            self.model = load_embedding_model(model_name, self.backend)
         else:
             self.model = None
 
-    def chunk_text(self, text, chunk_size=500, overlap=50):
-        """Split text into overlapping chunks"""
+        # Chunks are whole sentences packed up to the model's token window
+        tokenizer = getattr(self.model, "tokenizer", None)
+        self.segmenter = Segmenter(
+            "embedding",
+            settings.EMBEDDING_CHUNK_TOKENS,
+            settings.EMBEDDING_CHUNK_OVERLAP,
+            length=tokenizer_length(tokenizer) if tokenizer is not None else approx_token_length,
+        )
+
+    @property
+    def enabled(self):
+        return self.model is not None
+
+    def chunk_spans(self, text, chunk_size=None, overlap=None):
+        """
+        Sentence-aligned chunks of text as Spans with character offsets.
+        By default chunks are sized in model tokens and shared through the
+        segmentation cache; chunk_size/overlap request character-sized chunks.
+        """
         if not text:
             return []
+        if chunk_size is None:
+            return segment(text, self.segmenter)
+        return segment(text, Segmenter("chars", chunk_size, overlap or 0))
+
+    def chunk_text(self, text, chunk_size=None, overlap=None):
+        """Split text into overlapping chunks"""
+        return [span.text for span in self.chunk_spans(text, chunk_size, overlap)]
+
+    def encode_chunks(self, chunks: List[str]) -> np.ndarray:
+        """
+        Encode a flat list of chunks in as few forward passes as possible.
+        Chunks are sorted by length so each batch pads to a similar size,
+        then the rows are put back in their original order.
+        """
+        if not chunks:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        lengths = np.fromiter((len(c) for c in chunks), dtype=np.int64, count=len(chunks))
+        order = np.argsort(-lengths, kind="stable")
+        sorted_chunks = [chunks[i] for i in order]
+
+        encoded = self.model.encode(
+            sorted_chunks,
+            batch_size=self.batch_size,
+            convert_to_numpy=True,
+            show_progress_bar=False,
+        )
+        encoded = np.asarray(encoded, dtype=np.float32)
+
+        vectors = np.empty_like(encoded)
+        vectors[order] = encoded
+        return vectors
+
+    def _cache_key(self, content_hash: str) -> str:
+        # Chunk vectors depend on how the text was cut, not just on the model
+        chunking = f"{self.segmenter.max_length}/{self.segmenter.overlap}"
+        return f"{self.model_name}@{self.backend}:{chunking}:{content_hash}"
+
+    def generate_chunk_embeddings(self, texts: List[str], hashes: Optional[List[str]] = None) -> List[np.ndarray]:
+        """
+        Embed every chunk of many documents at once, serving repeated content
+        from the cache. Identical texts are embedded once, and only texts whose
+        content hash is not cached reach the model. Pass hashes when the caller
+        already has them (e.g. Document.content_hash).
+        Returns one (n_chunks, dim) array per text, row i matching chunk_spans(text)[i].
+        """
+        if not self.model or not texts:
+            return []
+        if self.cache is None:
+            return self._embed_uncached(texts)
+
+        if hashes is None:
+            hashes = [self.hash_content(text) for text in texts]
+        keys = [self._cache_key(h) for h in hashes]
+        cached = self.cache.get_many(set(keys))
+
+        pending = {}
+        for key, text in zip(keys, texts):
+            if key not in cached and key not in pending and text:
+                pending[key] = text
+
+        if pending:
+            fresh = self._embed_uncached(list(pending.values()))
+            computed = {key: matrix for key, matrix in zip(pending, fresh) if len(matrix)}
+            self.cache.set_many(computed)
+            cached.update(computed)
+
+        empty = np.zeros((0, 0), dtype=np.float32)
+        return [cached.get(key, empty) for key in keys]
+
+    def generate_embeddings(self, texts: List[str], hashes: Optional[List[str]] = None) -> np.ndarray:
+        """
+        Document vectors for many texts: the mean of each text's chunk vectors.
+        Returns an array of shape (len(texts), dim); texts without chunks get a zero row.
+        """
+        matrices = self.generate_chunk_embeddings(texts, hashes)
+        if not matrices:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        dim = max(matrix.shape[1] for matrix in matrices)
+        embeddings = np.zeros((len(matrices), dim), dtype=np.float32)
+        for row, matrix in enumerate(matrices):
+            if len(matrix):
+                embeddings[row] = matrix.mean(axis=0)
+        return embeddings
+
+    def _embed_uncached(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        Every chunk of every document goes through a single encode call and the
+        chunk vectors are split back per document.
+        """
         chunks = []
-        for i in range(0, len(text), chunk_size - overlap):
-            chunks.append(text[i:i + chunk_size])
-            if i + chunk_size >= len(text):
-                break
-        return chunks
+        counts = []
+        for text in texts:
+            doc_chunks = self.chunk_text(text)
+            chunks.extend(doc_chunks)
+            counts.append(len(doc_chunks))
+
+        if not chunks:
+            return [np.zeros((0, 0), dtype=np.float32) for _ in texts]
+
+        # Chunks are laid out document by document, so each document owns a
+        # contiguous run of rows and the split only creates views
+        vectors = self.encode_chunks(chunks)
+        return np.split(vectors, np.cumsum(counts)[:-1])
 
     def generate_text_embedding(self, text):
         if not self.model:
             return []
-        
+
         # For long texts, we chunk and average the embeddings
-        # This is a simplified approach for a single document embedding
-        chunks = self.chunk_text(text)
-        if not chunks:
+        embeddings = self.generate_embeddings([text])
+        if embeddings.shape[1] == 0:
             return []
-            
-        import numpy as np
-        embeddings = [self.model.encode(chunk) for chunk in chunks]
-        avg_embedding = np.mean(embeddings, axis=0)
-        return avg_embedding.tolist()
+        return embeddings[0].tolist()
 
     @staticmethod
     def hash_content(content):
@@ -0,0 +1,210 @@
+import json
+import os
+from typing import List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+try:
+    import torch
+    from sentence_transformers import SentenceTransformer
+    HAS_TORCH = True
+except ImportError:
+    HAS_TORCH = False
+
+try:
+    import onnxruntime
+    from tokenizers import Tokenizer
+    HAS_ONNX = True
+except ImportError:
+    HAS_ONNX = False
+
+BACKENDS_AVAILABLE = HAS_TORCH or HAS_ONNX
+
+# Written next to an exported ONNX model with its agreement against fp32
+METADATA_FILE = "export.json"
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def _set_threads():
+    if HAS_TORCH and settings.EMBEDDING_THREADS:
+        torch.set_num_threads(settings.EMBEDDING_THREADS)
+
+
+def load_torch_model(model_name: str):
+    """The reference fp32 SentenceTransformer on CPU"""
+    _set_threads()
+    return SentenceTransformer(model_name, device="cpu")
+
+
+def load_int8_model(model_name: str):
+    """SentenceTransformer with its Linear layers dynamically quantized to int8"""
+    model = load_torch_model(model_name)
+    return torch.quantization.quantize_dynamic(model, {torch.nn.Linear}, dtype=torch.qint8)
+
+
+class _TokenizerAdapter:
+    """Gives a `tokenizers.Tokenizer` the call signature of a HuggingFace tokenizer"""
+
+    def __init__(self, tokenizer):
+        self._tokenizer = tokenizer
+
+    def __call__(self, text, add_special_tokens=True):
+        return {"input_ids": self._tokenizer.encode(text, add_special_tokens=add_special_tokens).ids}
+
+
+class OnnxEmbeddingModel:
+    """
+    Sentence embeddings from an exported ONNX transformer.
+    Reproduces the all-MiniLM-L6-v2 pipeline (mean pooling over the attention
+    mask, then L2 normalisation) with onnxruntime and the `tokenizers` library,
+    so neither torch nor transformers is needed at inference time.
+    """
+
+    def __init__(self, model_dir: str, max_seq_length: int = 256, quantized: bool = True):
+        filename = "model_int8.onnx" if quantized and os.path.exists(os.path.join(model_dir, "model_int8.onnx")) else "model.onnx"
+        options = onnxruntime.SessionOptions()
+        if settings.EMBEDDING_THREADS:
+            options.intra_op_num_threads = settings.EMBEDDING_THREADS
+        self.session = onnxruntime.InferenceSession(
+            os.path.join(model_dir, filename), options, providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {i.name for i in self.session.get_inputs()}
+
+        raw_tokenizer = Tokenizer.from_file(os.path.join(model_dir, "tokenizer.json"))
+        raw_tokenizer.enable_truncation(max_seq_length)
+        raw_tokenizer.enable_padding()
+        self._tokenizer = raw_tokenizer
+        self.tokenizer = _TokenizerAdapter(raw_tokenizer)
+
+        self.metadata = {"file": filename}
+        metadata_path = os.path.join(model_dir, METADATA_FILE)
+        if os.path.exists(metadata_path):
+            with open(metadata_path) as f:
+                self.metadata.update(json.load(f))
+
+    def get_sentence_embedding_dimension(self):
+        return self.session.get_outputs()[0].shape[-1]
+
+    def encode(self, sentences: List[str], batch_size: int = 32, **kwargs) -> np.ndarray:
+        batches = []
+        for i in range(0, len(sentences), batch_size):
+            encodings = self._tokenizer.encode_batch(sentences[i:i + batch_size])
+            input_ids = np.array([e.ids for e in encodings], dtype=np.int64)
+            attention_mask = np.array([e.attention_mask for e in encodings], dtype=np.int64)
+            feeds = {"input_ids": input_ids, "attention_mask": attention_mask}
+            if "token_type_ids" in self.input_names:
+                feeds["token_type_ids"] = np.zeros_like(input_ids)
+
+            hidden = self.session.run(None, feeds)[0]
+            mask = attention_mask[:, :, None].astype(np.float32)
+            pooled = (hidden * mask).sum(axis=1) / np.maximum(mask.sum(axis=1), 1e-9)
+            pooled /= np.maximum(np.linalg.norm(pooled, axis=1, keepdims=True), 1e-12)
+            batches.append(pooled.astype(np.float32))
+        return np.concatenate(batches) if batches else np.zeros((0, 0), dtype=np.float32)
+
+
+def load_tokenizer(model_name: str):
+    """
+    Just the tokenizer of model_name, for sizing chunks in processes that
+    leave the model itself to the model server. None when unavailable.
+    """
+    try:
+        from tokenizers import Tokenizer
+        return _TokenizerAdapter(Tokenizer.from_pretrained(model_name))
+    except Exception as e:
+        print(f"Tokenizer for {model_name} unavailable, chunking by approximate token counts: {e}")
+        return None
+
+
+def cosine_agreement(reference: np.ndarray, candidate: np.ndarray) -> dict:
+    """Row-wise cosine similarity between two embedding matrices of the same texts"""
+    reference = reference / np.linalg.norm(reference, axis=1, keepdims=True)
+    candidate = candidate / np.linalg.norm(candidate, axis=1, keepdims=True)
+    cosines = (reference * candidate).sum(axis=1)
+    return {"mean": float(cosines.mean()), "min": float(cosines.min())}
+
+
+def export_onnx(model_name: str, output_dir: str, sample_texts: Optional[List[str]] = None):
+    """
+    Export the transformer behind model_name to ONNX plus a dynamically
+    quantized int8 copy, and record their agreement with the fp32 model.
+    Needs torch and onnxruntime; run it once at build time, e.g.
+    `python -m app.services.embedding_backends export <output_dir>`.
+    """
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(output_dir, exist_ok=True)
+    reference = load_torch_model(model_name)
+    transformer = reference[0].auto_model.eval()
+    tokenizer = reference.tokenizer
+
+    dummy = tokenizer(["An example sentence to trace the graph."], return_tensors="pt")
+    inputs = tuple(dummy[name] for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy)
+    input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+    model_path = os.path.join(output_dir, "model.onnx")
+    torch.onnx.export(
+        transformer,
+        inputs,
+        model_path,
+        input_names=input_names,
+        output_names=["last_hidden_state"],
+        dynamic_axes={name: {0: "batch", 1: "sequence"} for name in input_names + ["last_hidden_state"]},
+        opset_version=14,
+    )
+    quantize_dynamic(model_path, os.path.join(output_dir, "model_int8.onnx"), weight_type=QuantType.QInt8)
+    tokenizer.save_pretrained(output_dir)
+
+    sample_texts = sample_texts or [
+        "Plagiarism is the representation of another author's language or ideas as one's own.",
+        "The mitochondria is the powerhouse of the cell.",
+        "Students must cite every source they quote or paraphrase in their essays.",
+        "Quantized models trade a small amount of accuracy for much faster inference.",
+    ]
+    expected = reference.encode(sample_texts, convert_to_numpy=True)
+    metadata = {"model_name": model_name, "agreement": {}}
+    for quantized in (False, True):
+        candidate = OnnxEmbeddingModel(output_dir, reference.max_seq_length, quantized=quantized)
+        metadata["agreement"][candidate.metadata["file"]] = cosine_agreement(expected, candidate.encode(sample_texts))
+    with open(os.path.join(output_dir, METADATA_FILE), "w") as f:
+        json.dump(metadata, f, indent=2)
+    return metadata
+
+
+def load_embedding_model(model_name: str, backend: Optional[str] = None):
+    """
+    Load the embedding model for the configured backend:
+    'torch' (fp32), 'int8' (dynamically quantized torch) or 'onnx'
+    (exported model from EMBEDDING_ONNX_DIR, int8 if available).
+    Returns None when the backend's libraries or files are missing.
+    """
+    backend = (backend or settings.EMBEDDING_BACKEND).lower()
+    try:
+        if backend == "onnx":
+            if not HAS_ONNX:
+                print("onnxruntime/tokenizers not installed, embedding backend 'onnx' unavailable")
+                return None
+            model = OnnxEmbeddingModel(settings.EMBEDDING_ONNX_DIR)
+            agreement = model.metadata.get("agreement", {}).get(model.metadata["file"])
+            print(f"Using ONNX embedding backend ({model.metadata['file']}, agreement with fp32: {agreement})")
+            return model
+        if not HAS_TORCH:
+            print(f"torch/sentence-transformers not installed, embedding backend '{backend}' unavailable")
+            return None
+        if backend == "int8":
+            return load_int8_model(model_name)
+        return load_torch_model(model_name)
+    except Exception as e:
+        print(f"Failed to load embedding backend '{backend}': {e}")
+        return None
+
+
+if __name__ == "__main__":
+    import sys
+
+    if len(sys.argv) != 3 or sys.argv[1] != "export":
+        print("usage: python -m app.services.embedding_backends export <output_dir>")
+        sys.exit(1)
+    print(json.dumps(export_onnx(DEFAULT_EMBEDDING_MODEL, sys.argv[2]), indent=2))
@@ -0,0 +1,333 @@
+import asyncio
+import random
+import threading
+import time
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import httpx
+
+from app.core.config import settings
+
+
+class OutboundUnavailable(Exception):
+    """An outbound call was refused without reaching the remote service"""
+
+
+class CircuitOpenError(OutboundUnavailable):
+    pass
+
+
+class ConcurrencyTimeout(OutboundUnavailable):
+    pass
+
+
+def _transient_errors() -> tuple:
+    errors = [TimeoutError, ConnectionError, asyncio.TimeoutError, httpx.TransportError]
+    try:
+        import openai
+        errors += [openai.APIConnectionError, openai.APITimeoutError]
+    except ImportError:
+        pass
+    return tuple(errors)
+
+
+_TRANSIENT_ERRORS = _transient_errors()
+
+
+def is_retryable(exc: BaseException) -> bool:
+    """
+    Timeouts, connection errors, 429s and 5xx responses are worth retrying;
+    other HTTP errors (bad request, auth) will fail the same way again and
+    say nothing about the health of the service, and neither do bugs on
+    our side (KeyError, AttributeError, ...).
+    """
+    status = getattr(exc, "status_code", None)
+    if status is None:
+        status = getattr(getattr(exc, "response", None), "status_code", None)
+    if status is not None:
+        return status in (408, 429) or status >= 500
+    return isinstance(exc, _TRANSIENT_ERRORS)
+
+
+class TokenBucket:
+    """rate tokens per second, up to burst stored; reserve() books a token and says how long to wait for it"""
+
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def reserve(self) -> float:
+        if not self.rate:
+            return 0.0
+        with self._lock:
+            now = time.monotonic()
+            self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+            self.updated = now
+            self.tokens -= 1
+            return 0.0 if self.tokens >= 0 else -self.tokens / self.rate
+
+
+class AIMDLimiter:
+    """
+    Adaptive concurrency limit. Each fast success raises the limit by
+    1/limit (about one slot per round of calls); an error or a call slower
+    than latency_target multiplies it by `decrease`. Slots are taken with
+    try_acquire and returned with release, from threads or event loops.
+    """
+
+    def __init__(self, maximum: int, minimum: int = 1, latency_target: float = 5.0, decrease: float = 0.5):
+        self.maximum = maximum
+        self.minimum = minimum
+        self.latency_target = latency_target
+        self.decrease = decrease
+        self.limit = float(maximum)
+        self.in_flight = 0
+        self._lock = threading.Lock()
+        self._released = threading.Condition(self._lock)
+
+    def try_acquire(self) -> bool:
+        with self._lock:
+            if self.in_flight >= int(self.limit):
+                return False
+            self.in_flight += 1
+            return True
+
+    def acquire(self, timeout: float) -> bool:
+        deadline = time.monotonic() + timeout
+        with self._released:
+            while self.in_flight >= int(self.limit):
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._released.wait(remaining):
+                    return False
+            self.in_flight += 1
+            return True
+
+    def release(self, latency: Optional[float], ok: bool):
+        with self._released:
+            self.in_flight -= 1
+            if ok and latency is not None and latency <= self.latency_target:
+                self.limit = min(self.maximum, self.limit + 1 / self.limit)
+            elif latency is not None or not ok:
+                self.limit = max(self.minimum, self.limit * self.decrease)
+            self._released.notify_all()
+
+
+class CircuitBreaker:
+    """
+    Opens after failure_threshold consecutive failures and then fails fast
+    for reset_timeout seconds; after that one probe call is let through
+    (half-open), and its outcome closes or re-opens the circuit.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self.probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "half_open" if time.monotonic() - self.opened_at >= self.reset_timeout else "open"
+
+    def admit(self) -> Optional[str]:
+        """"call" or "probe" when a call may go ahead, None when it must fail fast"""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return "call"
+            if state == "half_open" and not self.probing:
+                self.probing = True
+                return "probe"
+            return None
+
+    def allow(self) -> bool:
+        return self.admit() is not None
+
+    def abort_probe(self):
+        """The probe ended without an outcome (cancelled, or never sent); let the next call probe"""
+        with self._lock:
+            self.probing = False
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self.probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self.probing or self.failures >= self.failure_threshold:
+                self.opened_at = time.monotonic()
+            self.probing = False
+
+
+class Governor:
+    """
+    Guards calls to one outbound service: a token bucket bounds the request
+    rate, an AIMD limiter the calls in flight, and a circuit breaker fails
+    fast while the service is down. Retryable failures are retried with
+    full-jitter exponential backoff. call() runs a blocking function and
+    acall() an async one; both raise OutboundUnavailable when the call was
+    refused, or the last error once the retries are spent.
+    """
+
+    def __init__(self, name: str, rate: float, burst: float = None, max_concurrency: int = 8,
+                 latency_target: float = 5.0, failure_threshold: int = 5, reset_timeout: float = 30.0,
+                 retries: int = 2, backoff: float = 0.5, backoff_max: float = 8.0, queue_timeout: float = 30.0):
+        self.name = name
+        self.bucket = TokenBucket(rate, burst or max(1.0, rate))
+        self.limiter = AIMDLimiter(max_concurrency, latency_target=latency_target)
+        self.breaker = CircuitBreaker(failure_threshold, reset_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.backoff_max = backoff_max
+        self.queue_timeout = queue_timeout
+        self.counters = {"calls": 0, "successes": 0, "failures": 0, "retries": 0, "rejected": 0, "throttled": 0}
+        self.latency_ewma = None
+
+    def _backoff(self, attempt: int) -> float:
+        return random.uniform(0, min(self.backoff_max, self.backoff * 2 ** attempt))
+
+    def _admit(self) -> Tuple[float, bool]:
+        """Checks the breaker and books a token; returns the wait before sending and whether this is the probe"""
+        self.counters["calls"] += 1
+        admitted = self.breaker.admit()
+        if admitted is None:
+            self.counters["rejected"] += 1
+            raise CircuitOpenError(f"{self.name} circuit is open")
+        delay = self.bucket.reserve()
+        if delay:
+            self.counters["throttled"] += 1
+        return delay, admitted == "probe"
+
+    def _finish(self, started: float, exc: Optional[BaseException]) -> bool:
+        """Records an attempt's outcome; returns whether to retry"""
+        latency = time.monotonic() - started
+        if exc is None:
+            self.limiter.release(latency, ok=True)
+            self.breaker.record_success()
+            self.counters["successes"] += 1
+            self.latency_ewma = latency if self.latency_ewma is None else 0.8 * self.latency_ewma + 0.2 * latency
+            return False
+        retryable = is_retryable(exc)
+        if retryable:
+            self.limiter.release(latency, ok=False)
+            self.breaker.record_failure()
+        else:
+            # The service answered; only this request was bad
+            self.limiter.release(None, ok=True)
+            self.breaker.record_success()
+        self.counters["failures"] += 1
+        return retryable
+
+    def call(self, fn: Callable, *args, **kwargs) -> Any:
+        for attempt in range(self.retries + 1):
+            delay, probe = self._admit()
+            finished = False
+            try:
+                if delay:
+                    time.sleep(delay)
+                if not self.limiter.acquire(self.queue_timeout):
+                    self.counters["rejected"] += 1
+                    raise ConcurrencyTimeout(f"{self.name} has no free call slot")
+                started = time.monotonic()
+                try:
+                    result = fn(*args, **kwargs)
+                except Exception as e:
+                    finished = True
+                    if not self._finish(started, e) or attempt == self.retries:
+                        raise
+                else:
+                    finished = True
+                    self._finish(started, None)
+                    return result
+            finally:
+                # A probe that never got an outcome must not leave the breaker half-open for good
+                if probe and not finished:
+                    self.breaker.abort_probe()
+            self.counters["retries"] += 1
+            time.sleep(self._backoff(attempt))
+
+    async def acall(self, fn: Callable, *args, **kwargs) -> Any:
+        for attempt in range(self.retries + 1):
+            delay, probe = self._admit()
+            finished = False
+            try:
+                if delay:
+                    await asyncio.sleep(delay)
+                # The limiter is shared with threads, so event loops poll it
+                # rather than block on its condition
+                waited = 0.0
+                while not self.limiter.try_acquire():
+                    if waited >= self.queue_timeout:
+                        self.counters["rejected"] += 1
+                        raise ConcurrencyTimeout(f"{self.name} has no free call slot")
+                    await asyncio.sleep(0.01)
+                    waited += 0.01
+                started = time.monotonic()
+                try:
+                    result = await fn(*args, **kwargs)
+                except asyncio.CancelledError:
+                    self.limiter.release(None, ok=True)
+                    raise
+                except Exception as e:
+                    finished = True
+                    if not self._finish(started, e) or attempt == self.retries:
+                        raise
+                else:
+                    finished = True
+                    self._finish(started, None)
+                    return result
+            finally:
+                if probe and not finished:
+                    self.breaker.abort_probe()
+            self.counters["retries"] += 1
+            await asyncio.sleep(self._backoff(attempt))
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            **self.counters,
+            "state": self.breaker.state,
+            "concurrency_limit": int(self.limiter.limit),
+            "in_flight": self.limiter.in_flight,
+            "latency_ewma": self.latency_ewma,
+        }
+
+
+_governors: Dict[str, Governor] = {}
+_governors_lock = threading.Lock()
+
+
+def _governor_settings(name: str) -> Dict[str, Any]:
+    common = {
+        "failure_threshold": settings.OUTBOUND_FAILURE_THRESHOLD,
+        "reset_timeout": settings.OUTBOUND_RESET_TIMEOUT,
+        "retries": settings.OUTBOUND_RETRIES,
+        "backoff": settings.OUTBOUND_BACKOFF,
+        "backoff_max": settings.OUTBOUND_BACKOFF_MAX,
+    }
+    if name == "searxng":
+        return {**common, "rate": settings.SEARXNG_RATE_LIMIT, "max_concurrency": settings.SEARXNG_CONCURRENCY,
+                "latency_target": settings.SEARXNG_LATENCY_TARGET}
+    return {**common, "rate": settings.AI_PROVIDER_RATE_LIMIT, "max_concurrency": settings.AI_PROVIDER_CONCURRENCY,
+            "latency_target": settings.AI_PROVIDER_LATENCY_TARGET}
+
+
+def get_governor(name: str) -> Governor:
+    """The process-wide governor for an outbound service ('searxng' or an AI provider name)"""
+    with _governors_lock:
+        if name not in _governors:
+            _governors[name] = Governor(name, **_governor_settings(name))
+        return _governors[name]
+
+
+def governor_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: governor.stats() for name, governor in _governors.items()}
@@ -0,0 +1,103 @@
+import hashlib
+from typing import Dict, Iterable, List, Optional, Set, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+from app.services.similarity import word_ngrams
+
+# Shingle hashes are processed in blocks of this many, bounding the
+# (permutations x shingles) intermediate matrix for very long documents
+_SHINGLE_BLOCK = 8192
+
+
+class MinHasher:
+    """
+    MinHash signatures over hashed word shingles, with LSH banding.
+    Each permutation is a multiply-shift hash of the 32-bit shingle hash,
+    computed for all permutations at once with wrapping uint64 arithmetic.
+    A signature is num_perm uint32 values (4 * num_perm bytes); the share of
+    equal values between two signatures estimates the Jaccard similarity of
+    their shingle sets.
+    """
+
+    def __init__(self, num_perm: int = None, bands: int = None, shingle_size: int = None, seed: int = 1):
+        self.num_perm = num_perm or settings.MINHASH_PERMUTATIONS
+        self.bands = bands or settings.MINHASH_BANDS
+        self.shingle_size = shingle_size or settings.MINHASH_SHINGLE
+        if self.num_perm % self.bands:
+            raise ValueError("num_perm must be a multiple of bands")
+        self.rows = self.num_perm // self.bands
+        rng = np.random.default_rng(seed)
+        # Odd multipliers keep multiply-shift hashing universal
+        self._a = rng.integers(1, 2**63, self.num_perm, dtype=np.uint64) | np.uint64(1)
+        self._b = rng.integers(0, 2**63, self.num_perm, dtype=np.uint64)
+
+    def shingles(self, text: str) -> Set[int]:
+        return word_ngrams(text, self.shingle_size)
+
+    def signature_of(self, shingles: Iterable[int]) -> np.ndarray:
+        hashes = np.fromiter(shingles, dtype=np.uint64)
+        signature = np.full(self.num_perm, np.iinfo(np.uint32).max, dtype=np.uint32)
+        for start in range(0, len(hashes), _SHINGLE_BLOCK):
+            block = hashes[start:start + _SHINGLE_BLOCK]
+            permuted = (np.outer(self._a, block) + self._b[:, None]) >> np.uint64(32)
+            signature = np.minimum(signature, permuted.min(axis=1).astype(np.uint32))
+        return signature
+
+    def signature(self, text: str) -> Optional[np.ndarray]:
+        """
+        The text's signature, or None when it has no words: an empty shingle
+        set would give the all-maximum signature, which every other empty
+        text (symbols only, an image-only PDF) matches with Jaccard 1.0
+        """
+        shingles = self.shingles(text)
+        return self.signature_of(shingles) if shingles else None
+
+    @staticmethod
+    def to_bytes(signature: np.ndarray) -> bytes:
+        return signature.astype("<u4").tobytes()
+
+    @staticmethod
+    def from_bytes(data: bytes) -> np.ndarray:
+        return np.frombuffer(data, dtype="<u4")
+
+    def band_buckets(self, signature: np.ndarray) -> List[int]:
+        """One bucket key per band: a signed 64-bit hash of the band's rows"""
+        data = signature.astype("<u4").tobytes()
+        width = self.rows * 4
+        return [
+            int.from_bytes(hashlib.blake2b(data[i * width:(i + 1) * width], digest_size=8).digest(), "little", signed=True)
+            for i in range(self.bands)
+        ]
+
+    @staticmethod
+    def jaccard(a: np.ndarray, b: np.ndarray) -> float:
+        """Jaccard similarity estimated from two signatures"""
+        return float(np.mean(a == b))
+
+
+def lsh_pairs(signatures: Dict, hasher: MinHasher, threshold: float) -> List[Tuple[object, object, float]]:
+    """
+    Near-duplicate pairs among an in-memory set of signatures: documents
+    sharing at least one LSH bucket are candidates, confirmed by their
+    estimated Jaccard similarity. Returns (key_a, key_b, jaccard) tuples.
+    """
+    signatures = {key: signature for key, signature in signatures.items() if signature is not None}
+    buckets = {}
+    for key, signature in signatures.items():
+        for band, bucket in enumerate(hasher.band_buckets(signature)):
+            buckets.setdefault((band, bucket), []).append(key)
+
+    seen = set()
+    pairs = []
+    for keys in buckets.values():
+        for i, a in enumerate(keys):
+            for b in keys[i + 1:]:
+                if (a, b) in seen:
+                    continue
+                seen.add((a, b))
+                jaccard = MinHasher.jaccard(signatures[a], signatures[b])
+                if jaccard >= threshold:
+                    pairs.append((a, b, jaccard))
+    return pairs
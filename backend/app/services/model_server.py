@@ -0,0 +1,315 @@
+import asyncio
+import base64
+import json
+import os
+import socket
+import struct
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+
+import numpy as np
+
+from app.core.config import settings
+
+# Messages are a 4-byte big-endian length followed by that many bytes of JSON
+_HEADER = struct.Struct(">I")
+
+
+def _pack(message: Dict[str, Any]) -> bytes:
+    body = json.dumps(message).encode()
+    return _HEADER.pack(len(body)) + body
+
+
+def _encode_array(array: np.ndarray) -> Dict[str, Any]:
+    array = np.ascontiguousarray(array, dtype=np.float32)
+    return {"shape": list(array.shape), "data": base64.b64encode(array.tobytes()).decode()}
+
+
+def _decode_array(payload: Dict[str, Any]) -> np.ndarray:
+    return np.frombuffer(base64.b64decode(payload["data"]), dtype=np.float32).reshape(payload["shape"])
+
+
+def sorted_apply(fn: Callable[[List[str]], Any], texts: List[str]) -> list:
+    """
+    Apply a batch function to texts sorted by length, so each model batch
+    pads to a similar size, and return its outputs in the original order
+    """
+    order = sorted(range(len(texts)), key=lambda i: -len(texts[i]))
+    outputs = fn([texts[i] for i in order])
+    restored = [None] * len(texts)
+    for position, i in enumerate(order):
+        restored[i] = outputs[position]
+    return restored
+
+
+class MicroBatcher:
+    """
+    Collects the texts of concurrent requests into one model call. A batch
+    is sent once it holds max_batch texts or its oldest request has waited
+    max_latency seconds, whichever comes first; each caller gets back the
+    outputs for its own texts. Model calls run on `executor`, so requests
+    keep queueing (and forming the next batch) while a batch is computed.
+    """
+
+    def __init__(self, fn: Callable[[List[str]], list], max_batch: int, max_latency: float, executor):
+        self.fn = fn
+        self.max_batch = max_batch
+        self.max_latency = max_latency
+        self.executor = executor
+        self.pending = []
+        self.size = 0
+        self._timer = None
+        self.batches = 0
+        self.items = 0
+
+    async def submit(self, texts: List[str]) -> list:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self.pending.append((texts, future))
+        self.size += len(texts)
+        if self.size >= self.max_batch:
+            self._flush()
+        elif self._timer is None:
+            self._timer = loop.call_later(self.max_latency, self._flush)
+        return await future
+
+    def _flush(self):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self.pending, self.size = self.pending, [], 0
+        if batch:
+            asyncio.ensure_future(self._run(batch))
+
+    async def _run(self, batch):
+        texts = [text for request, _ in batch for text in request]
+        self.batches += 1
+        self.items += len(texts)
+        try:
+            outputs = await asyncio.get_running_loop().run_in_executor(self.executor, sorted_apply, self.fn, texts)
+        except Exception as e:
+            for _, future in batch:
+                if not future.done():
+                    future.set_exception(e)
+            return
+        start = 0
+        for request, future in batch:
+            if not future.done():
+                future.set_result(outputs[start:start + len(request)])
+            start += len(request)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"batches": self.batches, "items": self.items, "mean_batch": self.items / self.batches if self.batches else 0.0}
+
+
+class ModelServer:
+    """
+    Owns the embedding and AI-detection models for every API and worker
+    process on the host, so each model is loaded once. Clients send
+    {"op": "embed" | "classify" | "stats", "texts": [...]} over a Unix
+    socket; texts from concurrent requests are micro-batched per model.
+    One model thread keeps the models from competing for the CPU.
+    """
+
+    def __init__(self, path: str, embed: Optional[Callable] = None, classify: Optional[Callable] = None,
+                 max_batch: int = None, max_latency: float = None):
+        self.path = path
+        executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="model")
+        max_batch = max_batch or settings.MODEL_SERVER_MAX_BATCH
+        max_latency = max_latency if max_latency is not None else settings.MODEL_SERVER_MAX_LATENCY_MS / 1000
+        self.batchers = {}
+        if embed is not None:
+            self.batchers["embed"] = MicroBatcher(embed, max_batch, max_latency, executor)
+        if classify is not None:
+            self.batchers["classify"] = MicroBatcher(classify, max_batch, max_latency, executor)
+        self._server = None
+
+    async def _handle(self, request: Dict[str, Any]) -> Dict[str, Any]:
+        op = request.get("op")
+        if op == "stats":
+            return {"ok": True, "result": {name: batcher.stats() for name, batcher in self.batchers.items()}}
+        batcher = self.batchers.get(op)
+        if batcher is None:
+            return {"ok": False, "error": f"model server has no '{op}' model"}
+        try:
+            outputs = await batcher.submit(request.get("texts", []))
+        except Exception as e:
+            return {"ok": False, "error": f"{type(e).__name__}: {e}"}
+        if op == "embed":
+            return {"ok": True, "result": _encode_array(np.stack(outputs) if outputs else np.zeros((0, 0)))}
+        return {"ok": True, "result": outputs}
+
+    async def _serve_connection(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        try:
+            while True:
+                header = await reader.readexactly(_HEADER.size)
+                request = json.loads(await reader.readexactly(_HEADER.unpack(header)[0]))
+                writer.write(_pack(await self._handle(request)))
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+        self._server = await asyncio.start_unix_server(self._serve_connection, path=self.path)
+        os.chmod(self.path, 0o660)
+
+    async def serve_forever(self):
+        await self.start()
+        print(f"Model server listening on {self.path} ({', '.join(self.batchers)})")
+        async with self._server:
+            await self._server.serve_forever()
+
+    async def close(self):
+        if self._server is not None:
+            self._server.close()
+            await self._server.wait_closed()
+
+
+class ModelServerError(RuntimeError):
+    pass
+
+
+class ModelClient:
+    """
+    Blocking client for a ModelServer, safe to share between threads: each
+    thread keeps its own connection, reconnecting once if the server was
+    restarted since the last call.
+    """
+
+    def __init__(self, path: str, timeout: float = None):
+        self.path = path
+        self.timeout = timeout or settings.MODEL_SERVER_TIMEOUT
+        self._local = threading.local()
+
+    def _connect(self) -> socket.socket:
+        sock = getattr(self._local, "sock", None)
+        if sock is None:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            sock.settimeout(self.timeout)
+            sock.connect(self.path)
+            self._local.sock = sock
+        return sock
+
+    def _close(self):
+        sock = getattr(self._local, "sock", None)
+        if sock is not None:
+            sock.close()
+            self._local.sock = None
+
+    def _recv_exactly(self, sock: socket.socket, size: int) -> bytes:
+        chunks = []
+        while size:
+            chunk = sock.recv(min(size, 1 << 20))
+            if not chunk:
+                raise ConnectionError("model server closed the connection")
+            chunks.append(chunk)
+            size -= len(chunk)
+        return b"".join(chunks)
+
+    def request(self, op: str, texts: Optional[List[str]] = None) -> Any:
+        message = _pack({"op": op, "texts": texts or []})
+        for attempt in range(2):
+            try:
+                sock = self._connect()
+                sock.sendall(message)
+                size = _HEADER.unpack(self._recv_exactly(sock, _HEADER.size))[0]
+                response = json.loads(self._recv_exactly(sock, size))
+                break
+            except (ConnectionError, BrokenPipeError, FileNotFoundError, socket.timeout) as e:
+                self._close()
+                if attempt or isinstance(e, socket.timeout):
+                    raise ModelServerError(f"model server at {self.path} unavailable: {e!r}") from e
+        if not response["ok"]:
+            raise ModelServerError(response["error"])
+        return response["result"]
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        return _decode_array(self.request("embed", texts))
+
+    def classify(self, texts: List[str]) -> List[Dict[str, Any]]:
+        return self.request("classify", texts)
+
+    def stats(self) -> Dict[str, Any]:
+        return self.request("stats")
+
+
+class RemoteEmbeddingModel:
+    """Stands in for a SentenceTransformer in EmbeddingService, encoding on the model server"""
+
+    def __init__(self, client: ModelClient, tokenizer=None):
+        self.client = client
+        self.tokenizer = tokenizer
+
+    def encode(self, sentences: List[str], batch_size: int = None, **kwargs) -> np.ndarray:
+        # One request per batch_size sentences, so each stays well inside
+        # the client timeout however many chunks a document batch has
+        sentences = list(sentences)
+        batch_size = batch_size or settings.EMBEDDING_BATCH_SIZE
+        pieces = [self.client.embed(sentences[i:i + batch_size]) for i in range(0, len(sentences), batch_size)]
+        return np.concatenate(pieces) if pieces else self.client.embed([])
+
+
+class RemoteClassifier:
+    """Stands in for the text-classification pipeline in AIDetectionService"""
+
+    def __init__(self, client: ModelClient, tokenizer=None):
+        self.client = client
+        self.tokenizer = tokenizer
+
+    def __call__(self, texts: List[str], **kwargs) -> List[Dict[str, Any]]:
+        # Batching, truncation and padding are the server's job
+        return self.client.classify(list(texts))
+
+
+_client = None
+
+
+def get_model_client() -> Optional[ModelClient]:
+    """The process-wide client when MODEL_SERVER_SOCKET is set, else None (models load in-process)"""
+    global _client
+    if not settings.MODEL_SERVER_SOCKET:
+        return None
+    if _client is None:
+        _client = ModelClient(settings.MODEL_SERVER_SOCKET)
+    return _client
+
+
+def main():
+    from app.services.ai_detection import HAS_TRANSFORMERS, LOCAL_MODEL
+    from app.services.embedding_backends import DEFAULT_EMBEDDING_MODEL, load_embedding_model
+
+    started = time.monotonic()
+    path = settings.MODEL_SERVER_SOCKET or "/run/models/models.sock"
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+
+    embed = None
+    model = load_embedding_model(DEFAULT_EMBEDDING_MODEL)
+    if model is not None:
+        def embed(texts):
+            return np.asarray(
+                model.encode(texts, batch_size=settings.EMBEDDING_BATCH_SIZE, convert_to_numpy=True, show_progress_bar=False),
+                dtype=np.float32,
+            )
+
+    classify = None
+    if HAS_TRANSFORMERS:
+        from transformers import pipeline
+
+        classifier = pipeline("text-classification", model=LOCAL_MODEL)
+
+        def classify(texts):
+            return classifier(texts, batch_size=settings.AI_DETECTION_BATCH_SIZE, truncation=True, padding=True)
+
+    server = ModelServer(path, embed=embed, classify=classify)
+    print(f"Models loaded in {time.monotonic() - started:.1f}s")
+    asyncio.run(server.serve_forever())
+
+
+if __name__ == "__main__":
+    main()
@@ -1,77 +1,225 @@
-import requests
-
-from typing import List, Dict, Any
+import asyncio
+import hashlib
+from bisect import bisect_right
+import re
+from typing import List, Dict, Any, Optional
 from app.core.config import settings
-from difflib import SequenceMatcher
+from app.services.cache import build_cache, decode_json, encode_json
+from app.services.governor import get_governor
+from app.services.query_planner import QueryPlanner
+from app.services.search_client import SearchClient
+from app.services.segmentation import Segmenter, Span, segment, word_length
+from app.services.similarity import get_similarity_engine
+from app.services.source_fetcher import SourceCache, SourceFetcher
+
+_QUERY_WORD_RE = re.compile(r"\w+")
+
+def normalize_query(query: str) -> str:
+    """Case, punctuation and spacing do not change what a web search returns"""
+    return " ".join(_QUERY_WORD_RE.findall(query.lower()))
+
+def coverage(spans, length: int) -> float:
+    """Share of a text of the given length covered by the a-side of matched spans"""
+    covered = end = 0
+    for a_start, a_end, _, _ in sorted(spans):
+        covered += max(0, a_end - max(a_start, end))
+        end = max(end, a_end)
+    return covered / length if length else 0.0
 
 class PlagiarismService:
     def __init__(self):
         self.searxng_url = settings.SEARXNG_URL.rstrip('/')
         self.enabled = bool(self.searxng_url)
+        self.search_client = SearchClient(self.searxng_url, governor=get_governor("searxng"))
+        self.engine = get_similarity_engine(settings.PLAGIARISM_SIMILARITY_ENGINE)
+        self.planner = QueryPlanner()
+        # Optional second stage: fetch the best candidate pages and align against their full text
+        self.source_fetcher = None
+        if settings.SOURCE_VERIFY:
+            self.source_fetcher = SourceFetcher(SourceCache(
+                settings.SOURCE_CACHE_PATH, settings.SOURCE_CACHE_TTL or None, settings.SOURCE_CACHE_PRUNE_INTERVAL
+            ))
+        # SearXNG results per normalized query, and whole scan results per document
+        self.search_cache = build_cache(
+            "searxng",
+            encode_json,
+            decode_json,
+            backend=settings.SEARCH_CACHE_BACKEND,
+            local_size=settings.SEARCH_CACHE_LOCAL_SIZE,
+            shared_size=settings.SEARCH_CACHE_SHARED_SIZE,
+            ttl=settings.SEARCH_CACHE_TTL or None,
+        )
+        self.scan_cache = build_cache(
+            "scan",
+            encode_json,
+            decode_json,
+            backend=settings.SEARCH_CACHE_BACKEND,
+            local_size=settings.SCAN_CACHE_LOCAL_SIZE,
+            shared_size=settings.SCAN_CACHE_SHARED_SIZE,
+            ttl=settings.SCAN_CACHE_TTL or None,
+        )
+
+    def _scan_key(self, text: str) -> str:
+        # Results depend on the scorer and the query plan as well as the text
+        digest = hashlib.sha256(text.encode()).hexdigest()
+        verify = f"verify{settings.SOURCE_VERIFY_TOP}:" if self.source_fetcher is not None else ""
+        return f"{self.engine.name}:{self.planner.budget}x{self.planner.query_words}:{verify}{digest}"
+
+    async def _search(self, queries: List[str]) -> List[Optional[List[Dict[str, Any]]]]:
+        """
+        SearXNG results for each query, from the search cache where possible.
+        Misses are searched concurrently, once per distinct normalized query;
+        failed searches are not cached.
+        """
+        keys = [normalize_query(query) for query in queries]
+        cached = {}
+        if self.search_cache is not None:
+            # Cache calls may reach Redis, so they stay off the event loop
+            cached = await asyncio.to_thread(self.search_cache.get_many, set(keys))
+
+        missing = {}
+        for key, query in zip(keys, queries):
+            if key not in cached:
+                missing.setdefault(key, query)
+        if missing:
+            found = await self.search_client.search_many(list(missing.values()))
+            fresh = {key: results for key, results in zip(missing, found) if results is not None}
+            if fresh and self.search_cache is not None:
+                await asyncio.to_thread(self.search_cache.set_many, fresh)
+            cached.update(fresh)
+        return [cached.get(key) for key in keys]
+
+    def cache_stats(self) -> Dict[str, Any]:
+        return {
+            "search": self.search_cache.stats() if self.search_cache is not None else None,
+            "scan": self.scan_cache.stats() if self.scan_cache is not None else None,
+            "sources": self.source_fetcher.stats() if self.source_fetcher is not None else None,
+        }
+
+    def _chunk_spans(self, text: str, chunk_size=150) -> List[Span]:
+        """Split text into sentence-aligned chunks of at most chunk_size words"""
+        segmenter = Segmenter("search", chunk_size, length=word_length)
+        return segment(text, segmenter)
 
     def _chunk_text(self, text: str, chunk_size=150) -> List[str]:
-        """Split text into chunks of approximately chunk_size words"""
-        words = text.split()
-        chunks = []
-        for i in range(0, len(words), chunk_size):
-            chunks.append(" ".join(words[i:i + chunk_size]))
-        return chunks
+        return [span.text for span in self._chunk_spans(text, chunk_size)]
 
     def _calculate_similarity(self, a: str, b: str) -> float:
         """Calculate generic similarity ratio between two strings"""
-        return SequenceMatcher(None, a, b).ratio()
+        return self.engine.compare(a, b).ratio
 
-    def check_plagiarism(self, text: str) -> Dict[str, Any]:
+    def _align(self, chunks: List[Span], page: str) -> List[tuple]:
+        """(similarity, matched_spans) of each chunk against a full source text"""
+        aligned = []
+        for span in chunks:
+            match = self.engine.compare(span.text, page)
+            matched_spans = [[span.start + a_start, span.start + a_end] for a_start, a_end, _, _ in match.spans]
+            aligned.append((coverage(match.spans, len(span.text)), matched_spans))
+        return aligned
+
+    async def _verify_sources(self, chunks: List[Span], candidates: Dict[str, float], titles: Dict[str, str],
+                              sources: Dict[str, Any], chunk_scores: List[float]) -> int:
+        """
+        Fetch the top candidate pages and align every checked chunk against
+        their full text. Against a whole page the similarity is the share of
+        the chunk found in it, since the page is usually far longer than the
+        chunk. Updates sources and chunk_scores in place and returns the
+        number of pages that could not be fetched.
+        """
+        top = sorted(candidates, key=candidates.get, reverse=True)[:settings.SOURCE_VERIFY_TOP]
+        pages = await self.source_fetcher.fetch_many(top)
+        for url, page in pages.items():
+            if not page:
+                continue
+            # Alignment is CPU-bound on long pages, so it stays off the event loop
+            aligned = await asyncio.to_thread(self._align, chunks, page)
+            for i, (sim, matched_spans) in enumerate(aligned):
+                if sim <= 0.1:
+                    continue
+                chunk_scores[i] = max(chunk_scores[i], sim)
+                source = sources.setdefault(url, {"title": titles.get(url), "count": 0, "max_similarity": 0.0, "matched_spans": []})
+                source["count"] += 1
+                source["max_similarity"] = max(source["max_similarity"], sim)
+                source["matched_spans"].extend(matched_spans)
+                source["verified"] = True
+        return sum(1 for page in pages.values() if page is None)
+
+    async def check_plagiarism(self, text: str) -> Dict[str, Any]:
         if not self.enabled:
             return {"error": "SearXNG URL not configured"}
 
-        chunks = self._chunk_text(text)
+        scan_key = self._scan_key(text)
+        if self.scan_cache is not None:
+            cached = await asyncio.to_thread(self.scan_cache.get, scan_key)
+            if cached is not None:
+                return {**cached, "cached": True}
+
+        chunks = self._chunk_spans(text)
+        chunk_starts = [span.start for span in chunks]
         sources = {}
-        total_similarity = 0.0
+        scores = {}  # best similarity per checked chunk index
+        candidates = {}  # best snippet similarity per result url
+        titles = {}
         
-        # Limit chunks to prevent excessive requests for demo
-        max_chunks = 5
-        checked_chunks = chunks[:max_chunks]
+        # A fixed budget of searches, spent on the most distinctive passages
+        # across the whole document; each query's results are scored against
+        # the chunk it was taken from
+        queries = self.planner.plan(text)
+        if not queries:
+            return {"error": "No searchable text in the document"}
+        query_chunks = [bisect_right(chunk_starts, query.start) - 1 for query in queries]
         
-        print(f"Checking {len(checked_chunks)} chunks against SearXNG...")
-
-        for chunk in checked_chunks:
-            try:
-                # Query SearXNG
-                params = {
-                    "q": chunk[:200], # Search snippet of the chunk
-                    "format": "json",
-                    "language": "auto"
-                }
-                resp = requests.get(f"{self.searxng_url}/search", params=params, timeout=10)
-                
-                if resp.status_code == 200:
-                    results = resp.json().get('results', [])
-                    
-                    # Check top 3 results for similarity
-                    chunk_max_sim = 0.0
-                    for res in results[:3]:
-                        sim = self._calculate_similarity(chunk, res.get('content', ''))
-                        if sim > chunk_max_sim:
-                            chunk_max_sim = sim
-                            
-                        # If similarity is high, record source
-                        if sim > 0.1: # Threshold for "relevance"
-                            url = res.get('url')
-                            if url not in sources:
-                                sources[url] = {
-                                    "title": res.get('title'),
-                                    "count": 1,
-                                    "max_similarity": sim
-                                }
-                            else:
-                                sources[url]["count"] += 1
-                                sources[url]["max_similarity"] = max(sources[url]["max_similarity"], sim)
-                    
-                    total_similarity += chunk_max_sim
+        print(f"Checking {len(set(query_chunks))} chunks against SearXNG...")
+
+        # All queries are searched concurrently; a chunk whose search failed or
+        # missed the scan deadline scores 0
+        all_results = await self._search([query.text[:200] for query in queries])
+        failed_chunks = len({index for index, results in zip(query_chunks, all_results) if results is None})
+
+        for index, results in zip(query_chunks, all_results):
+            span = chunks[index]
+            chunk = span.text
+            scores.setdefault(index, 0.0)
+            if results is None:
+                continue
+
+            # Check top 3 results for similarity
+            chunk_max_sim = 0.0
+            for res in results[:3]:
+                match = self.engine.compare(chunk, res.get('content', ''))
+                sim = match.ratio
+                # Matched text as character offsets in the submitted document
+                matched_spans = [[span.start + a_start, span.start + a_end] for a_start, a_end, _, _ in match.spans]
+                if sim > chunk_max_sim:
+                    chunk_max_sim = sim
+                url = res.get('url')
+                if url:
+                    candidates[url] = max(candidates.get(url, 0.0), sim)
+                    titles.setdefault(url, res.get('title'))
                     
-            except Exception as e:
-                print(f"Error querying SearXNG: {e}")
+                # If similarity is high, record source
+                if sim > 0.1: # Threshold for "relevance"
+                    if url not in sources:
+                        sources[url] = {
+                            "title": res.get('title'),
+                            "count": 1,
+                            "max_similarity": sim,
+                            "matched_spans": matched_spans
+                        }
+                    else:
+                        sources[url]["count"] += 1
+                        sources[url]["max_similarity"] = max(sources[url]["max_similarity"], sim)
+                        sources[url]["matched_spans"].extend(matched_spans)
+            
+            # Two queries from the same chunk count once, with the better score
+            scores[index] = max(scores[index], chunk_max_sim)
+
+        checked_chunks = [chunks[index] for index in scores]
+        chunk_scores = list(scores.values())
+        failed_sources = 0
+        if self.source_fetcher is not None and candidates:
+            failed_sources = await self._verify_sources(checked_chunks, candidates, titles, sources, chunk_scores)
+        total_similarity = sum(chunk_scores)
                 
         # Calculate overall score
         # Normalize: if every chunk has a perfect match, score is 100%
@@ -80,9 +228,15 @@ class PlagiarismService:
         
         sorted_sources = sorted(sources.values(), key=lambda x: x['max_similarity'], reverse=True)
 
-        return {
+        result = {
             "plagiarism_score": min(plagiarism_score, 100.0),
             "sources": sorted_sources,
             "checked_chunks": len(checked_chunks),
+            "failed_chunks": failed_chunks,
+            "verified_sources": sum(1 for source in sources.values() if source.get("verified")),
             "message": "Scan complete"
         }
+        # Partial scans are retried next time rather than served from cache
+        if not failed_chunks and not failed_sources and self.scan_cache is not None:
+            await asyncio.to_thread(self.scan_cache.set, scan_key, result)
+        return result
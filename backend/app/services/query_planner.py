@@ -0,0 +1,107 @@
+import re
+from typing import List, NamedTuple
+
+from app.core.config import settings
+from app.services.segmentation import Segmenter, segment, word_length
+
+_WORD_RE = re.compile(r"[^\W\d_]+")
+# References, links and page furniture: searching them finds citation
+# databases rather than copied prose
+_BOILERPLATE_RE = re.compile(
+    r"https?://|www\.|doi[:.]|\bet al\b|retrieved from|all rights reserved|copyright|"
+    r"table of contents|\bpage \d+|\bisbn\b|^\s*(references|bibliography|abstract|keywords)\b",
+    re.IGNORECASE,
+)
+
+# Frequent English words; a sentence made of them is not distinctive on the web
+COMMON_WORDS = frozenset("""
+a about above after again against all also although am an and any are as at be because been before being
+below between both but by can could did do does doing down during each even every few for from further
+had has have having he her here hers him his how however i if in into is it its itself just may me might
+more most much must my no nor not now of off on once one only or other our ours out over own same she
+should so some such than that the their theirs them then there these they this those through thus to too
+under until up upon us very was we were what when where which while who whom why will with would you your
+also many make made like well use used using first new way ways people time year years thing things part
+important different example often another therefore within without because however since among
+""".split())
+
+
+class PlannedQuery(NamedTuple):
+    start: int
+    end: int
+    text: str
+    score: float
+
+
+class QueryPlanner:
+    """
+    Chooses which passages of a document to search the web for, within a
+    fixed query budget. Every sentence-aligned window of up to query_words
+    words is scored for distinctiveness: the density of uncommon words,
+    their variety and the window's length, with references, links,
+    headings and number-heavy lines scored 0. The document is divided into
+    `budget` equal regions and the best window of each is chosen, so the
+    queries cover the whole text; regions with nothing worth searching give
+    their query to the best remaining window anywhere. A text with no
+    distinctive window at all still gets one query, for its longest window.
+    """
+
+    def __init__(self, budget: int = None, query_words: int = None, min_words: int = None):
+        self.budget = budget or settings.PLAGIARISM_QUERY_BUDGET
+        self.query_words = query_words or settings.PLAGIARISM_QUERY_WORDS
+        self.min_words = min_words or settings.PLAGIARISM_QUERY_MIN_WORDS
+        self.segmenter = Segmenter("query", self.query_words, length=word_length)
+
+    def score(self, text: str) -> float:
+        words = _WORD_RE.findall(text.lower())
+        if len(words) < self.min_words or _BOILERPLATE_RE.search(text):
+            return 0.0
+        letters = sum(c.isalpha() for c in text)
+        if sum(c.isdigit() for c in text) > 0.3 * max(letters, 1):
+            return 0.0
+        if sum(c.isupper() for c in text) > 0.5 * max(letters, 1):
+            return 0.0  # headings and shouting
+        rare = [w for w in words if len(w) > 3 and w not in COMMON_WORDS]
+        if not rare:
+            return 0.0
+        density = len(rare) / len(words)
+        variety = len(set(rare)) / len(rare)
+        length = min(1.0, len(words) / self.query_words)
+        return density * variety * length
+
+    def plan(self, text: str) -> List[PlannedQuery]:
+        """Up to budget queries in document order; none only for a text without words"""
+        candidates = []
+        longest = None
+        seen = set()
+        for span in segment(text, self.segmenter):
+            words = _WORD_RE.findall(span.text.lower())
+            key = " ".join(words)
+            # Repeated passages (templates, headers) are searched at most once
+            if key in seen:
+                continue
+            seen.add(key)
+            if words and (longest is None or len(words) > longest[0]):
+                longest = (len(words), span)
+            score = self.score(span.text)
+            if score > 0:
+                candidates.append(PlannedQuery(span.start, span.end, span.text, score))
+        if not candidates and longest is not None:
+            # Short or boilerplate-only texts are still checked, with their best shot
+            span = longest[1]
+            return [PlannedQuery(span.start, span.end, span.text, 0.0)]
+        if len(candidates) <= self.budget:
+            return candidates
+
+        region = len(text) / self.budget
+        best = {}
+        for candidate in candidates:
+            index = min(int(candidate.start // region), self.budget - 1)
+            if index not in best or candidate.score > best[index].score:
+                best[index] = candidate
+        chosen = set(best.values())
+        for candidate in sorted(candidates, key=lambda c: c.score, reverse=True):
+            if len(chosen) >= self.budget:
+                break
+            chosen.add(candidate)
+        return sorted(chosen, key=lambda c: c.start)
@@ -0,0 +1,92 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+from app.services.governor import Governor
+
+
+class SearchClient:
+    """
+    Async SearXNG client. One pooled httpx.AsyncClient per event loop keeps
+    connections alive across scans, and a semaphore bounds the searches in
+    flight so one scan cannot flood the SearXNG instance. With a governor,
+    searches are also rate limited, adaptively throttled, retried and cut
+    off while the instance is failing.
+    """
+
+    def __init__(self, base_url: str, concurrency: int = None, request_timeout: float = None, transport=None,
+                 governor: Optional[Governor] = None):
+        self.base_url = base_url.rstrip('/')
+        self.concurrency = concurrency or settings.SEARXNG_CONCURRENCY
+        self.request_timeout = request_timeout or settings.SEARXNG_REQUEST_TIMEOUT
+        self._transport = transport
+        self.governor = governor
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+    def _ensure_client(self):
+        # Clients and semaphores belong to the loop they were created on
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._client = httpx.AsyncClient(
+                base_url=self.base_url,
+                timeout=self.request_timeout,
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def search(self, query: str) -> List[Dict[str, Any]]:
+        """Results for one query; raises on HTTP errors and after request_timeout"""
+        if self.governor is not None:
+            return await self.governor.acall(self._search, query)
+        return await self._search(query)
+
+    async def _search(self, query: str) -> List[Dict[str, Any]]:
+        client = self._ensure_client()
+        async with self._semaphore:
+            # httpx timeouts apply per phase; this bounds the whole request
+            resp = await asyncio.wait_for(
+                client.get("/search", params={"q": query, "format": "json", "language": "auto"}),
+                self.request_timeout,
+            )
+        resp.raise_for_status()
+        return resp.json().get('results', [])
+
+    async def search_many(self, queries: List[str], deadline: float = None) -> List[Optional[List[Dict[str, Any]]]]:
+        """
+        Run all queries concurrently. Returns results in query order, with
+        None for queries that failed or were still running when the overall
+        deadline (seconds) passed.
+        """
+        deadline = deadline or settings.SEARXNG_SCAN_TIMEOUT
+        tasks = [asyncio.create_task(self.search(query)) for query in queries]
+        if not tasks:
+            return []
+        _, pending = await asyncio.wait(tasks, timeout=deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            print(f"{len(pending)} of {len(tasks)} SearXNG queries missed the {deadline}s scan deadline")
+
+        results = []
+        for task in tasks:
+            if task in pending:
+                results.append(None)
+            elif task.exception() is not None:
+                print(f"Error querying SearXNG: {task.exception()!r}")
+                results.append(None)
+            else:
+                results.append(task.result())
+        return results
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,169 @@
+import hashlib
+import re
+from collections import deque
+from typing import Callable, Iterator, List, NamedTuple, Optional, Tuple
+
+from app.services.cache import LRUCache
+
+# End of a sentence: terminal punctuation (plus closing quotes/brackets)
+# followed by whitespace, or a blank line
+_SENTENCE_END_RE = re.compile(r"[.!?]+[\"'”’)\]]*(?=\s)|\n\s*\n")
+_WORD_RE = re.compile(r"\S+")
+
+# Sub-word tokens per whitespace word, used when no tokenizer is available
+TOKENS_PER_WORD = 1.3
+
+
+class Span(NamedTuple):
+    """A segment of a document with its character offsets"""
+    start: int
+    end: int
+    text: str
+
+
+def _trim(text: str, start: int, end: int) -> Tuple[int, int]:
+    while start < end and text[start].isspace():
+        start += 1
+    while end > start and text[end - 1].isspace():
+        end -= 1
+    return start, end
+
+
+def iter_sentences(text: str) -> Iterator[Tuple[int, int]]:
+    """Yield (start, end) offsets of the sentences of text without copying it"""
+    start = 0
+    for match in _SENTENCE_END_RE.finditer(text):
+        s, e = _trim(text, start, match.end())
+        if s < e:
+            yield s, e
+        start = match.end()
+    s, e = _trim(text, start, len(text))
+    if s < e:
+        yield s, e
+
+
+def char_length(text: str, start: int, end: int) -> int:
+    return end - start
+
+
+def word_length(text: str, start: int, end: int) -> int:
+    return sum(1 for _ in _WORD_RE.finditer(text, start, end))
+
+
+def approx_token_length(text: str, start: int, end: int) -> int:
+    return int(word_length(text, start, end) * TOKENS_PER_WORD + 0.5)
+
+
+def tokenizer_length(tokenizer) -> Callable[[str, int, int], int]:
+    """Length function counting model tokens with a HuggingFace tokenizer"""
+    def length(text: str, start: int, end: int) -> int:
+        return len(tokenizer(text[start:end], add_special_tokens=False)["input_ids"])
+    return length
+
+
+class Segmenter:
+    """
+    Packs whole sentences into windows of at most max_length units, where the
+    unit is whatever `length` counts (characters, words or model tokens).
+    Consecutive windows share up to `overlap` units of trailing sentences.
+    Sentences longer than a window are split at word boundaries, and words
+    longer than a window at character boundaries.
+    """
+
+    def __init__(self, name: str, max_length: int, overlap: int = 0, length: Callable[[str, int, int], int] = char_length):
+        if overlap >= max_length:
+            raise ValueError("overlap must be smaller than max_length")
+        self.name = name
+        self.max_length = max_length
+        self.overlap = overlap
+        self.length = length
+
+    def _pieces(self, text: str, sentences) -> Iterator[Tuple[int, int]]:
+        """Sentence offsets, with sentences that do not fit split into smaller pieces"""
+        for start, end in sentences:
+            if self.length(text, start, end) <= self.max_length:
+                yield start, end
+                continue
+            for match in _WORD_RE.finditer(text, start, end):
+                w_start, w_end = match.span()
+                w_size = self.length(text, w_start, w_end)
+                if w_size <= self.max_length:
+                    yield w_start, w_end
+                    continue
+                # A single over-long "word" (e.g. a URL or base64 blob)
+                step = max(1, (w_end - w_start) * self.max_length // w_size)
+                for p in range(w_start, w_end, step):
+                    yield p, min(p + step, w_end)
+
+    def _units(self, text: str, sentences) -> Iterator[Tuple[int, int, int]]:
+        """
+        (start, end, size) of the pieces to pack. The size includes the gap
+        after the previous piece, so a window's total never undercounts the
+        whitespace it spans.
+        """
+        previous_end = None
+        for start, end in self._pieces(text, sentences):
+            size = self.length(text, start if previous_end is None else previous_end, end)
+            previous_end = end
+            yield start, end, size
+
+    def iter_spans(self, text: str, sentences=None) -> Iterator[Span]:
+        """Lazily yield the windows of text; sentences may be precomputed offsets"""
+        if not text:
+            return
+        window = deque()
+        size = 0
+        fresh = 0  # units in the window that no emitted span has covered yet
+        for unit in self._units(text, sentences if sentences is not None else iter_sentences(text)):
+            if window and size + unit[2] > self.max_length:
+                yield Span(window[0][0], window[-1][1], text[window[0][0]:window[-1][1]])
+                # Carry trailing units over as overlap, leaving room for the new unit
+                carried = deque()
+                kept = 0
+                while window and kept + window[-1][2] <= self.overlap and kept + window[-1][2] + unit[2] <= self.max_length:
+                    carried.appendleft(window.pop())
+                    kept += carried[0][2]
+                window, size, fresh = carried, kept, 0
+            window.append(unit)
+            size += unit[2]
+            fresh += 1
+        if fresh:
+            yield Span(window[0][0], window[-1][1], text[window[0][0]:window[-1][1]])
+
+    def spans(self, text: str) -> List[Span]:
+        return segment(text, self)
+
+
+_sentence_cache = LRUCache(max_entries=256)
+_span_cache = LRUCache(max_entries=128)
+
+
+def _text_key(text: str) -> str:
+    return hashlib.blake2b(text.encode(), digest_size=16).hexdigest()
+
+
+def sentences(text: str, key: Optional[str] = None) -> List[Tuple[int, int]]:
+    """Sentence offsets of text, computed once per distinct text"""
+    key = key or _text_key(text)
+    cached = _sentence_cache.get(key)
+    if cached is None:
+        cached = list(iter_sentences(text))
+        _sentence_cache.set(key, cached)
+    return cached
+
+
+def segment(text: str, segmenter: Segmenter) -> List[Span]:
+    """
+    Windows of text for a segmenter, cached per (segmenter, text).
+    The sentence pass is shared by all segmenters, so embedding, AI detection
+    and web search all cut the same document along the same boundaries.
+    """
+    if not text:
+        return []
+    key = _text_key(text)
+    span_key = f"{segmenter.name}:{segmenter.max_length}:{segmenter.overlap}:{key}"
+    cached = _span_cache.get(span_key)
+    if cached is None:
+        cached = list(segmenter.iter_spans(text, sentences(text, key)))
+        _span_cache.set(span_key, cached)
+    return cached
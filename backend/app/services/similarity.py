@@ -0,0 +1,212 @@
+import re
+import zlib
+from difflib import SequenceMatcher
+from typing import List, NamedTuple, Set, Tuple
+
+_WORD_RE = re.compile(r"\w+")
+
+
+def word_ngrams(text: str, n: int = 5) -> Set[int]:
+    """Hashed word n-grams of text, lowercased, for exact overlap checks"""
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < n:
+        return {zlib.crc32(" ".join(words).encode())} if words else set()
+    return {zlib.crc32(" ".join(words[i:i + n]).encode()) for i in range(len(words) - n + 1)}
+
+
+def ngram_containment(a: Set[int], b: Set[int]) -> float:
+    """Share of a's n-grams that also occur in b"""
+    if not a:
+        return 0.0
+    return len(a & b) / len(a)
+
+
+def ngram_jaccard(a: Set[int], b: Set[int]) -> float:
+    if not a and not b:
+        return 0.0
+    return len(a & b) / len(a | b)
+
+
+class SimilarityResult(NamedTuple):
+    """
+    ratio in [0, 1] and the matched regions as (a_start, a_end, b_start, b_end)
+    character offsets, in order of their position in b
+    """
+    ratio: float
+    spans: List[Tuple[int, int, int, int]]
+
+
+def _fold(text: str) -> str:
+    """Lowercase text when that keeps every character at its offset"""
+    lowered = text.lower()
+    return lowered if len(lowered) == len(text) else text
+
+
+class SimilarityEngine:
+    name = ""
+
+    def compare(self, a: str, b: str) -> SimilarityResult:
+        raise NotImplementedError
+
+
+class SequenceMatcherEngine(SimilarityEngine):
+    """difflib's Ratcliff/Obershelp matching; quadratic in the worst case"""
+    name = "sequence_matcher"
+
+    def compare(self, a: str, b: str) -> SimilarityResult:
+        matcher = SequenceMatcher(None, a, b)
+        spans = [(i, i + size, j, j + size) for i, j, size in matcher.get_matching_blocks() if size]
+        return SimilarityResult(matcher.ratio(), spans)
+
+
+class NgramEngine(SimilarityEngine):
+    """
+    Shared word n-grams, linear in the length of both texts. The ratio is
+    the overlap coefficient |A & B| / min(|A|, |B|), i.e. the containment of
+    the shorter text (typically a search snippet) in the longer one.
+    """
+    name = "ngram"
+
+    def __init__(self, n: int = 3):
+        self.n = n
+
+    def _grams(self, text: str):
+        words = [(m.start(), m.end(), m.group()) for m in _WORD_RE.finditer(_fold(text))]
+        return [
+            (" ".join(w[2] for w in words[i:i + self.n]), words[i][0], words[i + self.n - 1][1])
+            for i in range(len(words) - self.n + 1)
+        ]
+
+    def compare(self, a: str, b: str) -> SimilarityResult:
+        a_grams, b_grams = self._grams(a), self._grams(b)
+        if not a_grams or not b_grams:
+            return SimilarityResult(0.0, [])
+        first_in_a = {}
+        for gram, start, end in a_grams:
+            first_in_a.setdefault(gram, (start, end))
+
+        spans = []
+        for gram, b_start, b_end in b_grams:
+            hit = first_in_a.get(gram)
+            if hit is None:
+                continue
+            a_start, a_end = hit
+            # Consecutive shared grams that also continue in a extend the span
+            if spans and b_start <= spans[-1][3] and spans[-1][0] <= a_start <= spans[-1][1]:
+                last = spans[-1]
+                spans[-1] = (last[0], max(last[1], a_end), last[2], b_end)
+            else:
+                spans.append((a_start, a_end, b_start, b_end))
+
+        a_set, b_set = {g for g, _, _ in a_grams}, {g for g, _, _ in b_grams}
+        return SimilarityResult(len(a_set & b_set) / min(len(a_set), len(b_set)), spans)
+
+
+class _SuffixAutomaton:
+    """Suffix automaton of a string: O(len) states, built in linear time"""
+
+    def __init__(self, text: str):
+        self.next = [{}]
+        self.link = [-1]
+        self.length = [0]
+        self.end = [-1]  # end offset of the first occurrence of the state's strings
+        last = 0
+        for i, char in enumerate(text):
+            state = len(self.length)
+            self.next.append({})
+            self.link.append(0)
+            self.length.append(self.length[last] + 1)
+            self.end.append(i)
+            p = last
+            while p != -1 and char not in self.next[p]:
+                self.next[p][char] = state
+                p = self.link[p]
+            if p != -1:
+                q = self.next[p][char]
+                if self.length[p] + 1 == self.length[q]:
+                    self.link[state] = q
+                else:
+                    clone = len(self.length)
+                    self.next.append(dict(self.next[q]))
+                    self.link.append(self.link[q])
+                    self.length.append(self.length[p] + 1)
+                    self.end.append(self.end[q])
+                    while p != -1 and self.next[p].get(char) == q:
+                        self.next[p][char] = clone
+                        p = self.link[p]
+                    self.link[q] = clone
+                    self.link[state] = clone
+            last = state
+
+    def maximal_matches(self, text: str, min_length: int):
+        """
+        (a_start, a_end, b_start, b_end) of the substrings of text that occur
+        in the automaton's string and cannot be extended to the right, at
+        least min_length long, in one left-to-right pass over text
+        """
+        state, length = 0, 0
+        previous = None
+        for i, char in enumerate(text):
+            while state and char not in self.next[state]:
+                state = self.link[state]
+                length = self.length[state]
+            if char in self.next[state]:
+                state = self.next[state][char]
+                length += 1
+            else:
+                state, length = 0, 0
+            # The match ending at i - 1 was not extended by char
+            if previous is not None and length <= previous[0]:
+                yield previous[1]
+            previous = None
+            if length >= min_length:
+                a_end = self.end[state] + 1
+                previous = (length, (a_end - length, a_end, i + 1 - length, i + 1))
+        if previous is not None:
+            yield previous[1]
+
+
+class SuffixAutomatonEngine(SimilarityEngine):
+    """
+    Longest-common-substring alignment in linear time: a suffix automaton of
+    a is walked with b, yielding every maximal common substring of at least
+    min_length characters. Matches are kept left to right without
+    overlapping in b, and the ratio is 2 * matched / (len(a) + len(b)) like
+    SequenceMatcher.ratio().
+    """
+    name = "suffix_automaton"
+
+    def __init__(self, min_length: int = 12):
+        self.min_length = min_length
+
+    def compare(self, a: str, b: str) -> SimilarityResult:
+        if not a or not b:
+            return SimilarityResult(0.0, [])
+        # Building the automaton is the expensive part, so build it on the
+        # shorter text and walk the longer one
+        swapped = len(b) < len(a)
+        indexed, walked = (b, a) if swapped else (a, b)
+        automaton = _SuffixAutomaton(_fold(indexed))
+        spans = []
+        covered = 0
+        for i_start, i_end, w_start, w_end in automaton.maximal_matches(_fold(walked), self.min_length):
+            # Trim the part already covered by the previous match
+            skip = max(0, covered - w_start)
+            if w_end - w_start - skip < self.min_length:
+                continue
+            spans.append((i_start + skip, i_end, w_start + skip, w_end))
+            covered = w_end
+        matched = sum(w_end - w_start for _, _, w_start, w_end in spans)
+        if swapped:
+            spans = sorted(((a_start, a_end, b_start, b_end) for b_start, b_end, a_start, a_end in spans), key=lambda span: span[2])
+        return SimilarityResult(2 * matched / (len(a) + len(b)), spans)
+
+
+ENGINES = {engine.name: engine for engine in (SequenceMatcherEngine, NgramEngine, SuffixAutomatonEngine)}
+
+
+def get_similarity_engine(name: str) -> SimilarityEngine:
+    try:
+        return ENGINES[name.lower()]()
+    except KeyError:
+        raise ValueError(f"Unknown similarity engine '{name}', expected one of {sorted(ENGINES)}")
@@ -0,0 +1,330 @@
+import asyncio
+import hashlib
+import ipaddress
+import json
+import os
+import re
+import socket
+import time
+from html.parser import HTMLParser
+from typing import Dict, List, Optional
+
+import httpx
+
+from app.core.config import settings
+
+# Page furniture whose text is never the copied prose
+_SKIPPED_TAGS = {"script", "style", "noscript", "template", "svg", "nav", "header", "footer", "aside", "form"}
+_BLOCK_TAGS = {
+    "p", "div", "br", "li", "ul", "ol", "h1", "h2", "h3", "h4", "h5", "h6", "tr", "td", "th",
+    "section", "article", "blockquote", "pre", "table", "main", "dd", "dt",
+}
+# Redirects are followed by hand, so each hop is checked like the first URL
+MAX_REDIRECTS = 5
+_SPACE_RE = re.compile(r"[ \t\r\f\v]+")
+_BLANK_LINES_RE = re.compile(r"\n\s*\n+")
+
+
+class _TextExtractor(HTMLParser):
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.parts = []
+        self.skipping = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in _SKIPPED_TAGS:
+            self.skipping += 1
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n\n" if tag == "p" else "\n")
+
+    def handle_endtag(self, tag):
+        if tag in _SKIPPED_TAGS:
+            self.skipping = max(0, self.skipping - 1)
+        elif tag in _BLOCK_TAGS:
+            self.parts.append("\n")
+
+    def handle_data(self, data):
+        if not self.skipping:
+            self.parts.append(data)
+
+
+def html_to_text(html: str) -> str:
+    """Readable text of an HTML page, with scripts, styles and navigation dropped"""
+    parser = _TextExtractor()
+    parser.feed(html)
+    parser.close()
+    text = _SPACE_RE.sub(" ", "".join(parser.parts))
+    lines = "\n".join(line.strip() for line in text.split("\n"))
+    return _BLANK_LINES_RE.sub("\n\n", lines).strip()
+
+
+class BlockedURL(ValueError):
+    """A source URL that must not be fetched: not http(s), or pointing into a private network"""
+
+
+def _is_public(address: str) -> bool:
+    ip = ipaddress.ip_address(address.split("%")[0])
+    if getattr(ip, "ipv4_mapped", None):
+        ip = ip.ipv4_mapped
+    return not (ip.is_loopback or ip.is_private or ip.is_link_local or ip.is_reserved
+                or ip.is_multicast or ip.is_unspecified)
+
+
+def _is_ip(host: str) -> bool:
+    try:
+        ipaddress.ip_address(host.split("%")[0])
+    except ValueError:
+        return False
+    return True
+
+
+def _digest(data: str) -> str:
+    return hashlib.sha256(data.encode()).hexdigest()
+
+
+class SourceCache:
+    """
+    Extracted source texts on local disk. Texts are stored once under the
+    SHA-256 of their content (blobs/ab/abcd....txt), so mirrors and
+    redirects to the same page share a file; a small JSON entry per URL
+    (urls/<sha256 of url>.json) points at the blob and records when it was
+    fetched. Entries older than ttl seconds are misses, and are deleted by
+    prune(), which writes run at most once per prune_interval seconds
+    across all processes sharing the directory. Files are written to a
+    temporary name and renamed, so concurrent workers never read a
+    partial file.
+    """
+
+    def __init__(self, path: str, ttl: Optional[int] = None, prune_interval: Optional[float] = None):
+        self.path = path
+        self.ttl = ttl
+        self.prune_interval = prune_interval
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(os.path.join(path, "blobs"), exist_ok=True)
+        os.makedirs(os.path.join(path, "urls"), exist_ok=True)
+
+    def _blob_path(self, digest: str) -> str:
+        return os.path.join(self.path, "blobs", digest[:2], f"{digest}.txt")
+
+    def _entry_path(self, url: str) -> str:
+        return os.path.join(self.path, "urls", f"{_digest(url)}.json")
+
+    @staticmethod
+    def _write(path: str, data: str):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp = f"{path}.{os.getpid()}.tmp"
+        with open(tmp, "w", encoding="utf-8") as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+    def _expired(self, entry: dict, now: float) -> bool:
+        return bool(self.ttl) and now - entry["fetched_at"] > self.ttl
+
+    def get(self, url: str) -> Optional[str]:
+        try:
+            with open(self._entry_path(url), encoding="utf-8") as f:
+                entry = json.load(f)
+            if self._expired(entry, time.time()):
+                raise FileNotFoundError
+            with open(self._blob_path(entry["digest"]), encoding="utf-8") as f:
+                text = f.read()
+        except (OSError, ValueError, KeyError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return text
+
+    def set(self, url: str, text: str):
+        digest = _digest(text)
+        blob = self._blob_path(digest)
+        if not os.path.exists(blob):
+            self._write(blob, text)
+        self._write(self._entry_path(url), json.dumps({"url": url, "digest": digest, "fetched_at": time.time()}))
+        self._maybe_prune()
+
+    def _maybe_prune(self):
+        if not self.ttl or not self.prune_interval:
+            return
+        marker = os.path.join(self.path, ".pruned")
+        now = time.time()
+        try:
+            if now - os.path.getmtime(marker) < self.prune_interval:
+                return
+        except OSError:
+            pass
+        # Touch first, so other workers writing at the same moment skip this round
+        with open(marker, "w"):
+            pass
+        removed = self.prune()
+        if removed:
+            print(f"Pruned {removed} expired files from the source cache")
+
+    def prune(self) -> int:
+        """Drop expired URL entries and the blobs no entry points at; returns files removed"""
+        now = time.time()
+        live = set()
+        removed = 0
+        urls_dir = os.path.join(self.path, "urls")
+        for name in os.listdir(urls_dir):
+            path = os.path.join(urls_dir, name)
+            try:
+                with open(path, encoding="utf-8") as f:
+                    entry = json.load(f)
+            except (OSError, ValueError):
+                continue
+            if self._expired(entry, now):
+                try:
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed += 1
+            else:
+                live.add(entry["digest"])
+        blobs_dir = os.path.join(self.path, "blobs")
+        for shard in os.listdir(blobs_dir):
+            for name in os.listdir(os.path.join(blobs_dir, shard)):
+                path = os.path.join(blobs_dir, shard, name)
+                if not name.endswith(".txt") or name[:-4] in live:
+                    continue
+                try:
+                    # A blob written just now may be waiting for its URL entry
+                    if now - os.path.getmtime(path) < 60:
+                        continue
+                    os.remove(path)
+                except OSError:
+                    continue
+                removed += 1
+        return removed
+
+    def stats(self) -> dict:
+        lookups = self.hits + self.misses
+        return {"hits": self.hits, "misses": self.misses, "hit_rate": self.hits / lookups if lookups else 0.0}
+
+
+class SourceFetcher:
+    """
+    Downloads candidate source pages for full-text verification. Like
+    SearchClient it keeps one pooled httpx.AsyncClient per event loop and
+    bounds the fetches in flight; extracted texts go through a SourceCache,
+    so popular sources are downloaded once per TTL rather than once per scan.
+    Source URLs come from search results, so only http(s) URLs whose host
+    resolves to public addresses are fetched, at every redirect hop;
+    allow_private lifts the address check for tests and intranet sources.
+    """
+
+    def __init__(self, cache: Optional[SourceCache] = None, concurrency: int = None,
+                 request_timeout: float = None, max_bytes: int = None, transport=None,
+                 allow_private: bool = False):
+        self.cache = cache
+        self.allow_private = allow_private
+        self.concurrency = concurrency or settings.SOURCE_FETCH_CONCURRENCY
+        self.request_timeout = request_timeout or settings.SOURCE_FETCH_TIMEOUT
+        self.max_bytes = max_bytes or settings.SOURCE_FETCH_MAX_BYTES
+        self._transport = transport
+        self._client = None
+        self._semaphore = None
+        self._loop = None
+
+    def _ensure_client(self):
+        # Clients and semaphores belong to the loop they were created on
+        loop = asyncio.get_running_loop()
+        if self._client is None or self._loop is not loop:
+            self._loop = loop
+            self._semaphore = asyncio.Semaphore(self.concurrency)
+            self._client = httpx.AsyncClient(
+                timeout=self.request_timeout,
+                follow_redirects=False,
+                headers={"User-Agent": "plagiarism-checker/1.0 (source verification)"},
+                limits=httpx.Limits(max_connections=self.concurrency, max_keepalive_connections=self.concurrency),
+                transport=self._transport,
+            )
+        return self._client
+
+    async def _check_url(self, url: httpx.URL):
+        """Raise BlockedURL unless url is http(s) on a host with only public addresses"""
+        if url.scheme not in ("http", "https") or not url.host:
+            raise BlockedURL(f"refusing to fetch {url}")
+        if self.allow_private:
+            return
+        try:
+            addresses = [url.host] if _is_ip(url.host) else [
+                info[4][0] for info in await asyncio.get_running_loop().getaddrinfo(
+                    url.host, url.port or (443 if url.scheme == "https" else 80), type=socket.SOCK_STREAM
+                )
+            ]
+        except socket.gaierror as e:
+            raise BlockedURL(f"cannot resolve {url.host}: {e}") from e
+        if not addresses or not all(_is_public(address) for address in addresses):
+            raise BlockedURL(f"refusing to fetch {url}: {url.host} is not a public address")
+
+    async def _download(self, url: str) -> str:
+        client = self._ensure_client()
+        target = httpx.URL(url)
+        async with self._semaphore:
+            for _ in range(MAX_REDIRECTS + 1):
+                await self._check_url(target)
+                async with client.stream("GET", target) as resp:
+                    if resp.is_redirect:
+                        target = resp.url.join(resp.headers["location"])
+                        continue
+                    resp.raise_for_status()
+                    content_type = resp.headers.get("content-type", "text/html").lower()
+                    if not content_type.startswith(("text/html", "text/plain", "application/xhtml")):
+                        raise ValueError(f"unsupported content type {content_type!r}")
+                    body = bytearray()
+                    # Pages past max_bytes are truncated rather than read whole
+                    async for data in resp.aiter_bytes():
+                        body.extend(data)
+                        if len(body) >= self.max_bytes:
+                            break
+                    raw = bytes(body[:self.max_bytes]).decode(resp.encoding or "utf-8", errors="replace")
+                return raw if content_type.startswith("text/plain") else html_to_text(raw)
+        raise BlockedURL(f"more than {MAX_REDIRECTS} redirects from {url}")
+
+    async def fetch(self, url: str) -> str:
+        """Extracted text of url, from the cache when fresh; raises on HTTP errors and after request_timeout"""
+        if self.cache is not None:
+            cached = await asyncio.to_thread(self.cache.get, url)
+            if cached is not None:
+                return cached
+        # httpx timeouts apply per phase; this bounds the whole download
+        text = await asyncio.wait_for(self._download(url), self.request_timeout)
+        if self.cache is not None:
+            await asyncio.to_thread(self.cache.set, url, text)
+        return text
+
+    async def fetch_many(self, urls: List[str], deadline: float = None) -> Dict[str, Optional[str]]:
+        """
+        Fetch all distinct urls concurrently. Returns {url: text}, with None
+        for pages that failed or were still downloading at the deadline.
+        """
+        deadline = deadline or settings.SOURCE_FETCH_SCAN_TIMEOUT
+        tasks = {url: asyncio.create_task(self.fetch(url)) for url in dict.fromkeys(urls)}
+        if not tasks:
+            return {}
+        _, pending = await asyncio.wait(tasks.values(), timeout=deadline)
+        for task in pending:
+            task.cancel()
+        if pending:
+            await asyncio.gather(*pending, return_exceptions=True)
+            print(f"{len(pending)} of {len(tasks)} source fetches missed the {deadline}s deadline")
+
+        texts = {}
+        for url, task in tasks.items():
+            if task in pending:
+                texts[url] = None
+            elif task.exception() is not None:
+                print(f"Error fetching source {url}: {task.exception()!r}")
+                texts[url] = None
+            else:
+                texts[url] = task.result()
+        return texts
+
+    def stats(self) -> Optional[dict]:
+        return self.cache.stats() if self.cache is not None else None
+
+    async def aclose(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
@@ -0,0 +1,318 @@
+import asyncio
+import fcntl
+import json
+import os
+import uuid
+from contextlib import contextmanager
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from app.core.config import settings
+
+# Files of a LocalVectorStore directory
+META_FILE = "meta.json"
+VECTORS_FILE = "vectors.f32"  # row-major little-endian float32, dim values per row
+IDS_FILE = "ids.bin"  # 16-byte UUID per row; its length defines the row count
+DELETED_FILE = "deleted.bin"  # one byte per row, 1 = tombstoned
+IVF_FILE = "ivf.npz"
+LOCK_FILE = "write.lock"
+
+
+def normalize(matrix):
+    matrix = np.asarray(matrix, dtype=np.float32)
+    norms = np.linalg.norm(matrix, axis=-1, keepdims=True)
+    return matrix / np.maximum(norms, 1e-12)
+
+
+class VectorStore:
+    """
+    Document vectors searchable by cosine similarity.
+    search_many returns one list of (document_id, similarity) tuples per
+    query vector, best first. Stores that cannot evaluate a SearchScope
+    themselves set filters_scope = False and the caller post-filters.
+    """
+
+    filters_scope = False
+
+    async def search_many(self, vectors, limit, exclude_ids=(), scope=None, budget_ms=None) -> List[List[Tuple[uuid.UUID, float]]]:
+        raise NotImplementedError
+
+    async def upsert(self, ids: Sequence[uuid.UUID], vectors):
+        raise NotImplementedError
+
+    async def delete(self, ids: Sequence[uuid.UUID]):
+        raise NotImplementedError
+
+
+def _merge_top(best_sims, best_rows, sims, rows, k):
+    """Keep the k best (similarity, row) pairs per query out of two candidate sets"""
+    sims = np.concatenate([best_sims, sims], axis=1)
+    rows = np.concatenate([best_rows, rows], axis=1)
+    if sims.shape[1] > k:
+        top = np.argpartition(-sims, k - 1, axis=1)[:, :k]
+        sims = np.take_along_axis(sims, top, axis=1)
+        rows = np.take_along_axis(rows, top, axis=1)
+    return sims, rows
+
+
+class LocalVectorStore(VectorStore):
+    """
+    Vectors in flat files on local disk, searched with NumPy.
+    Vectors are L2-normalised on the way in, so cosine similarity is a dot
+    product. The files are only ever appended to (deletions set a tombstone
+    byte), so every process can memory-map them read-only and share one copy
+    through the page cache; writers serialise on an flock.
+
+    Search is exact (blockwise matrix products over every row) or
+    approximate through an IVF index trained with train_ivf: each query only
+    scans the rows of its nearest probes lists, plus rows appended since the
+    index was trained.
+    """
+
+    def __init__(self, path: str, dim: int = 384, block_size: Optional[int] = None,
+                 search: Optional[str] = None, probes: Optional[int] = None):
+        self.path = path
+        self.block_size = block_size or settings.VECTOR_STORE_BLOCK
+        self.search_mode = (search or settings.VECTOR_STORE_SEARCH).lower()
+        self.probes = probes or settings.VECTOR_STORE_IVF_PROBES
+        os.makedirs(path, exist_ok=True)
+
+        meta_path = self._file(META_FILE)
+        if os.path.exists(meta_path):
+            with open(meta_path) as f:
+                self.dim = json.load(f)["dim"]
+            if self.dim != dim:
+                raise ValueError(f"Vector store at {path} holds {self.dim}-dim vectors, not {dim}")
+        else:
+            self.dim = dim
+            with self._locked():
+                with open(meta_path, "w") as f:
+                    json.dump({"dim": dim}, f)
+                for name in (VECTORS_FILE, IDS_FILE, DELETED_FILE):
+                    open(self._file(name), "ab").close()
+
+        self.rows = 0
+        self.vectors = np.zeros((0, self.dim), dtype=np.float32)
+        self.ids = np.zeros(0, dtype="S16")
+        self.deleted = np.zeros(0, dtype=np.uint8)
+        self.ivf = None
+        self._ivf_mtime = None
+        self.refresh()
+
+    def _file(self, name: str) -> str:
+        return os.path.join(self.path, name)
+
+    @contextmanager
+    def _locked(self):
+        with open(self._file(LOCK_FILE), "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(lock, fcntl.LOCK_UN)
+
+    def _row_count(self) -> int:
+        return os.path.getsize(self._file(IDS_FILE)) // 16
+
+    def refresh(self):
+        """Re-map the files if another process appended rows or retrained the IVF index"""
+        rows = self._row_count()
+        if rows != self.rows:
+            self.rows = rows
+            if rows:
+                self.vectors = np.memmap(self._file(VECTORS_FILE), dtype="<f4", mode="r", shape=(rows, self.dim))
+                self.ids = np.memmap(self._file(IDS_FILE), dtype="S16", mode="r", shape=(rows,))
+                self.deleted = np.memmap(self._file(DELETED_FILE), dtype=np.uint8, mode="r", shape=(rows,))
+
+        ivf_path = self._file(IVF_FILE)
+        mtime = os.path.getmtime(ivf_path) if os.path.exists(ivf_path) else None
+        if mtime != self._ivf_mtime:
+            self._ivf_mtime = mtime
+            self.ivf = dict(np.load(ivf_path)) if mtime is not None else None
+
+    def __len__(self):
+        self.refresh()
+        return int(self.rows - self.deleted.sum()) if self.rows else 0
+
+    # Writes
+
+    def _delete_locked(self, keys: np.ndarray):
+        rows = self._row_count()
+        if not rows or not len(keys):
+            return
+        ids = np.memmap(self._file(IDS_FILE), dtype="S16", mode="r", shape=(rows,))
+        hits = np.nonzero(np.isin(ids, keys))[0]
+        if len(hits):
+            deleted = np.memmap(self._file(DELETED_FILE), dtype=np.uint8, mode="r+", shape=(rows,))
+            deleted[hits] = 1
+            deleted.flush()
+
+    def add(self, ids: Sequence[uuid.UUID], vectors):
+        """Append vectors, tombstoning any earlier rows of the same ids"""
+        vectors = normalize(vectors).astype("<f4", copy=False).reshape(-1, self.dim)
+        if len(ids) != len(vectors):
+            raise ValueError("ids and vectors must have the same length")
+        if not len(ids):
+            return
+        keys = np.array([i.bytes for i in ids], dtype="S16")
+        with self._locked():
+            self._delete_locked(keys)
+            rows = self._row_count()
+            # Drop the tail of a write that died before its ids were appended
+            os.truncate(self._file(VECTORS_FILE), rows * self.dim * 4)
+            os.truncate(self._file(DELETED_FILE), rows)
+            # ids last: a row exists once its id is written
+            for name, data in ((VECTORS_FILE, vectors.tobytes()), (DELETED_FILE, bytes(len(ids))), (IDS_FILE, keys.tobytes())):
+                with open(self._file(name), "ab") as f:
+                    f.write(data)
+                    f.flush()
+                    os.fsync(f.fileno())
+        self.refresh()
+
+    def remove(self, ids: Sequence[uuid.UUID]):
+        with self._locked():
+            self._delete_locked(np.array([i.bytes for i in ids], dtype="S16"))
+
+    # Search
+
+    def _exact(self, queries: np.ndarray, k: int):
+        best_sims = np.zeros((len(queries), 0), dtype=np.float32)
+        best_rows = np.zeros((len(queries), 0), dtype=np.int64)
+        for start in range(0, self.rows, self.block_size):
+            end = min(start + self.block_size, self.rows)
+            sims = queries @ self.vectors[start:end].T
+            sims[:, self.deleted[start:end] != 0] = -np.inf
+            rows = np.broadcast_to(np.arange(start, end), sims.shape)
+            best_sims, best_rows = _merge_top(best_sims, best_rows, sims, rows, k)
+        return best_sims, best_rows
+
+    def _approximate(self, queries: np.ndarray, k: int):
+        ivf = self.ivf
+        probes = min(self.probes, len(ivf["centroids"]))
+        nearest_lists = np.argpartition(-(queries @ ivf["centroids"].T), probes - 1, axis=1)[:, :probes]
+        # Rows appended after training are not in any list and always scanned
+        tail = np.arange(int(ivf["rows"]), self.rows)
+        best_sims = np.full((len(queries), k), -np.inf, dtype=np.float32)
+        best_rows = np.zeros((len(queries), k), dtype=np.int64)
+        offsets, order = ivf["offsets"], ivf["order"]
+        for q, lists in enumerate(nearest_lists):
+            rows = np.concatenate([order[offsets[n]:offsets[n + 1]] for n in lists] + [tail])
+            rows.sort()  # sequential reads from the memmap
+            sims = self.vectors[rows] @ queries[q]
+            sims[self.deleted[rows] != 0] = -np.inf
+            if len(sims) > k:
+                top = np.argpartition(-sims, k - 1)[:k]
+                sims, rows = sims[top], rows[top]
+            best_sims[q, :len(sims)] = sims
+            best_rows[q, :len(rows)] = rows
+        return best_sims, best_rows
+
+    def search(self, vectors, limit: int, exclude_ids=()) -> List[List[Tuple[uuid.UUID, float]]]:
+        self.refresh()
+        queries = normalize(vectors).reshape(-1, self.dim)
+        if not self.rows or not len(queries):
+            return [[] for _ in queries]
+
+        exclude = {i.bytes for i in exclude_ids}
+        k = min(limit + len(exclude), self.rows)
+        if self.search_mode == "ivf" and self.ivf is not None:
+            sims, rows = self._approximate(queries, k)
+        else:
+            sims, rows = self._exact(queries, k)
+
+        results = []
+        for query_sims, query_rows in zip(sims, rows):
+            hits = []
+            for i in np.argsort(-query_sims):
+                if len(hits) == limit or query_sims[i] == -np.inf:
+                    break
+                # NumPy drops trailing NUL bytes of "S" values; restore them
+                key = bytes(self.ids[query_rows[i]]).ljust(16, b"\0")
+                if key not in exclude:
+                    hits.append((uuid.UUID(bytes=key), float(query_sims[i])))
+            results.append(hits)
+        return results
+
+    def train_ivf(self, n_lists: Optional[int] = None, sample_size: int = 100_000, iterations: int = 10, seed: int = 0):
+        """
+        Train the IVF index: spherical k-means on a sample of live rows, then
+        every row is assigned to its nearest centroid. Written atomically,
+        so searching processes pick it up on their next refresh.
+        """
+        self.refresh()
+        live = np.nonzero(self.deleted == 0)[0] if self.rows else np.zeros(0, dtype=np.int64)
+        if not len(live):
+            return None
+        n_lists = n_lists or settings.VECTOR_STORE_IVF_LISTS or max(1, int(4 * np.sqrt(len(live))))
+        n_lists = min(n_lists, len(live))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(live, min(sample_size, len(live)), replace=False))
+        data = np.asarray(self.vectors[sample])
+        centroids = data[rng.choice(len(data), n_lists, replace=False)].copy()
+
+        for _ in range(iterations):
+            assign = (data @ centroids.T).argmax(axis=1)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, assign, data)
+            counts = np.bincount(assign, minlength=n_lists)
+            # Empty lists keep their previous centroid
+            centroids[counts > 0] = normalize(sums[counts > 0])
+
+        rows = self.rows
+        assign = np.empty(rows, dtype=np.int64)
+        for start in range(0, rows, self.block_size):
+            end = min(start + self.block_size, rows)
+            assign[start:end] = (self.vectors[start:end] @ centroids.T).argmax(axis=1)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.searchsorted(assign[order], np.arange(n_lists + 1))
+
+        tmp = self._file(IVF_FILE + ".tmp.npz")
+        np.savez(tmp, centroids=centroids, order=order, offsets=offsets, rows=np.int64(rows))
+        os.replace(tmp, self._file(IVF_FILE))
+        self.refresh()
+        return {"lists": n_lists, "rows": rows, "sampled": len(sample)}
+
+    # VectorStore interface; NumPy releases the GIL, so searches run in a thread
+
+    async def search_many(self, vectors, limit, exclude_ids=(), scope=None, budget_ms=None):
+        return await asyncio.to_thread(self.search, vectors, limit, exclude_ids)
+
+    async def upsert(self, ids, vectors):
+        await asyncio.to_thread(self.add, ids, vectors)
+
+    async def delete(self, ids):
+        await asyncio.to_thread(self.remove, ids)
+
+
+async def _import_from_postgres(store: LocalVectorStore, chunk_size: int = 10_000):
+    """Copy every document embedding from Postgres into store"""
+    from sqlalchemy import select
+    from sqlalchemy.ext.asyncio import create_async_engine
+    from app.models import Document
+
+    engine = create_async_engine(settings.DATABASE_URL)
+    imported = 0
+    async with engine.connect() as conn:
+        result = await conn.stream(
+            select(Document.id, Document.embedding).where(Document.embedding.isnot(None)).execution_options(yield_per=chunk_size)
+        )
+        async for rows in result.partitions(chunk_size):
+            store.add([row.id for row in rows], np.stack([np.asarray(row.embedding) for row in rows]))
+            imported += len(rows)
+    await engine.dispose()
+    return imported
+
+
+if __name__ == "__main__":
+    import sys
+
+    commands = ("import", "train-ivf")
+    if len(sys.argv) != 2 or sys.argv[1] not in commands:
+        print("usage: python -m app.services.vector_store import|train-ivf")
+        sys.exit(1)
+    store = LocalVectorStore(settings.VECTOR_STORE_PATH)
+    if sys.argv[1] == "import":
+        print(f"Imported {asyncio.run(_import_from_postgres(store))} vectors into {store.path}")
+    else:
+        print(store.train_ivf())
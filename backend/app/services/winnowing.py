@@ -0,0 +1,87 @@
+from typing import Dict, List, NamedTuple
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from app.core.config import settings
+
+# Base of the polynomial rolling hash over character codes (mod 2**64)
+_BASE = np.uint64(1_000_003)
+
+
+class Fingerprints(NamedTuple):
+    """Winnowed k-gram hashes of a text with the character span each covers"""
+    hashes: np.ndarray  # int32, signed view of the top 32 bits of the k-gram hash
+    starts: np.ndarray  # offsets into the original text
+    ends: np.ndarray
+
+
+def _normalize(text: str):
+    """Lowercased alphanumeric characters of text and the offset of each in text"""
+    positions = [i for i, c in enumerate(text) if c.isalnum()]
+    normalized = "".join(text[i].lower()[0] for i in positions)
+    return normalized, np.asarray(positions, dtype=np.int64)
+
+
+def fingerprints(text: str, k: int = None, window: int = None) -> Fingerprints:
+    """
+    MOSS-style winnowing (Schleimer, Wilkerson and Aiken): hash every k-gram
+    of the text with whitespace, punctuation and case removed, then keep the
+    minimum hash of every run of `window` consecutive k-grams (the rightmost
+    one on ties). Any copied stretch of at least window + k - 1 normalised
+    characters shares at least one fingerprint with its source.
+    """
+    k = k or settings.WINNOW_K
+    window = window or settings.WINNOW_WINDOW
+    normalized, positions = _normalize(text)
+    empty = np.zeros(0, dtype=np.int64)
+    if len(normalized) < k:
+        return Fingerprints(np.zeros(0, dtype=np.int32), empty, empty)
+
+    codes = np.frombuffer(normalized.encode("utf-32-le"), dtype="<u4").astype(np.uint64)
+    count = len(codes) - k + 1
+    hashes = np.zeros(count, dtype=np.uint64)
+    for j in range(k):
+        hashes = hashes * _BASE + codes[j:j + count]
+    hashes = (hashes >> np.uint64(32)).astype(np.uint32)
+
+    if count <= window:
+        selected = np.array([count - 1 - int(np.argmin(hashes[::-1]))])
+    else:
+        windows = sliding_window_view(hashes, window)
+        selected = np.arange(len(windows)) + (window - 1 - np.argmin(windows[:, ::-1], axis=1))
+        # Neighbouring windows usually pick the same k-gram
+        selected = selected[np.r_[True, selected[1:] != selected[:-1]]]
+
+    return Fingerprints(
+        hashes[selected].view(np.int32),
+        positions[selected],
+        positions[selected + k - 1] + 1,
+    )
+
+
+def merge_regions(matches, gap: int = None, limit: int = None) -> List[Dict]:
+    """
+    Merge shared fingerprints into copied regions. matches holds
+    (source_start, source_end, match_start, match_end) tuples; consecutive
+    ones that advance together in both documents (within gap characters)
+    form one region. Returns up to limit regions, longest first, as
+    {"source": [start, end], "match": [start, end], "fingerprints": n}.
+    """
+    gap = settings.WINNOW_REGION_GAP if gap is None else gap
+    limit = limit or settings.WINNOW_MAX_REGIONS
+    regions = []
+    for s_start, s_end, m_start, m_end in sorted(matches):
+        if regions:
+            last = regions[-1]
+            if (
+                s_start <= last["source"][1] + gap
+                and last["match"][0] <= m_start <= last["match"][1] + gap
+            ):
+                last["source"][1] = max(last["source"][1], s_end)
+                last["match"][1] = max(last["match"][1], m_end)
+                last["fingerprints"] += 1
+                continue
+        regions.append({"source": [s_start, s_end], "match": [m_start, m_end], "fingerprints": 1})
+    regions.sort(key=lambda r: r["source"][1] - r["source"][0], reverse=True)
+    return regions[:limit]
@@ -0,0 +1,119 @@
+"""
+Compare embedding backends on CPU: throughput, resident memory per worker and
+cosine agreement with the fp32 torch model.
+
+    cd backend && python -m benchmarks.embedding_backends [--texts corpus.txt] [--backends torch int8 onnx]
+
+Each backend runs in its own subprocess so memory numbers are not polluted by
+models loaded earlier. The ONNX backend needs an export first:
+`python -m app.services.embedding_backends export models/all-MiniLM-L6-v2-onnx`.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+
+
+def rss_mb():
+    with open("/proc/self/status") as f:
+        for line in f:
+            if line.startswith("VmRSS:"):
+                return int(line.split()[1]) / 1024
+    return 0.0
+
+
+def sample_texts(path, count):
+    if path:
+        with open(path) as f:
+            texts = [line.strip() for line in f if line.strip()]
+    else:
+        base = (
+            "Academic integrity requires that students acknowledge every source they use. "
+            "Paraphrasing without citation is still plagiarism even when the wording changes. "
+            "Large language models can produce fluent essays on almost any topic in seconds. "
+        )
+        texts = [f"{base[i % 97:]} Essay number {i}." for i in range(count)]
+    return texts[:count]
+
+
+def run_backend(backend, texts_path, count, output):
+    """Child process: load one backend, embed the sample, write stats and vectors"""
+    import numpy as np
+    from app.services.embedding_backends import load_embedding_model
+
+    texts = sample_texts(texts_path, count)
+    before = rss_mb()
+    started = time.perf_counter()
+    model = load_embedding_model(MODEL_NAME, backend)
+    if model is None:
+        json.dump({"backend": backend, "error": "unavailable"}, open(output + ".json", "w"))
+        return
+    load_seconds = time.perf_counter() - started
+
+    model.encode(texts[:8], batch_size=8)  # warm-up
+    started = time.perf_counter()
+    vectors = np.asarray(model.encode(texts, batch_size=64), dtype=np.float32)
+    encode_seconds = time.perf_counter() - started
+
+    np.save(output + ".npy", vectors)
+    json.dump({
+        "backend": backend,
+        "load_seconds": round(load_seconds, 2),
+        "texts_per_second": round(len(texts) / encode_seconds, 1),
+        "rss_model_mb": round(rss_mb() - before, 1),
+        "rss_total_mb": round(rss_mb(), 1),
+    }, open(output + ".json", "w"))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=["torch", "int8", "onnx"])
+    parser.add_argument("--texts", help="file with one text per line (default: synthetic essays)")
+    parser.add_argument("--count", type=int, default=2000)
+    parser.add_argument("--child", help=argparse.SUPPRESS)
+    parser.add_argument("--output", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        run_backend(args.child, args.texts, args.count, args.output)
+        return
+
+    import numpy as np
+    from app.services.embedding_backends import cosine_agreement
+
+    workdir = tempfile.mkdtemp()
+    results = []
+    reference = None
+    backends = ["torch"] + [b for b in args.backends if b != "torch"]
+    for backend in backends:
+        output = os.path.join(workdir, backend)
+        command = [sys.executable, "-m", "benchmarks.embedding_backends", "--child", backend,
+                   "--count", str(args.count), "--output", output]
+        if args.texts:
+            command += ["--texts", args.texts]
+        subprocess.run(command, check=True)
+        result = json.load(open(output + ".json"))
+        if "error" not in result:
+            vectors = np.load(output + ".npy")
+            if reference is None:
+                reference = vectors
+            result["agreement_with_fp32"] = cosine_agreement(reference, vectors)
+        results.append(result)
+
+    print(f"{'backend':<8} {'texts/s':>9} {'model MB':>9} {'total MB':>9} {'mean cos':>9} {'min cos':>9}")
+    for r in results:
+        if "error" in r:
+            print(f"{r['backend']:<8} {r['error']}")
+            continue
+        agreement = r["agreement_with_fp32"]
+        print(f"{r['backend']:<8} {r['texts_per_second']:>9} {r['rss_model_mb']:>9} {r['rss_total_mb']:>9} "
+              f"{agreement['mean']:>9.4f} {agreement['min']:>9.4f}")
+
+
+if __name__ == "__main__":
+    main()
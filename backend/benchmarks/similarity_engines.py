@@ -0,0 +1,75 @@
+"""
+Speed and agreement of the PlagiarismService similarity engines on
+chunk/snippet pairs shaped like a /check-plagiarism call: 150-word chunks
+against ~40-word search result snippets, some copied (lightly edited) from
+the chunk and some unrelated.
+
+    cd backend && python -m benchmarks.similarity_engines [--texts corpus.txt] [--pairs 300]
+
+Reports mean and p95 time per comparison, plus each engine's mean ratio on
+copied and unrelated snippets so the threshold separation can be compared.
+"""
+import argparse
+import random
+import statistics
+import time
+
+from app.services.similarity import ENGINES
+
+WORDS = (
+    "the of and to in is that for it as was with be by on not he this are or his from at which but have an they "
+    "you were her she there one all we can their has been if more when will would who so no research students "
+    "analysis evidence theory results method data significant however therefore although climate economic social "
+    "policy development history language culture system process model study approach learning university"
+).split()
+
+
+def _chunks(path, count, rng):
+    if path:
+        with open(path) as f:
+            words = f.read().split()
+        starts = [rng.randrange(0, max(1, len(words) - 150)) for _ in range(count)]
+        return [" ".join(words[s:s + 150]) for s in starts]
+    return [" ".join(rng.choice(WORDS) for _ in range(150)) for _ in range(count)]
+
+
+def _snippet(chunk, rng, copied):
+    words = chunk.split()
+    if not copied:
+        return " ".join(rng.choice(WORDS) for _ in range(40))
+    start = rng.randrange(0, max(1, len(words) - 40))
+    snippet = words[start:start + 40]
+    for _ in range(3):  # light edits, as search engines and paraphrasers make
+        snippet[rng.randrange(len(snippet))] = rng.choice(WORDS)
+    return "... " + " ".join(snippet) + " ..."
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--texts", help="plain-text corpus to cut chunks from (default: synthetic)")
+    parser.add_argument("--pairs", type=int, default=300)
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+    chunks = _chunks(args.texts, args.pairs, rng)
+    pairs = [(chunk, _snippet(chunk, rng, copied=i % 2 == 0), i % 2 == 0) for i, chunk in enumerate(chunks)]
+
+    print(f"{len(pairs)} pairs, chunk ~{statistics.mean(len(c) for c, _, _ in pairs):.0f} chars, "
+          f"snippet ~{statistics.mean(len(s) for _, s, _ in pairs):.0f} chars")
+    print(f"{'engine':<18} {'mean':>9} {'p95':>9} {'copied':>8} {'unrelated':>10}")
+    for name, engine_class in ENGINES.items():
+        engine = engine_class()
+        timings, copied, unrelated = [], [], []
+        for chunk, snippet, is_copy in pairs:
+            started = time.perf_counter()
+            result = engine.compare(chunk, snippet)
+            timings.append((time.perf_counter() - started) * 1e6)
+            (copied if is_copy else unrelated).append(result.ratio)
+        timings.sort()
+        print(f"{name:<18} {statistics.mean(timings):7.0f}us {timings[int(0.95 * (len(timings) - 1))]:7.0f}us "
+              f"{statistics.mean(copied):8.3f} {statistics.mean(unrelated):10.3f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Recall vs latency of the documents.embedding ANN index against exact search.
+
+    cd backend && python -m benchmarks.vector_index_recall [--queries 200] [--k 10]
+
+Uses stored document embeddings as queries. Exact top-k comes from a
+sequential scan (index scans disabled); the ANN run is repeated for each
+ef_search (HNSW) or probes (IVFFlat) value so the trade-off can be read off
+one table. Run it against a copy of production data, not an empty database.
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+from sqlalchemy import func, select, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from app.core.config import settings
+from app.models import Document
+
+
+def _query(embedding, k):
+    distance = Document.embedding.cosine_distance(embedding)
+    return select(Document.id).where(Document.embedding.isnot(None)).order_by(distance).limit(k)
+
+
+async def _timed_ids(conn, setup, query):
+    async with conn.begin():
+        for statement in setup:
+            await conn.execute(text(statement))
+        started = time.perf_counter()
+        ids = (await conn.execute(query)).scalars().all()
+        return ids, (time.perf_counter() - started) * 1000
+
+
+def _percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(round(p / 100 * (len(values) - 1))))]
+
+
+async def main(queries, k, sweep):
+    engine = create_async_engine(settings.DATABASE_URL)
+    index_type = settings.VECTOR_INDEX_TYPE.lower()
+    knob = "ivfflat.probes" if index_type == "ivfflat" else "hnsw.ef_search"
+
+    async with engine.connect() as conn:
+        total = (await conn.execute(select(func.count()).where(Document.embedding.isnot(None)))).scalar()
+        samples = (await conn.execute(
+            select(Document.embedding).where(Document.embedding.isnot(None)).order_by(func.random()).limit(queries)
+        )).scalars().all()
+        print(f"{total} embedded documents, {len(samples)} queries, k={k}, index={index_type}")
+
+        exact = []
+        exact_latency = []
+        for embedding in samples:
+            ids, ms = await _timed_ids(conn, ["SET LOCAL enable_indexscan = off"], _query(embedding, k))
+            exact.append(set(ids))
+            exact_latency.append(ms)
+        print(f"{'exact':<22} recall@{k} 1.0000  p50 {_percentile(exact_latency, 50):8.2f}ms  p95 {_percentile(exact_latency, 95):8.2f}ms")
+
+        for value in sweep:
+            recalls = []
+            latency = []
+            for embedding, expected in zip(samples, exact):
+                ids, ms = await _timed_ids(conn, [f"SET LOCAL {knob} = {int(value)}"], _query(embedding, k))
+                recalls.append(len(expected & set(ids)) / max(len(expected), 1))
+                latency.append(ms)
+            print(f"{knob + '=' + str(value):<22} recall@{k} {statistics.mean(recalls):.4f}  "
+                  f"p50 {_percentile(latency, 50):8.2f}ms  p95 {_percentile(latency, 95):8.2f}ms")
+
+    await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--sweep", type=int, nargs="+", default=None,
+                        help="ef_search or probes values (default depends on index type)")
+    args = parser.parse_args()
+    default_sweep = [1, 5, 10, 20, 50] if settings.VECTOR_INDEX_TYPE.lower() == "ivfflat" else [10, 20, 40, 80, 160, 320]
+    asyncio.run(main(args.queries, args.k, args.sweep or default_sweep))
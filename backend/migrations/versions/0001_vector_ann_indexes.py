@@ -0,0 +1,58 @@
+"""vector ANN indexes on documents.embedding and embeddings.vector
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from app.models.indexes import vector_index
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, Sequence[str], None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, vector column); the index type and its build parameters
+# (m/ef_construction or lists) come from Settings at migration time
+INDEXES = [
+    ("ix_documents_embedding_ann", "documents", "embedding"),
+    ("ix_embeddings_vector_ann", "embeddings", "vector"),
+]
+
+
+def _has_table(table: str) -> bool:
+    # Tables are created by the app at startup; offline (--sql) runs assume they exist
+    if op.get_context().as_sql:
+        return True
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    # Built concurrently so uploads keep working while a large table is indexed
+    with op.get_context().autocommit_block():
+        for name, table, column in INDEXES:
+            if not _has_table(table):
+                continue
+            index = vector_index(name, column)
+            op.create_index(
+                name,
+                table,
+                [column],
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                **index.dialect_kwargs,
+            )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        for name, table, _ in INDEXES:
+            op.drop_index(name, table_name=table, if_exists=True, postgresql_concurrently=True)
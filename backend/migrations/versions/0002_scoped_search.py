@@ -0,0 +1,92 @@
+"""search scopes: tenancy columns, scope indexes and a partial ANN index
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from app.models.document import Document, searchable
+from app.models.indexes import vector_index
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, Sequence[str], None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# (index name, table, column) btree indexes the batch/user/institution scopes filter on
+SCOPE_INDEXES = [
+    ("ix_documents_batch_id", "documents", "batch_id"),
+    ("ix_documents_uploaded_by", "documents", "uploaded_by"),
+    ("ix_documents_institution", "documents", "institution"),
+    ("ix_users_institution", "users", "institution"),
+]
+
+
+def _has_table(table: str) -> bool:
+    # Tables are created by the app at startup; offline (--sql) runs assume they exist
+    if op.get_context().as_sql:
+        return True
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if _has_table("users"):
+        op.execute("ALTER TABLE users ADD COLUMN IF NOT EXISTS institution VARCHAR")
+    if _has_table("documents"):
+        op.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS institution VARCHAR")
+        # Existing documents predate tenancy and were compared against everyone
+        op.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS visibility VARCHAR")
+        op.execute("UPDATE documents SET visibility = 'public' WHERE visibility IS NULL")
+        op.execute("ALTER TABLE documents ALTER COLUMN visibility SET DEFAULT 'institution'")
+        # uploaded_by was never filled in; the batch records the uploader
+        op.execute(
+            "UPDATE documents SET uploaded_by = batches.user_id FROM batches "
+            "WHERE documents.batch_id = batches.id AND documents.uploaded_by IS NULL"
+        )
+
+    table = Document.__table__
+    with op.get_context().autocommit_block():
+        for name, table_name, column in SCOPE_INDEXES:
+            if _has_table(table_name):
+                op.create_index(name, table_name, [column], if_not_exists=True, postgresql_concurrently=True)
+        if _has_table("documents"):
+            index = vector_index(
+                "ix_documents_embedding_searchable",
+                "embedding",
+                where=searchable(table.c.embedding, table.c.status),
+            )
+            op.create_index(
+                index.name,
+                "documents",
+                ["embedding"],
+                if_not_exists=True,
+                postgresql_concurrently=True,
+                **index.dialect_kwargs,
+            )
+            # Superseded by the partial index, which skips rows search never returns
+            op.drop_index("ix_documents_embedding_ann", table_name="documents", if_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_documents_embedding_ann",
+            "documents",
+            ["embedding"],
+            if_not_exists=True,
+            postgresql_concurrently=True,
+            **vector_index("ix_documents_embedding_ann", "embedding").dialect_kwargs,
+        )
+        op.drop_index("ix_documents_embedding_searchable", table_name="documents", if_exists=True, postgresql_concurrently=True)
+        for name, table_name, _ in SCOPE_INDEXES:
+            op.drop_index(name, table_name=table_name, if_exists=True, postgresql_concurrently=True)
+    op.drop_column("documents", "visibility")
+    op.drop_column("documents", "institution")
+    op.drop_column("users", "institution")
@@ -0,0 +1,49 @@
+"""MinHash signatures, LSH buckets and a content_hash index
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, Sequence[str], None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(table: str) -> bool:
+    # Tables are created by the app at startup; offline (--sql) runs assume they exist
+    if op.get_context().as_sql:
+        return True
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _has_table("documents"):
+        return
+    op.execute("ALTER TABLE documents ADD COLUMN IF NOT EXISTS minhash BYTEA")
+    op.execute(
+        "CREATE TABLE IF NOT EXISTS lsh_buckets ("
+        "band SMALLINT NOT NULL, "
+        "bucket BIGINT NOT NULL, "
+        "document_id UUID NOT NULL REFERENCES documents (id), "
+        "PRIMARY KEY (band, bucket, document_id))"
+    )
+    with op.get_context().autocommit_block():
+        op.create_index("ix_lsh_buckets_document_id", "lsh_buckets", ["document_id"], if_not_exists=True, postgresql_concurrently=True)
+        op.create_index("ix_documents_content_hash", "documents", ["content_hash"], if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_documents_content_hash", table_name="documents", if_exists=True, postgresql_concurrently=True)
+    op.execute("DROP TABLE IF EXISTS lsh_buckets")
+    op.drop_column("documents", "minhash")
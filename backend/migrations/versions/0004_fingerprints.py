@@ -0,0 +1,51 @@
+"""winnowing fingerprint inverted index
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, Sequence[str], None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(table: str) -> bool:
+    # Tables are created by the app at startup; offline (--sql) runs assume they exist
+    if op.get_context().as_sql:
+        return True
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _has_table("documents"):
+        return
+    op.execute(
+        "CREATE TABLE IF NOT EXISTS fingerprints ("
+        "document_id UUID NOT NULL REFERENCES documents (id), "
+        "start_char INTEGER NOT NULL, "
+        "end_char INTEGER NOT NULL, "
+        "hash INTEGER NOT NULL, "
+        "PRIMARY KEY (document_id, start_char))"
+    )
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_fingerprints_hash",
+            "fingerprints",
+            ["hash", "document_id", "start_char", "end_char"],
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    op.execute("DROP TABLE IF EXISTS fingerprints")
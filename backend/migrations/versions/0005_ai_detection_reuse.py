@@ -0,0 +1,53 @@
+"""per-window AI detection results keyed by content hash and model version
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-18 00:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, Sequence[str], None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def _has_table(table: str) -> bool:
+    # Tables are created by the app at startup; offline (--sql) runs assume they exist
+    if op.get_context().as_sql:
+        return True
+    return sa.inspect(op.get_bind()).has_table(table)
+
+
+def upgrade() -> None:
+    """Upgrade schema."""
+    if not _has_table("ai_detection"):
+        return
+    op.execute("ALTER TABLE ai_detection ADD COLUMN IF NOT EXISTS content_hash VARCHAR(64)")
+    op.execute("ALTER TABLE ai_detection ADD COLUMN IF NOT EXISTS chunk_index INTEGER")
+    op.execute("ALTER TABLE ai_detection ADD COLUMN IF NOT EXISTS start_char INTEGER")
+    op.execute("ALTER TABLE ai_detection ADD COLUMN IF NOT EXISTS end_char INTEGER")
+    op.execute("ALTER TABLE ai_detection ALTER COLUMN document_id DROP NOT NULL")
+    with op.get_context().autocommit_block():
+        op.create_index(
+            "ix_ai_detection_content_hash_model",
+            "ai_detection",
+            ["content_hash", "model_version"],
+            if_not_exists=True,
+            postgresql_concurrently=True,
+        )
+        op.create_index("ix_ai_detection_document_id", "ai_detection", ["document_id"], if_not_exists=True, postgresql_concurrently=True)
+
+
+def downgrade() -> None:
+    """Downgrade schema."""
+    with op.get_context().autocommit_block():
+        op.drop_index("ix_ai_detection_document_id", table_name="ai_detection", if_exists=True, postgresql_concurrently=True)
+        op.drop_index("ix_ai_detection_content_hash_model", table_name="ai_detection", if_exists=True, postgresql_concurrently=True)
+    for column in ("end_char", "start_char", "chunk_index", "content_hash"):
+        op.execute(f"ALTER TABLE ai_detection DROP COLUMN IF EXISTS {column}")
@@ -1,5 +1,11 @@
+import os
 import sys
 from os.path import abspath, dirname
 
 # Add the project's root directory to the Python path
 sys.path.insert(0, dirname(dirname(abspath(__file__))))
+
+# Keep tests independent of a running Redis
+os.environ.setdefault("EMBEDDING_CACHE_BACKEND", "memory")
+os.environ.setdefault("SEARCH_CACHE_BACKEND", "memory")
+os.environ.setdefault("AI_CACHE_BACKEND", "memory")
@@ -0,0 +1,212 @@
+import asyncio
+import json
+import time
+from types import SimpleNamespace
+from unittest.mock import MagicMock
+import pytest
+from app.core.config import settings
+from app.services.ai_detection import AIDetectionService
+from app.services.cache import build_cache, decode_json, encode_json
+from app.services.governor import Governor
+from app.services.segmentation import Segmenter
+import random
+from app.services.text_statistics import StatisticalDetector, fit
+
+class FakeProvider:
+    """Stands in for AsyncOpenAI: answers after a delay and records concurrency"""
+
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+        self.closed = False
+        self.chat = SimpleNamespace(completions=SimpleNamespace(create=self.create))
+
+    async def create(self, model, messages, temperature):
+        self.calls += 1
+        self.in_flight += 1
+        self.peak = max(self.peak, self.in_flight)
+        await asyncio.sleep(self.delay)
+        self.in_flight -= 1
+        is_ai = "robot" in messages[0]["content"]
+        content = "```json\n" + json.dumps({"is_ai": is_ai, "confidence": 0.8}) + "\n```"
+        return SimpleNamespace(choices=[SimpleNamespace(message=SimpleNamespace(content=content))])
+
+    async def close(self):
+        self.closed = True
+
+def _service(provider, monkeypatch, concurrency=4):
+    monkeypatch.setattr("app.services.ai_detection.settings.AI_PROVIDER_CONCURRENCY", concurrency)
+    service = AIDetectionService()
+    service.provider = "openrouter"
+    service.enabled = True
+    service.external = True
+    service.governor = Governor("test", rate=0, max_concurrency=concurrency)
+    service.external_segmenter = Segmenter("external-test", 200)
+    service.external_max_windows = 8
+    service.cache = build_cache("ai-external-test", encode_json, decode_json, backend="memory", local_size=100, shared_size=0)
+    service._make_client = lambda: provider
+    return service
+
+@pytest.mark.asyncio
+async def test_windows_are_sent_concurrently_within_the_cap(monkeypatch):
+    provider = FakeProvider()
+    service = _service(provider, monkeypatch, concurrency=4)
+    essays = ["".join(f"Essay {n} sentence {i} written by a person. " for i in range(24)) for n in range(2)]
+
+    started = time.monotonic()
+    results = await service.adetect_many(essays)
+    elapsed = time.monotonic() - started
+
+    windows = sum(len(result["windows"]) for result in results)
+    assert windows == provider.calls > 4
+    assert provider.peak == 4
+    assert elapsed < provider.delay * windows / 2  # not one request after another
+    assert all(result["label"] == "Human" and abs(result["score"] - 0.2) < 1e-9 for result in results)
+
+def test_synchronous_calls_close_their_provider_client(monkeypatch):
+    providers = []
+    service = _service(None, monkeypatch)
+    service._make_client = lambda: providers.append(FakeProvider(delay=0)) or providers[-1]
+
+    # Each call runs its own event loop, whose client must not outlive it
+    for n in range(2):
+        service.detect_many([f"Essay {n} written by a person, sentence after sentence."])
+    assert len(providers) == 2 and all(provider.closed for provider in providers)
+    assert service._client is None
+
+@pytest.mark.asyncio
+async def test_provider_calls_per_document_are_capped(monkeypatch):
+    provider = FakeProvider(delay=0)
+    service = _service(provider, monkeypatch)
+    # The default cap: a handful of paid calls per document, not one per local window
+    assert settings.AI_EXTERNAL_MAX_WINDOWS == 3
+    service.external_max_windows = settings.AI_EXTERNAL_MAX_WINDOWS
+    essay = "".join(f"Long essay sentence {i} written by a person. " for i in range(200))
+
+    result = (await service.adetect_many([essay]))[0]
+    assert provider.calls == len(result["windows"]) == 3
+    assert result["windows_total"] > 30
+    # Spread over the document rather than taken from its start
+    assert result["windows"][-1][0] > len(essay) * 0.6
+
+@pytest.mark.asyncio
+async def test_repeated_and_concurrent_identical_texts_reach_the_provider_once(monkeypatch):
+    provider = FakeProvider()
+    service = _service(provider, monkeypatch)
+    text = "This paragraph was produced by a robot for the test. " * 3
+
+    first, second = await asyncio.gather(service.adetect(text), service.adetect(text))
+    assert provider.calls == 1
+    assert first == second and first["label"] == "AI" and first["score"] == pytest.approx(0.8)
+
+    assert (await service.adetect(text)) == first
+    assert provider.calls == 1
+    assert service.cache.stats()["hit_rate"] > 0
+
+@pytest.mark.asyncio
+async def test_provider_errors_are_reported_not_scored(monkeypatch):
+    async def broken(**kwargs):
+        raise ValueError("not json")
+    service = _service(SimpleNamespace(chat=SimpleNamespace(completions=SimpleNamespace(create=broken))), monkeypatch)
+
+    result = await service.adetect("Some text to check for the error path here.")
+    assert result["label"] == "ERROR" and "not json" in result["message"]
+
+HUMAN = (
+    "I missed the bus again this morning. Honestly? It was my fault. The alarm went off at six, I hit snooze twice, "
+    "and by the time I'd found my other shoe under the sofa, the 7:15 was long gone. So I walked. Forty minutes in "
+    "drizzle, past the bakery that still hasn't fixed its sign, past Mrs Patel's garden with those ridiculous "
+    "sunflowers taller than the fence. My teacher didn't say anything when I slid into my seat, soaked. She just "
+    "raised an eyebrow. Later, Tom told me the bus had broken down anyway, halfway up Mill Road. Typical."
+)
+MACHINE = (
+    "Time management is an important skill for students. It helps students complete their tasks on time. It also "
+    "helps students reduce stress and improve their performance. Effective time management involves planning tasks "
+    "in advance. It also involves setting clear goals and priorities. Students who manage their time effectively are "
+    "more productive. They are also more likely to achieve their academic goals. In addition, time management helps "
+    "students balance their academic and personal lives. Overall, time management is an essential skill for students."
+)
+
+def test_statistical_tier_separates_clear_cases():
+    detector = StatisticalDetector()
+    assert detector.probability(HUMAN) < 0.05
+    assert detector.probability(MACHINE) > 0.95
+    assert detector.probability("Far too short to judge.") is None
+
+def _labelled_texts(seed=0):
+    """Varied human-like prose and flat, repetitive machine-like prose"""
+    rng = random.Random(seed)
+    vocabulary = HUMAN.lower().replace(".", "").replace(",", "").split() + MACHINE.lower().replace(".", "").split()
+    narrow = MACHINE.lower().replace(".", "").split()[:40]
+    texts, labels = [], []
+    for _ in range(20):
+        texts.append(" ".join(
+            " ".join(rng.choice(vocabulary) for _ in range(rng.randint(3, 30))).capitalize() + "." for _ in range(12)
+        ))
+        labels.append(0)
+        texts.append(" ".join(" ".join(rng.choice(narrow) for _ in range(12)).capitalize() + "." for _ in range(12)))
+        labels.append(1)
+    return texts, labels
+
+def test_fitted_statistical_model_is_reproducible_and_calibrated(tmp_path):
+    texts, labels = _labelled_texts()
+    model = fit(texts, labels)
+    assert model == fit(texts, labels)
+    assert model["calibrated"] and model["training_accuracy"] > 0.9
+
+    path = tmp_path / "statistical.json"
+    path.write_text(json.dumps(model))
+    detector = StatisticalDetector(str(path))
+    held_out, held_out_labels = _labelled_texts(seed=1)
+    scores = [detector.probability(text) for text in held_out]
+    assert all((score > 0.5) == bool(label) for score, label in zip(scores, held_out_labels))
+
+def test_uncalibrated_statistical_tier_settles_nothing(monkeypatch):
+    monkeypatch.setattr("app.services.ai_detection.settings.AI_DETECTION_CASCADE", True)
+    monkeypatch.setattr("app.services.ai_detection.settings.AI_STATISTICAL_MODEL", "")
+    monkeypatch.setattr("app.services.ai_detection.get_model_client", lambda: MagicMock())
+    monkeypatch.setattr("app.services.ai_detection.load_tokenizer", lambda name: None)
+    service = AIDetectionService()
+    assert service.tiers == ["statistical", "local"]
+    assert not service.statistical.calibrated
+    assert service.bands["statistical"] == (0.0, 1.0)
+
+def test_uncalibrated_statistical_tier_alone_leaves_detection_unavailable(monkeypatch):
+    monkeypatch.setattr("app.services.ai_detection.settings.AI_DETECTION_CASCADE", True)
+    monkeypatch.setattr("app.services.ai_detection.settings.AI_STATISTICAL_MODEL", "")
+    monkeypatch.setattr("app.services.ai_detection.settings.AI_PROVIDER", "local")
+    monkeypatch.setattr("app.services.ai_detection.get_model_client", lambda: None)
+    monkeypatch.setattr("app.services.ai_detection.HAS_TRANSFORMERS", False)
+    service = AIDetectionService()
+
+    assert not service.enabled and not service.cascade
+    result = service.detect_many([HUMAN])[0]
+    assert result["label"] == "UNKNOWN" and "unavailable" in result["message"]
+
+@pytest.mark.asyncio
+async def test_cascade_escalates_only_uncertain_documents(monkeypatch):
+    provider = FakeProvider(delay=0)
+    service = _service(provider, monkeypatch)
+    # The local model is sure about robots and undecided about everything else
+    service.classifier = MagicMock(side_effect=lambda chunks, **kwargs: [
+        {"label": "Fake", "score": 0.9} if "robot" in c else {"label": "Real", "score": 0.5} for c in chunks
+    ])
+    service.cascade = True
+    service.statistical = StatisticalDetector()
+    service.tiers = ["statistical", "local", "external"]
+    service.bands = {"statistical": (0.05, 0.95), "local": (0.2, 0.8)}
+    service.tier_counts = dict.fromkeys(service.tiers, 0)
+
+    short_robot = "A short note that a robot wrote."
+    short_unsure = "A short note that somebody wrote."
+    results = await service.adetect_many([HUMAN, MACHINE, short_robot, short_unsure])
+
+    assert [r["tier"] for r in results] == ["statistical", "statistical", "local", "external"]
+    assert results[0]["is_ai"] is False and results[1]["is_ai"] is True and results[2]["is_ai"] is True
+    # Only the short texts reached the local model, and only the undecided one the provider
+    assert service.classifier.call_count == 1 and len(service.classifier.call_args[0][0]) == 2
+    assert provider.calls == 1
+    assert service.cascade_stats() == {"statistical": 2, "local": 1, "external": 1}
+    assert service.model_version.startswith("cascade[")
@@ -0,0 +1,98 @@
+import uuid
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.services.ai_detection_store import AIDetectionStore, content_hash
+
+RESULT = {
+    "is_ai": True, "score": 0.8, "confidence": 0.9, "label": "Fake",
+    "windows": [[0, 40, 0.7], [41, 90, 0.9]], "windows_total": 2, "coverage": 1.0,
+    "message": "Analysis complete (2 chunks analyzed)",
+}
+
+def _session(rows):
+    session = MagicMock()
+    loaded = MagicMock()
+    loaded.all.return_value = rows
+    session.execute = AsyncMock(side_effect=[loaded] + [MagicMock()] * 3)
+    session.commit = AsyncMock()
+    return session
+
+def _service():
+    service = MagicMock()
+    service.model_version = "detector:stratified/32"
+    service.adetect_many = AsyncMock(side_effect=lambda texts: [dict(RESULT) for _ in texts])
+    return service
+
+@pytest.mark.asyncio
+async def test_new_texts_are_detected_and_stored_in_bulk():
+    session = _session([])
+    service = _service()
+    doc_a, doc_b = uuid.uuid4(), uuid.uuid4()
+
+    results = await AIDetectionStore(session).detect_many(service, ["same text", "same text"], document_ids=[doc_a, doc_b])
+
+    # Identical texts are analyzed once but stored for both documents
+    service.adetect_many.assert_awaited_once_with(["same text"])
+    assert results[0]["score"] == 0.8 and "stored" not in results[0]
+    assert session.execute.await_count == 3  # load, delete, one bulk insert
+    rows = session.execute.await_args_list[2][0][1]
+    assert len(rows) == 6
+    summary = [row for row in rows if row["chunk_index"] is None]
+    assert {row["document_id"] for row in summary} == {doc_a, doc_b}
+    assert all(row["content_hash"] == content_hash("same text") for row in rows)
+    assert "windows" not in summary[0]["meta_data"]
+    assert [(row["start_char"], row["probability"]) for row in rows if row["document_id"] == doc_a and row["chunk_index"] is not None] == [(0, 0.7), (41, 0.9)]
+
+@pytest.mark.asyncio
+async def test_unchanged_texts_reuse_stored_results():
+    h = content_hash("old text")
+    doc, other = uuid.uuid4(), uuid.uuid4()
+    meta = {key: value for key, value in RESULT.items() if key != "windows"}
+    session = _session([
+        (h, doc, None, None, None, 0.8, meta),
+        (h, doc, 0, 0, 40, 0.7, None),
+        (h, doc, 1, 41, 90, 0.9, None),
+        (h, other, None, None, None, 0.8, meta),
+        (h, other, 0, 0, 40, 0.7, None),
+    ])
+    service = _service()
+
+    result = (await AIDetectionStore(session).detect_many(service, ["old text"], document_ids=[doc]))[0]
+
+    service.adetect_many.assert_not_awaited()
+    assert result["stored"] is True
+    assert result["windows"] == RESULT["windows"]
+    assert session.execute.await_count == 1
+
+@pytest.mark.asyncio
+async def test_failed_detections_are_not_stored():
+    session = _session([])
+    service = _service()
+    service.adetect_many = AsyncMock(return_value=[{"is_ai": False, "score": 0.0, "label": "ERROR", "message": "boom"}])
+
+    result = (await AIDetectionStore(session).detect_many(service, ["text"]))[0]
+    assert result["label"] == "ERROR"
+    assert session.execute.await_count == 1
+
+@pytest.mark.asyncio
+async def test_results_are_returned_when_storing_them_fails():
+    session = _session([])
+    loaded = MagicMock()
+    loaded.all.return_value = []
+    session.execute = AsyncMock(side_effect=[loaded, RuntimeError("insert failed")])
+    service = _service()
+
+    result = (await AIDetectionStore(session).detect_many(service, ["text"], document_ids=[uuid.uuid4()]))[0]
+    assert result["score"] == 0.8 and "stored" not in result
+    session.commit.assert_not_awaited()
+
+@pytest.mark.asyncio
+async def test_cascade_results_with_a_failed_escalation_are_not_stored():
+    session = _session([])
+    service = _service()
+    service.adetect_many = AsyncMock(return_value=[{**RESULT, "tier": "statistical", "escalation_error": "provider down"}])
+
+    result = (await AIDetectionStore(session).detect_many(service, ["text"], document_ids=[uuid.uuid4()]))[0]
+    assert result["escalation_error"] == "provider down"
+    assert session.execute.await_count == 1  # the load only
+    session.commit.assert_not_awaited()
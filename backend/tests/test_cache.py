@@ -0,0 +1,83 @@
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+from unittest.mock import MagicMock, patch
+from app.services.cache import LRUCache, RedisCache, TieredCache, build_cache
+from app.services.embedding import EmbeddingService, _encode_matrix, _decode_matrix
+
+def test_lru_cache_evicts_least_recently_used():
+    cache = LRUCache(max_entries=2)
+    cache.set("a", 1)
+    cache.set("b", 2)
+    assert cache.get("a") == 1  # "a" is now most recently used
+    cache.set("c", 3)
+
+    assert cache.get("b") is None
+    assert cache.get("a") == 1
+    assert cache.get("c") == 3
+    assert cache.stats()["evictions"] == 1
+    assert cache.hits == 3
+    assert cache.misses == 1
+
+def test_lru_cache_ttl_expiry():
+    cache = LRUCache(max_entries=10, ttl=10)
+    with patch("app.services.cache.time.monotonic", return_value=100.0):
+        cache.set("a", 1)
+    with patch("app.services.cache.time.monotonic", return_value=105.0):
+        assert cache.get("a") == 1
+    with patch("app.services.cache.time.monotonic", return_value=111.0):
+        assert cache.get("a") is None
+
+def test_lru_cache_is_safe_across_threads():
+    cache = LRUCache(max_entries=8)
+
+    def hammer(n):
+        for i in range(2000):
+            key = str((n + i) % 16)
+            cache.get(key)
+            cache.set(key, i)
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(hammer, range(8)))
+    stats = cache.stats()
+    assert stats["size"] == len(cache) == 8
+    assert stats["hits"] + stats["misses"] == 8 * 2000
+
+def test_tiered_cache_promotes_shared_hits():
+    shared = MagicMock(spec=RedisCache)
+    shared.hits = 1
+    shared.get_many.return_value = {"k": _encode_matrix(np.ones((2, 4)))}
+    cache = TieredCache("emb", _encode_matrix, _decode_matrix, local_size=8, shared=shared)
+
+    np.testing.assert_array_equal(cache.get("k"), np.ones((2, 4)))
+    # Second lookup is served from the local tier
+    np.testing.assert_array_equal(cache.get("k"), np.ones((2, 4)))
+    assert shared.get_many.call_count == 1
+
+def test_redis_cache_errors_fall_back_to_miss():
+    client = MagicMock()
+    client.mget.side_effect = ConnectionError("refused")
+    cache = RedisCache(client, "emb")
+
+    assert cache.get_many(["a", "b"]) == {}
+    assert cache.errors == 1
+    # The tier is skipped until the retry window passes
+    assert cache.get_many(["a"]) == {}
+    assert client.mget.call_count == 1
+
+@patch('app.services.embedding.HAS_MODEL', False)
+def test_generate_embeddings_skips_model_for_cached_content():
+    service = EmbeddingService()
+    service.cache = build_cache("emb", _encode_matrix, _decode_matrix, "memory", 16, 0)
+    mock_model = MagicMock()
+    mock_model.encode.side_effect = lambda chunks, **kwargs: np.ones((len(chunks), 3))
+    service.model = mock_model
+
+    first = service.generate_embeddings(["same essay", "same essay", "other essay"])
+    assert mock_model.encode.call_count == 1
+    # Duplicate texts in one batch are only encoded once
+    assert len(mock_model.encode.call_args[0][0]) == 2
+
+    second = service.generate_embeddings(["same essay"])
+    assert mock_model.encode.call_count == 1
+    np.testing.assert_array_equal(first[0], second[0])
+    assert service.cache.stats()["local"]["hits"] == 1
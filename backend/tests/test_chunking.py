@@ -1,7 +1,9 @@
 
+import itertools
 import numpy as np
 from app.services.embedding import EmbeddingService
 from app.services.ai_detection import AIDetectionService
+from app.services.segmentation import Segmenter, approx_token_length
 from unittest.mock import MagicMock, patch
 
 def test_embedding_chunking():
@@ -11,24 +13,55 @@ def test_embedding_chunking():
     assert len(chunks) > 1
     assert all(len(c) <= 100 for c in chunks)
 
+def test_chunk_spans_match_chunks():
+    service = EmbeddingService()
+    text = "This is a long text that should be chunked. " * 20
+    spans = service.chunk_spans(text, chunk_size=100, overlap=20)
+    chunks = service.chunk_text(text, chunk_size=100, overlap=20)
+    assert [text[span.start:span.end] for span in spans] == chunks
+    assert spans[-1].end == len(text.rstrip())
+    # Chunks never cut a sentence in half
+    assert all(chunk.endswith(".") for chunk in chunks)
+
 @patch('app.services.embedding.HAS_MODEL', False)
 def test_generate_text_embedding_with_chunking():
     service = EmbeddingService()
     mock_model = MagicMock()
-    # Mock encode to return a 384-dim vector
-    mock_model.encode.return_value = np.zeros(384)
+    # Mock encode to return one 384-dim vector per chunk
+    mock_model.encode.side_effect = lambda chunks, **kwargs: np.zeros((len(chunks), 384))
     service.model = mock_model
     
     text = "This is a long text. " * 50
     embedding = service.generate_text_embedding(text)
     
     assert len(embedding) == 384
-    assert mock_model.encode.call_count > 1
+    # All chunks go through a single batched encode call
+    assert mock_model.encode.call_count == 1
+    assert len(mock_model.encode.call_args[0][0]) > 1
+
+@patch('app.services.embedding.HAS_MODEL', False)
+def test_generate_embeddings_averages_per_document():
+    service = EmbeddingService()
+    mock_model = MagicMock()
+    # Each chunk is encoded as its length so the averages are easy to check
+    mock_model.encode.side_effect = lambda chunks, **kwargs: np.array([[len(c), 1.0] for c in chunks])
+    service.model = mock_model
+
+    texts = ["A short essay.", "", "A much longer essay sentence. " * 40]
+    embeddings = service.generate_embeddings(texts)
+
+    assert embeddings.shape == (3, 2)
+    assert mock_model.encode.call_count == 1
+    long_chunks = service.chunk_text(texts[2])
+    assert len(long_chunks) > 1
+    np.testing.assert_allclose(embeddings[0], [len(texts[0]), 1.0])
+    np.testing.assert_allclose(embeddings[1], [0, 0])
+    np.testing.assert_allclose(embeddings[2], [np.mean([len(c) for c in long_chunks]), 1.0], rtol=1e-6)
 
 def test_ai_detection_chunking():
     service = AIDetectionService()
     mock_classifier = MagicMock()
-    mock_classifier.return_value = [{'label': 'Fake', 'score': 0.9}]
+    mock_classifier.side_effect = lambda chunks, **kwargs: [{'label': 'Fake', 'score': 0.9} for _ in chunks]
     service.classifier = mock_classifier
     service.enabled = True
     
@@ -37,4 +70,76 @@ def test_ai_detection_chunking():
     
     assert result['is_ai'] is True
     assert "chunks analyzed" in result['message']
-    assert mock_classifier.call_count > 1
+    # Every chunk goes through a single batched pipeline call
+    assert mock_classifier.call_count == 1
+    assert len(mock_classifier.call_args[0][0]) > 1
+    assert mock_classifier.call_args[1]['truncation'] is True
+
+def test_ai_detection_batches_documents():
+    service = AIDetectionService()
+    mock_classifier = MagicMock()
+    # A chunk mentioning "robot" is AI-generated with probability 0.9, anything else 0.2
+    mock_classifier.side_effect = lambda chunks, **kwargs: [
+        {'label': 'Fake', 'score': 0.9} if 'robot' in c else {'label': 'Real', 'score': 0.8} for c in chunks
+    ]
+    service.classifier = mock_classifier
+    service.enabled = True
+    service.provider = "local"
+
+    human = "A person wrote this sentence. " * 200
+    mixed = "A robot wrote this sentence. " * 150 + "A person wrote this one. " * 150
+    results = service.detect_many([human, "", mixed, human])
+
+    assert mock_classifier.call_count == 1
+    assert results[0] == results[3] and results[0]['label'] == 'Real'
+    assert abs(results[0]['score'] - 0.2) < 1e-9
+    assert results[1]['message'] == "No text to analyze"
+    chunks = [span.text for span in service.segmenter.spans(mixed)]
+    expected = sum(0.9 if 'robot' in c else 0.2 for c in chunks) / len(chunks)
+    assert abs(results[2]['score'] - expected) < 1e-9
+
+def _window_service(strategy, classify):
+    service = AIDetectionService()
+    service.classifier = MagicMock(side_effect=lambda chunks, **kwargs: [classify(c) for c in chunks])
+    service.enabled = True
+    service.provider = "local"
+    service.strategy = strategy
+    service.max_windows = 8
+    service.min_windows = 4
+    # Small windows so a short text stands in for a long thesis
+    service.segmenter = Segmenter("detection-test", 40, length=approx_token_length)
+    return service
+
+def test_ai_detection_covers_the_whole_document():
+    # The AI-written part is at the end, past where the first 5 windows would stop
+    text = "A person wrote this sentence by hand. " * 300 + "A robot generated this sentence. " * 100
+
+    def classify(c):
+        return {'label': 'Fake', 'score': 0.9} if 'robot' in c else {'label': 'Real', 'score': 0.9}
+
+    full = _window_service("full", classify).detect(text)
+    assert len(full['windows']) == full['windows_total'] > 40
+    assert full['coverage'] > 0.95
+
+    stratified = _window_service("stratified", classify).detect(text)
+    starts = [start for start, _, _ in stratified['windows']]
+    assert len(starts) == 8 and starts == sorted(starts)
+    assert starts[-1] > len(text) * 0.8
+    assert any(score == 0.9 for _, _, score in stratified['windows'])
+    assert abs(stratified['score'] - full['score']) < 0.15
+
+def test_adaptive_detection_stops_once_the_score_is_settled():
+    text = "A person wrote this sentence by hand. " * 400
+    service = _window_service("adaptive", lambda c: {'label': 'Real', 'score': 0.9})
+    result = service.detect(text)
+
+    # Identical scores settle after the first round
+    assert len(result['windows']) == 4 and service.classifier.call_count == 1
+    starts = [start for start, _, _ in result['windows']]
+    assert starts[-1] > len(text) / 2
+
+    # Alternating scores never settle, so sampling continues up to max_windows
+    alternating = itertools.cycle([0.1, 0.9])
+    noisy = _window_service("adaptive", lambda c: {'label': 'Fake', 'score': next(alternating)})
+    result = noisy.detect(text)
+    assert len(result['windows']) == 8 and noisy.classifier.call_count == 2
@@ -0,0 +1,125 @@
+import uuid
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects import postgresql
+from app.services.comparison import ComparisonService, PgVectorStore, SearchScope, similar_pairs
+from app.services.similarity import ngram_containment, word_ngrams
+
+def _result(rows):
+    result = MagicMock()
+    result.all.return_value = rows
+    return result
+
+def test_ngram_containment():
+    text = "the quick brown fox jumps over the lazy dog near the river bank"
+    copied = "intro words " + text + " closing words"
+    assert ngram_containment(word_ngrams(text), word_ngrams(copied)) == 1.0
+    assert ngram_containment(word_ngrams(text), word_ngrams("something else entirely written here")) == 0.0
+
+@pytest.mark.asyncio
+async def test_rerank_prefers_chunk_and_lexical_matches():
+    copied, unrelated = uuid.uuid4(), uuid.uuid4()
+    text = "a passage that was copied word for word from another essay"
+    session = MagicMock()
+    session.execute = AsyncMock(side_effect=[
+        _result([(copied, np.array([1.0, 0.0])), (unrelated, np.array([0.0, 1.0]))]),
+        _result([(copied, "prefix " + text), (unrelated, "nothing in common at all here")]),
+    ])
+    service = ComparisonService(session)
+
+    # The unrelated document wins stage 1 but loses after reranking
+    candidates = [(unrelated, 0.9), (copied, 0.6)]
+    results = await service.rerank(np.array([[1.0, 0.0]]), text, candidates)
+
+    assert [r["document_id"] for r in results] == [copied, unrelated]
+    assert results[0]["ngram_overlap"] == 1.0
+    assert results[0]["chunk_similarity"] == pytest.approx(1.0)
+    assert all(r["reranked"] for r in results)
+
+@pytest.mark.asyncio
+async def test_rerank_keeps_stage_one_scores_when_out_of_budget():
+    session = MagicMock()
+    session.execute = AsyncMock()
+    service = ComparisonService(session)
+    candidates = [(uuid.uuid4(), 0.9), (uuid.uuid4(), 0.8)]
+
+    results = await service.rerank(np.zeros((0, 2)), "text", candidates, budget_ms=-1)
+
+    session.execute.assert_not_called()
+    assert [r["similarity"] for r in results] == [0.9, 0.8]
+    assert not any(r["reranked"] for r in results)
+
+def test_similar_pairs_matches_full_matrix():
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(50, 8))
+    vectors[10] = vectors[3] * 2  # a near-duplicate pair
+    rows, cols, sims = similar_pairs(vectors, threshold=0.5, block_size=7)
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    full = normalized @ normalized.T
+    expected = {(i, j) for i in range(50) for j in range(i + 1, 50) if full[i, j] >= 0.5}
+    assert set(zip(rows.tolist(), cols.tolist())) == expected
+    assert (3, 10) in expected
+    np.testing.assert_allclose(sims, full[rows, cols], rtol=1e-5)
+
+@pytest.mark.asyncio
+async def test_find_candidates_many_groups_rows_per_query():
+    first, second = uuid.uuid4(), uuid.uuid4()
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=_result([(1, first, 0.9), (1, second, 0.7), (3, second, 0.8)]))
+    session.begin_nested = MagicMock(return_value=AsyncMock())
+    service = ComparisonService(session)
+
+    results = await service.find_candidates_many(np.eye(3), limit=2)
+
+    assert results == [[(first, 0.9), (second, 0.7)], [], [(second, 0.8)]]
+
+def _sql(query):
+    return str(query.compile(dialect=postgresql.dialect(), compile_kwargs={"literal_binds": True}))
+
+def test_scope_filters_are_pushed_into_sql():
+    user = MagicMock(id=uuid.uuid4(), institution="uni")
+    exclude = uuid.uuid4()
+
+    sql = _sql(PgVectorStore.nearest_query(["[1,0]"], 10, [exclude], SearchScope.for_user("institution", None, user)))
+    assert "documents.embedding IS NOT NULL" in sql
+    assert "status IS DISTINCT FROM 'failed'" in sql
+    assert "documents.institution = 'uni'" in sql
+    assert "documents.visibility" in sql
+    assert str(exclude) in sql
+    # Filtered ANN search keeps the bare distance so the partial index is used
+    assert "+ 0" not in sql
+
+    sql = _sql(PgVectorStore.nearest_query(["[1,0]"], 10, (), SearchScope.for_user("batch", uuid.uuid4(), user)))
+    assert "documents.batch_id" in sql
+    assert "+ 0" in sql
+
+def test_comparison_scope_setting_is_validated_at_startup():
+    from pydantic import ValidationError
+    from app.core.config import Settings
+    assert Settings(COMPARISON_SCOPE="Institution").COMPARISON_SCOPE == "institution"
+    with pytest.raises(ValidationError):
+        Settings(COMPARISON_SCOPE="everything")
+
+def test_scope_falls_back_to_user_without_institution():
+    user = MagicMock(id=uuid.uuid4(), institution=None)
+    assert SearchScope.for_user("institution", None, user).mode == "user"
+    with pytest.raises(ValueError):
+        SearchScope.for_user("everything", None, user)
+
+@pytest.mark.asyncio
+async def test_lexical_matching_finds_documents_without_embeddings():
+    user = MagicMock(id=uuid.uuid4(), institution="uni")
+    scope = SearchScope.for_user("global", None, user)
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=_result([]))
+    service = ComparisonService(session)
+
+    await service.find_exact_duplicates(["abc"], scope=scope)
+    await service.find_near_duplicates({uuid.uuid4(): np.zeros(128, dtype=np.uint32)}, 0.8, scope)
+    for call in session.execute.await_args_list:
+        sql = _sql(call.args[0])
+        assert "embedding IS NOT NULL" not in sql
+        assert "status IS DISTINCT FROM 'failed'" in sql
+        assert "documents.visibility" in sql
@@ -1,3 +1,4 @@
+import pytest
 from app.services.embedding import EmbeddingService
 
 def test_generate_text_embedding():
@@ -10,3 +11,12 @@ def test_hash_content():
     hashed_content = EmbeddingService.hash_content(content)
     assert isinstance(hashed_content, str)
     assert len(hashed_content) == 64
+
+def test_cosine_agreement():
+    import numpy as np
+    from app.services.embedding_backends import cosine_agreement
+
+    reference = np.array([[1.0, 0.0], [0.0, 2.0]])
+    agreement = cosine_agreement(reference, np.array([[2.0, 0.0], [1.0, 1.0]]))
+    assert agreement["mean"] == pytest.approx((1.0 + 2 ** -0.5) / 2)
+    assert agreement["min"] == pytest.approx(2 ** -0.5)
@@ -0,0 +1,139 @@
+import asyncio
+import time
+import httpx
+import pytest
+from app.services.governor import AIMDLimiter, CircuitOpenError, ConcurrencyTimeout, Governor, is_retryable
+from app.services.search_client import SearchClient
+
+class StatusError(Exception):
+    def __init__(self, status_code):
+        super().__init__(f"HTTP {status_code}")
+        self.status_code = status_code
+
+def _governor(**kwargs):
+    options = dict(rate=0, max_concurrency=4, failure_threshold=3, reset_timeout=0.2, retries=2, backoff=0.01, backoff_max=0.02)
+    options.update(kwargs)
+    return Governor("test", **options)
+
+def test_token_bucket_spaces_out_calls():
+    governor = _governor(rate=20, burst=1)
+    started = time.monotonic()
+    for _ in range(5):
+        governor.call(lambda: None)
+    assert time.monotonic() - started >= 0.18  # four waits of 1/20s after the first token
+    assert governor.stats()["throttled"] == 4
+
+def test_retryable_errors_are_retried_and_bad_requests_are_not():
+    governor = _governor()
+    attempts = []
+    def flaky():
+        attempts.append(1)
+        if len(attempts) < 3:
+            raise StatusError(503)
+        return "ok"
+    assert governor.call(flaky) == "ok"
+    assert governor.stats()["retries"] == 2
+
+    def bad_request():
+        raise StatusError(400)
+    with pytest.raises(StatusError):
+        governor.call(bad_request)
+    assert governor.stats()["retries"] == 2 and governor.breaker.state == "closed"
+
+def test_programming_errors_are_not_retried():
+    governor = _governor(failure_threshold=1)
+    calls = []
+    def buggy():
+        calls.append(1)
+        return {}["missing"]
+    with pytest.raises(KeyError):
+        governor.call(buggy)
+    assert len(calls) == 1 and governor.stats()["retries"] == 0
+    assert governor.breaker.state == "closed"
+
+    assert is_retryable(httpx.ConnectTimeout("slow")) and is_retryable(ConnectionResetError())
+    assert not is_retryable(AttributeError()) and not is_retryable(IndexError())
+
+def test_circuit_opens_fails_fast_and_recovers():
+    governor = _governor(retries=0)
+    calls = []
+    def down():
+        calls.append(1)
+        raise TimeoutError()
+    for _ in range(3):
+        with pytest.raises(TimeoutError):
+            governor.call(down)
+    assert governor.breaker.state == "open"
+
+    with pytest.raises(CircuitOpenError):
+        governor.call(down)
+    assert len(calls) == 3 and governor.stats()["rejected"] == 1
+
+    time.sleep(0.25)
+    assert governor.call(lambda: "back") == "back"  # the half-open probe closes the circuit
+    assert governor.breaker.state == "closed"
+
+def test_concurrency_limit_shrinks_on_errors_and_grows_back():
+    limiter = AIMDLimiter(maximum=8, latency_target=1.0)
+    for _ in range(3):
+        assert limiter.try_acquire()
+        limiter.release(0.1, ok=False)
+    assert int(limiter.limit) == 1
+    assert limiter.try_acquire() and not limiter.try_acquire()
+    limiter.release(0.1, ok=True)
+    for _ in range(50):
+        limiter.try_acquire()
+        limiter.release(0.1, ok=True)
+    assert int(limiter.limit) == 8
+
+@pytest.mark.asyncio
+async def test_governed_search_client_retries_server_errors():
+    calls = 0
+    async def handler(request):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            return httpx.Response(503)
+        return httpx.Response(200, json={"results": [{"url": "https://example.org"}]})
+    governor = _governor()
+    client = SearchClient("http://searxng", transport=httpx.MockTransport(handler), governor=governor)
+
+    assert await client.search("query") == [{"url": "https://example.org"}]
+    assert governor.stats()["retries"] == 1 and governor.stats()["successes"] == 1
+    await client.aclose()
+
+@pytest.mark.asyncio
+async def test_cancelled_probe_lets_the_next_call_probe():
+    governor = _governor(retries=0, failure_threshold=1, reset_timeout=0.05)
+    async def down():
+        raise TimeoutError()
+    with pytest.raises(TimeoutError):
+        await governor.acall(down)
+    await asyncio.sleep(0.06)
+
+    # The half-open probe is cancelled mid-call, as search_many does at its deadline
+    probe = asyncio.create_task(governor.acall(asyncio.sleep, 10))
+    await asyncio.sleep(0.01)
+    probe.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await probe
+    assert governor.breaker.state == "half_open" and not governor.breaker.probing
+
+    async def up():
+        return "back"
+    assert await governor.acall(up) == "back"
+    assert governor.breaker.state == "closed" and governor.stats()["in_flight"] == 0
+
+def test_probe_without_a_call_slot_is_released():
+    governor = _governor(retries=0, failure_threshold=1, reset_timeout=0.05, queue_timeout=0.01)
+    def down():
+        raise TimeoutError()
+    with pytest.raises(TimeoutError):
+        governor.call(down)
+    time.sleep(0.06)
+
+    while governor.limiter.try_acquire():
+        pass
+    with pytest.raises(ConcurrencyTimeout):
+        governor.call(lambda: None)
+    assert not governor.breaker.probing
@@ -0,0 +1,60 @@
+import uuid
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.services.comparison import ComparisonService
+from app.services.minhash import MinHasher, lsh_pairs
+from app.services.similarity import ngram_jaccard
+
+ESSAY = " ".join(
+    f"sentence {i} discusses topic {i % 7} with evidence from source {i % 11} and a conclusion."
+    for i in range(60)
+)
+
+def test_signature_estimates_jaccard():
+    hasher = MinHasher(num_perm=256, bands=64)
+    edited = ESSAY.replace("evidence", "proof", 5)
+    true = ngram_jaccard(hasher.shingles(ESSAY), hasher.shingles(edited))
+    estimate = MinHasher.jaccard(hasher.signature(ESSAY), hasher.signature(edited))
+    assert estimate == pytest.approx(true, abs=0.1)
+
+def test_signature_round_trips_through_bytes():
+    hasher = MinHasher(num_perm=128, bands=32)
+    signature = hasher.signature(ESSAY)
+    data = MinHasher.to_bytes(signature)
+    assert len(data) == 512
+    np.testing.assert_array_equal(MinHasher.from_bytes(data), signature)
+    assert hasher.band_buckets(signature) == hasher.band_buckets(MinHasher.from_bytes(data))
+
+def test_lsh_pairs_finds_light_edits_only():
+    hasher = MinHasher(num_perm=128, bands=32)
+    signatures = {
+        "original": hasher.signature(ESSAY),
+        "edited": hasher.signature(ESSAY.replace("conclusion", "summary", 3)),
+        "unrelated": hasher.signature("a completely different text about marine biology and the tides " * 20),
+    }
+    pairs = lsh_pairs(signatures, hasher, threshold=0.5)
+    assert [(a, b) for a, b, _ in pairs] == [("original", "edited")]
+
+def test_texts_without_words_have_no_signature():
+    hasher = MinHasher(num_perm=128, bands=32)
+    assert hasher.signature("- - - ---") is None and hasher.signature("§ ¶ • ***") is None
+    signatures = {"a": hasher.signature("- - - ---"), "b": hasher.signature("§ ¶ • ***"), "essay": hasher.signature(ESSAY)}
+    assert lsh_pairs(signatures, hasher, threshold=0.5) == []
+
+@pytest.mark.asyncio
+async def test_find_near_duplicates_confirms_candidates():
+    hasher = MinHasher(num_perm=128, bands=32)
+    doc_id, copy_id, collision_id = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    signature = hasher.signature(ESSAY)
+    result = MagicMock()
+    result.all.return_value = [
+        (doc_id, copy_id, MinHasher.to_bytes(hasher.signature(ESSAY.replace("topic", "subject", 2)))),
+        (doc_id, collision_id, MinHasher.to_bytes(hasher.signature("short unrelated note about lunch plans"))),
+    ]
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=result)
+
+    pairs = await ComparisonService(session).find_near_duplicates({doc_id: signature}, threshold=0.5)
+
+    assert [(a, b) for a, b, _ in pairs] == [(doc_id, copy_id)]
@@ -0,0 +1,81 @@
+import asyncio
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import pytest
+from app.services.model_server import ModelClient, ModelServer, ModelServerError, RemoteClassifier, RemoteEmbeddingModel
+
+@pytest.fixture
+def server(tmp_path):
+    """A model server with stand-in models, running on its own event loop thread"""
+    batches = []
+
+    def embed(texts):
+        batches.append(len(texts))
+        time.sleep(0.05)  # a forward pass
+        return np.array([[len(t), t.count("a")] for t in texts], dtype=np.float32)
+
+    def classify(texts):
+        if any("boom" in t for t in texts):
+            raise RuntimeError("model failed")
+        return [{"label": "Fake" if "robot" in t else "Real", "score": 0.9} for t in texts]
+
+    path = str(tmp_path / "models.sock")
+    model_server = ModelServer(path, embed=embed, classify=classify, max_batch=16, max_latency=0.02)
+    loop = asyncio.new_event_loop()
+    thread = threading.Thread(target=loop.run_forever, daemon=True)
+    thread.start()
+    asyncio.run_coroutine_threadsafe(model_server.start(), loop).result()
+    yield path, batches
+    asyncio.run_coroutine_threadsafe(model_server.close(), loop).result()
+    loop.call_soon_threadsafe(loop.stop)
+    thread.join()
+
+def test_concurrent_callers_share_micro_batches(server):
+    path, batches = server
+    client = ModelClient(path)
+    requests = [[f"text {i} " + "a" * i, f"other {i}"] for i in range(12)]
+
+    with ThreadPoolExecutor(max_workers=12) as pool:
+        results = list(pool.map(client.embed, requests))
+
+    # Every caller gets the rows for its own texts, in its own order
+    for texts, vectors in zip(requests, results):
+        np.testing.assert_array_equal(vectors, [[len(t), t.count("a")] for t in texts])
+    assert sum(batches) == 24
+    assert len(batches) < 12
+    assert client.stats()["embed"]["batches"] == len(batches)
+
+def test_a_lone_request_waits_at_most_the_latency_bound(server):
+    path, batches = server
+    client = ModelClient(path)
+    started = time.monotonic()
+    client.embed(["just one"])
+    assert time.monotonic() - started < 0.02 + 0.05 + 0.1
+    assert batches == [1]
+
+def test_remote_models_stand_in_for_local_ones(server):
+    path, _ = server
+    client = ModelClient(path)
+    embedding = RemoteEmbeddingModel(client)
+    assert embedding.encode(["abc", "aa"], batch_size=64, convert_to_numpy=True).shape == (2, 2)
+
+    classifier = RemoteClassifier(client)
+    assert [o["label"] for o in classifier(["a robot wrote this", "a person wrote this"], truncation=True)] == ["Fake", "Real"]
+    with pytest.raises(ModelServerError, match="model failed"):
+        classifier(["boom"])
+    # The connection survives a failed request
+    assert classifier(["fine"])[0]["label"] == "Real"
+
+def test_large_encodes_are_sent_in_batch_size_pieces(server):
+    path, batches = server
+    texts = [f"text {i} " + "a" * i for i in range(10)]
+    vectors = RemoteEmbeddingModel(ModelClient(path)).encode(texts, batch_size=4)
+
+    np.testing.assert_array_equal(vectors, [[len(t), t.count("a")] for t in texts])
+    assert batches == [4, 4, 2]
+
+def test_unreachable_server_raises(tmp_path):
+    with pytest.raises(ModelServerError):
+        ModelClient(str(tmp_path / "missing.sock"), timeout=1).embed(["text"])
@@ -0,0 +1,100 @@
+import asyncio
+import time
+import httpx
+import pytest
+from app.services.plagiarism import PlagiarismService
+from app.services.search_client import SearchClient
+
+COPIED = "the industrial revolution transformed manufacturing through steam power and mechanisation"
+
+def _text(chunks):
+    # Five 150-word chunks, each starting with a searchable sentence
+    return " ".join(f"{COPIED} number {i}. " + "filler words here. " * 48 for i in range(chunks))
+
+def _service(handler):
+    service = PlagiarismService()
+    service.search_client = SearchClient("http://searxng", concurrency=5, request_timeout=1.0, transport=httpx.MockTransport(handler))
+    return service
+
+@pytest.mark.asyncio
+async def test_chunks_are_searched_concurrently():
+    async def handler(request):
+        await asyncio.sleep(0.2)
+        return httpx.Response(200, json={"results": [{"url": "https://example.org", "title": "Source", "content": COPIED}]})
+    service = _service(handler)
+
+    started = time.monotonic()
+    result = await service.check_plagiarism(_text(5))
+    elapsed = time.monotonic() - started
+
+    assert result["checked_chunks"] == 5 and result["failed_chunks"] == 0
+    assert elapsed < 0.6  # five searches of 0.2s each, run in parallel
+    assert result["sources"][0]["count"] == 5
+    assert result["sources"][0]["matched_spans"]
+
+@pytest.mark.asyncio
+async def test_failed_and_slow_searches_do_not_stall_the_scan():
+    calls = 0
+    async def handler(request):
+        nonlocal calls
+        calls += 1
+        if calls == 1:
+            return httpx.Response(500)
+        if calls == 2:
+            await asyncio.sleep(5)
+        return httpx.Response(200, json={"results": []})
+    service = _service(handler)
+
+    started = time.monotonic()
+    results = await service.search_client.search_many(["a", "b", "c"], deadline=0.5)
+
+    assert time.monotonic() - started < 1.0
+    assert results[0] is None and results[1] is None and results[2] == []
+
+@pytest.mark.asyncio
+async def test_repeat_queries_and_scans_are_served_from_cache():
+    queries = []
+    async def handler(request):
+        queries.append(request.url.params["q"])
+        return httpx.Response(200, json={"results": [{"url": "https://example.org", "title": "Source", "content": COPIED}]})
+    service = _service(handler)
+    text = _text(2)
+
+    first = await service.check_plagiarism(text)
+    searched = len(queries)
+    # Queries taken from the same chunk are scored as one chunk
+    assert searched >= first["checked_chunks"] > 0 and "cached" not in first
+
+    # Same text: the whole scan comes from the scan cache
+    assert (await service.check_plagiarism(text))["cached"] is True
+    assert len(queries) == searched
+
+    # Different document with the same queries in other case and punctuation: only the search cache applies
+    second = await service.check_plagiarism(text.title().replace(".", "!"))
+    assert "cached" not in second and len(queries) == searched
+    assert service.cache_stats()["search"]["hit_rate"] > 0
+
+@pytest.mark.asyncio
+async def test_each_checked_chunk_counts_once():
+    async def handler(request):
+        return httpx.Response(200, json={"results": [{"url": "https://example.org", "title": "Source", "content": request.url.params["q"]}]})
+    service = _service(handler)
+    # One 150-word chunk: copied prose first, unrelated filler after
+    text = "Photosynthesis converts sunlight into chemical energy stored inside glucose molecules. " * 3
+    text += " ".join(f"Volcanic eruption {i} released sulphur aerosols cooling surfaces." for i in range(12))
+
+    result = await service.check_plagiarism(text)
+    assert result["checked_chunks"] == 1
+    assert result["plagiarism_score"] <= 100.0
+
+@pytest.mark.asyncio
+async def test_texts_too_short_to_plan_are_still_scanned():
+    queries = []
+    async def handler(request):
+        queries.append(request.url.params["q"])
+        return httpx.Response(200, json={"results": []})
+    service = _service(handler)
+
+    result = await service.check_plagiarism("Copyright notice only.")
+    assert len(queries) == 1 and result["checked_chunks"] == 1
+    assert "error" in await service.check_plagiarism("12 34 !!")
@@ -0,0 +1,53 @@
+from app.services.query_planner import QueryPlanner
+
+# Distinct, searchable prose per paragraph so every part of the text has candidates
+TOPICS = [
+    "Photosynthesis converts sunlight into chemical energy stored inside glucose molecules.",
+    "Medieval cathedrals relied on flying buttresses to support their towering stone vaults.",
+    "Quantum entanglement links particles whose measured states remain correlated across distances.",
+    "Volcanic eruptions release sulphur aerosols that temporarily cool global surface temperatures.",
+    "Byzantine merchants controlled silk routes connecting Constantinople with distant Asian markets.",
+    "Coral reefs shelter astonishing biodiversity despite covering a tiny fraction of oceans.",
+]
+
+def _paragraph(topic):
+    return f"{topic} " + "It is what it is and it was what it was. " * 20
+
+def test_queries_cover_the_whole_document():
+    text = "\n\n".join(_paragraph(topic) for topic in TOPICS)
+    assert len(text.split()) > 750
+    queries = QueryPlanner(budget=5, query_words=32, min_words=8).plan(text)
+
+    assert len(queries) == 5
+    assert [q.start for q in queries] == sorted(q.start for q in queries)
+    for query in queries:
+        assert text[query.start:query.end] == query.text
+    # The last query comes from the final part of the text, well past the first 750 words
+    assert queries[-1].start > len(text) * 0.8
+    assert any(TOPICS[-1] in q.text for q in queries)
+
+def test_boilerplate_and_repeated_passages_are_not_searched():
+    planner = QueryPlanner(budget=5, query_words=32, min_words=8)
+    text = "\n\n".join([
+        "References\n\nSmith, J. et al. (2019). Retrieved from https://doi.org/10.1000/xyz123 on page 4.",
+        "TABLE OF CONTENTS AND CHAPTER HEADINGS FOR THE ENTIRE SUBMITTED THESIS DOCUMENT",
+        TOPICS[0] + " Chlorophyll absorbs mostly blue and red wavelengths.",
+        TOPICS[0] + " Chlorophyll absorbs mostly blue and red wavelengths.",
+    ])
+    queries = planner.plan(text)
+
+    assert len(queries) == 1
+    assert TOPICS[0] in queries[0].text
+    assert planner.score("It is what it is and it was what it was.") == 0.0
+
+def test_budget_caps_the_number_of_queries():
+    text = "\n\n".join(_paragraph(topic) for topic in TOPICS * 3)
+    assert len(QueryPlanner(budget=3, query_words=32, min_words=8).plan(text)) == 3
+    assert QueryPlanner(budget=3).plan("") == []
+
+def test_texts_without_distinctive_passages_still_get_one_query():
+    planner = QueryPlanner(budget=5, query_words=32, min_words=8)
+    text = "Copyright 2024 the author. It is what it is."
+    queries = planner.plan(text)
+    assert len(queries) == 1 and queries[0].text.startswith("Copyright")
+    assert planner.plan("   \n\n ") == []
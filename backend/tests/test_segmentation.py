@@ -0,0 +1,33 @@
+from app.services import segmentation
+from app.services.segmentation import Segmenter, iter_sentences, segment, word_length
+
+def test_iter_sentences_offsets():
+    text = 'He said "stop." Then he left!\n\nA new paragraph without a full stop'
+    sentences = [text[start:end] for start, end in iter_sentences(text)]
+    assert sentences == ['He said "stop."', "Then he left!", "A new paragraph without a full stop"]
+
+def test_segmenter_packs_whole_sentences_with_overlap():
+    text = "One two three. Four five six. Seven eight nine. Ten eleven twelve."
+    spans = Segmenter("test", 6, overlap=3, length=word_length).spans(text)
+    assert [span.text for span in spans] == [
+        "One two three. Four five six.",
+        "Four five six. Seven eight nine.",
+        "Seven eight nine. Ten eleven twelve.",
+    ]
+    assert all(text[span.start:span.end] == span.text for span in spans)
+
+def test_segmenter_splits_long_sentences_at_words():
+    text = "word " * 25
+    spans = Segmenter("test", 10, length=word_length).spans(text)
+    assert [word_length(text, span.start, span.end) for span in spans] == [10, 10, 5]
+
+def test_segment_reuses_sentence_pass(monkeypatch):
+    calls = []
+    original = segmentation.iter_sentences
+    monkeypatch.setattr(segmentation, "iter_sentences", lambda text: calls.append(text) or original(text))
+    text = "A document that is shared. It is segmented for several services."
+
+    segment(text, Segmenter("first", 5, length=word_length))
+    segment(text, Segmenter("second", 50))
+    segment(text, Segmenter("second", 50))
+    assert len(calls) == 1
@@ -0,0 +1,51 @@
+import random
+import pytest
+from app.services.plagiarism import PlagiarismService
+from app.services.similarity import NgramEngine, SuffixAutomatonEngine, _SuffixAutomaton, get_similarity_engine
+
+def _longest_common_substring(a, b):
+    best = 0
+    for i in range(len(a)):
+        for j in range(len(b)):
+            k = 0
+            while i + k < len(a) and j + k < len(b) and a[i + k] == b[j + k]:
+                k += 1
+            best = max(best, k)
+    return best
+
+def test_suffix_automaton_finds_longest_common_substring():
+    rng = random.Random(0)
+    for _ in range(50):
+        a = "".join(rng.choice("abc") for _ in range(rng.randint(1, 30)))
+        b = "".join(rng.choice("abc") for _ in range(rng.randint(1, 30)))
+        matches = list(_SuffixAutomaton(a).maximal_matches(b, 1))
+        assert max((m[1] - m[0] for m in matches), default=0) == _longest_common_substring(a, b)
+        for a_start, a_end, b_start, b_end in matches:
+            assert a[a_start:a_end] == b[b_start:b_end]
+
+@pytest.mark.parametrize("a_is_longer", [True, False])
+def test_suffix_automaton_engine_spans_point_at_copied_text(a_is_longer):
+    copied = "the mitochondria is the powerhouse of the cell"
+    long_text = "Biology notes. " + copied + ". More unrelated notes about plants and soil."
+    short_text = "Snippet: " + copied.upper() + "..."
+    a, b = (long_text, short_text) if a_is_longer else (short_text, long_text)
+
+    result = SuffixAutomatonEngine(min_length=12).compare(a, b)
+
+    a_start, a_end, b_start, b_end = max(result.spans, key=lambda s: s[1] - s[0])
+    assert a[a_start:a_end].lower() == b[b_start:b_end].lower()
+    assert a[a_start:a_end].lower().strip(" .") == copied
+    assert 0 < result.ratio <= 1
+
+def test_ngram_engine_containment_of_snippet():
+    chunk = "one two three four five six seven eight nine ten"
+    result = NgramEngine(n=3).compare(chunk, "Four five six seven")
+    assert result.ratio == 1.0
+    assert [chunk[s:e] for s, e, _, _ in result.spans] == ["four five six seven"]
+
+def test_plagiarism_service_uses_configured_engine():
+    service = PlagiarismService()
+    assert service.engine.name == "suffix_automaton"
+    assert service._calculate_similarity("identical text here", "identical text here") == 1.0
+    with pytest.raises(ValueError):
+        get_similarity_engine("levenshtein")
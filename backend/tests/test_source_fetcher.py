@@ -0,0 +1,178 @@
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import httpx
+import pytest
+from app.services.plagiarism import PlagiarismService
+from app.services.search_client import SearchClient
+from app.services.source_fetcher import BlockedURL, SourceCache, SourceFetcher, html_to_text
+
+ARTICLE = (
+    "The printing press, developed by Johannes Gutenberg around 1440, used movable metal type "
+    "to reproduce texts quickly and cheaply. Within decades presses operated across Europe, "
+    "spreading literacy, standardising vernacular languages and accelerating the Reformation."
+)
+PAGE = f"""<html><head><title>Printing press</title><style>body {{ color: red }}</style>
+<script>var tracking = "ignore me";</script></head>
+<body><nav>Home | About | Contact</nav><h1>Printing press</h1><p>{ARTICLE}</p>
+<footer>All rights reserved</footer></body></html>"""
+
+
+@pytest.fixture
+def server():
+    """A stand-in web server counting the requests per path"""
+    hits = {}
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            hits[self.path] = hits.get(self.path, 0) + 1
+            if self.path == "/missing":
+                self.send_response(404)
+                self.end_headers()
+                return
+            body = PAGE.encode()
+            self.send_response(200)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}", hits
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_html_to_text_keeps_the_prose_only():
+    text = html_to_text(PAGE)
+    assert ARTICLE in text
+    assert "tracking" not in text and "color" not in text and "Contact" not in text and "rights" not in text
+
+
+@pytest.mark.asyncio
+async def test_pages_are_fetched_once_and_stored_by_content(server, tmp_path):
+    base, hits = server
+    fetcher = SourceFetcher(SourceCache(str(tmp_path)), allow_private=True)
+
+    texts = await fetcher.fetch_many([f"{base}/wiki/Printing", f"{base}/mirror/Printing", f"{base}/missing"])
+    assert ARTICLE in texts[f"{base}/wiki/Printing"]
+    assert texts[f"{base}/mirror/Printing"] == texts[f"{base}/wiki/Printing"]
+    assert texts[f"{base}/missing"] is None
+
+    # Repeat hits come from the cache
+    assert ARTICLE in await fetcher.fetch(f"{base}/wiki/Printing")
+    assert hits["/wiki/Printing"] == 1
+    # Both URLs point at the same blob
+    blobs = [name for _, _, names in os.walk(tmp_path / "blobs") for name in names]
+    assert len(blobs) == 1
+    await fetcher.aclose()
+
+
+def _age_blobs(path, seconds):
+    for root, _, names in os.walk(path / "blobs"):
+        for name in names:
+            past = time.time() - seconds
+            os.utime(os.path.join(root, name), (past, past))
+
+
+def test_writes_prune_expired_pages_periodically(tmp_path):
+    cache = SourceCache(str(tmp_path), ttl=1, prune_interval=3600)
+    cache.set("https://example.org/old", "old page")  # the first write prunes, finding nothing
+    _age_blobs(tmp_path, 120)
+    time.sleep(1.1)
+
+    # Within the interval, writes leave expired files alone
+    cache.set("https://example.org/new", "new page")
+    assert len(os.listdir(tmp_path / "urls")) == 2
+
+    os.utime(tmp_path / ".pruned", (0, 0))
+    cache.set("https://example.org/newer", "newer page")
+    assert len(os.listdir(tmp_path / "urls")) == 2  # "old" is gone; "new" is not yet expired
+    blobs = [name for _, _, names in os.walk(tmp_path / "blobs") for name in names]
+    assert len(blobs) == 2
+    assert cache.get("https://example.org/old") is None and cache.get("https://example.org/newer") == "newer page"
+
+
+@pytest.mark.asyncio
+async def test_expired_pages_are_fetched_again(server, tmp_path):
+    base, hits = server
+    cache = SourceCache(str(tmp_path), ttl=1)
+    fetcher = SourceFetcher(cache, allow_private=True)
+
+    await fetcher.fetch(f"{base}/page")
+    entry = cache._entry_path(f"{base}/page")
+    with open(entry) as f:
+        data = json.load(f)
+    with open(entry, "w") as f:
+        json.dump({**data, "fetched_at": time.time() - 10}, f)
+    _age_blobs(tmp_path, 120)
+
+    assert cache.prune() == 2  # the expired entry and its blob
+    await fetcher.fetch(f"{base}/page")
+    assert hits["/page"] == 2
+    await fetcher.aclose()
+
+
+@pytest.mark.asyncio
+async def test_chunks_are_verified_against_the_full_source(server, tmp_path):
+    base, _ = server
+    url = f"{base}/wiki/Printing_press"
+
+    async def handler(request):
+        # The snippet is a short, mostly unrelated summary of the page
+        return httpx.Response(200, json={"results": [{"url": url, "title": "Printing press", "content": "Printing press - Wikipedia"}]})
+
+    service = PlagiarismService()
+    service.search_client = SearchClient("http://searxng", transport=httpx.MockTransport(handler))
+    text = "My essay begins with an introduction of my own about early modern history. " + ARTICLE
+    snippet_only = await service.check_plagiarism(text)
+
+    service.scan_cache = None
+    service.source_fetcher = SourceFetcher(SourceCache(str(tmp_path)), allow_private=True)
+    verified = await service.check_plagiarism(text)
+
+    assert verified["verified_sources"] == 1
+    assert verified["plagiarism_score"] > 60 > snippet_only["plagiarism_score"]
+    start, end = verified["sources"][0]["matched_spans"][0]
+    assert text[start:end] in ARTICLE and end - start > len(ARTICLE) / 2
+    await service.source_fetcher.aclose()
+
+
+@pytest.mark.asyncio
+async def test_private_addresses_are_never_fetched(server):
+    base, hits = server
+    requested = []
+
+    async def handler(request):
+        requested.append(str(request.url))
+        # A public page redirecting into the server's own network
+        return httpx.Response(302, headers={"Location": f"{base}/admin"})
+    fetcher = SourceFetcher(transport=httpx.MockTransport(handler))
+
+    with pytest.raises(BlockedURL):
+        await fetcher.fetch("http://93.184.216.34/article")
+    assert requested == ["http://93.184.216.34/article"] and not hits
+
+    for url in (f"{base}/page", "http://169.254.169.254/latest/meta-data/", "http://[::1]/", "file:///etc/passwd"):
+        with pytest.raises(BlockedURL):
+            await fetcher.fetch(url)
+    assert not hits
+    await fetcher.aclose()
+
+@pytest.mark.asyncio
+async def test_redirects_between_allowed_pages_are_followed(server):
+    base, hits = server
+    async def handler(request):
+        if request.url.path == "/old":
+            return httpx.Response(301, headers={"Location": "/new"})
+        return httpx.Response(200, text=ARTICLE, headers={"Content-Type": "text/plain"})
+    fetcher = SourceFetcher(transport=httpx.MockTransport(handler))
+    assert await fetcher.fetch("http://93.184.216.34/old") == ARTICLE
+    await fetcher.aclose()
@@ -0,0 +1,98 @@
+import uuid
+import numpy as np
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from app.services.comparison import ComparisonService, SearchScope
+from app.services.vector_store import LocalVectorStore
+
+def _vectors(n, dim=8, seed=0):
+    return np.random.default_rng(seed).normal(size=(n, dim)).astype(np.float32)
+
+def test_exact_search_matches_brute_force(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=8, block_size=7)
+    ids = [uuid.uuid4() for _ in range(50)]
+    vectors = _vectors(50)
+    store.add(ids, vectors)
+
+    queries = _vectors(3, seed=1)
+    results = store.search(queries, limit=5)
+
+    normalized = vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+    sims = (queries / np.linalg.norm(queries, axis=1, keepdims=True)) @ normalized.T
+    for hits, row in zip(results, sims):
+        assert [doc_id for doc_id, _ in hits] == [ids[i] for i in np.argsort(-row)[:5]]
+        np.testing.assert_allclose([s for _, s in hits], np.sort(row)[::-1][:5], rtol=1e-5)
+
+def test_tombstones_upserts_and_exclusions(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=8)
+    ids = [uuid.uuid4() for _ in range(10)]
+    vectors = _vectors(10)
+    store.add(ids, vectors)
+
+    store.remove([ids[0]])
+    assert ids[0] not in [doc_id for doc_id, _ in store.search(vectors[:1], limit=10)[0]]
+
+    # Re-adding an id replaces its earlier row
+    store.add([ids[1]], vectors[2:3])
+    hits = store.search(vectors[2:3], limit=2)[0]
+    assert {doc_id for doc_id, _ in hits} == {ids[1], ids[2]}
+    assert len(store) == 9
+
+    hits = store.search(vectors[2:3], limit=2, exclude_ids=[ids[1]])[0]
+    assert hits[0][0] == ids[2] and ids[1] not in [doc_id for doc_id, _ in hits]
+
+def test_ids_ending_in_zero_bytes(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=8)
+    doc_id = uuid.UUID(bytes=b"\x01" * 14 + b"\x00\x00")
+    store.add([doc_id], _vectors(1))
+    assert store.search(_vectors(1), limit=1)[0][0][0] == doc_id
+    store.remove([doc_id])
+    assert store.search(_vectors(1), limit=1) == [[]]
+
+def test_readers_see_appends_from_other_processes(tmp_path):
+    writer = LocalVectorStore(str(tmp_path), dim=8)
+    reader = LocalVectorStore(str(tmp_path), dim=8)
+    new_id = uuid.uuid4()
+    writer.add([new_id], _vectors(1))
+
+    assert reader.search(_vectors(1), limit=1)[0][0][0] == new_id
+    with pytest.raises(ValueError):
+        LocalVectorStore(str(tmp_path), dim=16)
+
+def test_ivf_search_recall(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=8, search="ivf", probes=4)
+    ids = [uuid.uuid4() for _ in range(400)]
+    vectors = _vectors(400)
+    store.add(ids, vectors)
+    store.train_ivf(n_lists=8)
+    # Rows added after training are still found
+    late = uuid.uuid4()
+    store.add([late], vectors[:1] * 3)
+
+    queries = vectors[:20]
+    exact = LocalVectorStore(str(tmp_path), dim=8, search="exact").search(queries, limit=10)
+    approximate = store.search(queries, limit=10)
+    recall = np.mean([len({d for d, _ in a} & {d for d, _ in e}) / 10 for a, e in zip(approximate, exact)])
+    assert recall >= 0.8
+    assert late in [doc_id for doc_id, _ in approximate[0]]
+
+@pytest.mark.asyncio
+async def test_local_store_hits_are_filtered_by_scope(tmp_path):
+    store = LocalVectorStore(str(tmp_path), dim=8)
+    ids = [uuid.uuid4() for _ in range(5)]
+    vectors = _vectors(5)
+    store.add(ids, vectors)
+
+    scalars = MagicMock()
+    scalars.all.return_value = ids[1:3]
+    result = MagicMock()
+    result.scalars.return_value = scalars
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=result)
+    service = ComparisonService(session, vector_store=store)
+
+    user = MagicMock(id=uuid.uuid4(), institution="uni")
+    results = await service.find_candidates_many(vectors[:1], limit=5, scope=SearchScope.for_user("global", None, user))
+
+    assert {doc_id for doc_id, _ in results[0]} == set(ids[1:3])
+    session.execute.assert_called_once()
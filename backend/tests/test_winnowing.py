@@ -0,0 +1,47 @@
+import uuid
+import pytest
+from unittest.mock import AsyncMock, MagicMock
+from sqlalchemy.dialects import postgresql
+from app.services.comparison import ComparisonService
+from app.services.winnowing import fingerprints, merge_regions
+
+SOURCE = (
+    "Photosynthesis converts light energy into chemical energy stored in glucose. "
+    "It takes place in the chloroplasts, where chlorophyll absorbs mostly red and blue light. "
+    "The light reactions split water and release oxygen as a by-product. "
+    "The Calvin cycle then fixes carbon dioxide into three-carbon sugars."
+)
+
+def test_copied_passage_shares_fingerprints_at_its_offsets():
+    copied = SOURCE[77:166]  # the chloroplast sentence
+    essay = "My own introduction to the topic of plants. " + copied.upper() + " My own conclusion here."
+    source, target = fingerprints(SOURCE, k=10, window=8), fingerprints(essay, k=10, window=8)
+
+    shared = set(source.hashes.tolist()) & set(target.hashes.tolist())
+    assert shared
+    for h, start, end in zip(source.hashes.tolist(), source.starts.tolist(), source.ends.tolist()):
+        if h in shared:
+            assert 77 <= start and end <= 166 + 1
+
+def test_fingerprints_ignore_case_and_punctuation():
+    a = fingerprints("Hello, World! This is a test of winnowing.", k=5, window=4)
+    b = fingerprints("hello world this is a test of winnowing", k=5, window=4)
+    assert a.hashes.tolist() == b.hashes.tolist()
+
+def test_merge_regions_joins_consecutive_fingerprints():
+    matches = [(0, 10, 100, 110), (8, 20, 108, 120), (500, 510, 10, 20)]
+    regions = merge_regions(matches, gap=5, limit=10)
+    assert regions[0] == {"source": [0, 20], "match": [100, 120], "fingerprints": 2}
+    assert regions[1]["source"] == [500, 510]
+
+@pytest.mark.asyncio
+async def test_find_shared_fingerprints_is_one_query():
+    session = MagicMock()
+    session.execute = AsyncMock(return_value=MagicMock(all=MagicMock(return_value=[])))
+    await ComparisonService(session).find_shared_fingerprints([uuid.uuid4()])
+
+    session.execute.assert_called_once()
+    sql = str(session.execute.call_args[0][0].compile(dialect=postgresql.dialect()))
+    assert "JOIN LATERAL" in sql and "other.hash = mine.hash" in sql
+    # Documents that were never embedded are still sources of copied regions
+    assert "embedding IS NOT NULL" not in sql and "IS DISTINCT FROM 'failed'" in sql